@@ -0,0 +1,478 @@
+"""In-process stand-in for the Azure Blob Storage REST API, good enough to drive azure-storage-blob offline.
+
+Only the operations the managers use are implemented, and authentication is not checked.
+"""
+import base64
+import datetime as dt
+import hashlib
+import re
+import socket
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+ACCOUNT_NAME = "devstoreaccount1"
+# Well-known Azurite development key (not a secret)
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+
+class _Blob:
+    def __init__(self, data: bytes, content_type: Optional[str] = None, metadata: Optional[dict] = None,
+                 content_md5: Optional[bytes] = None, content_encoding: Optional[str] = None):
+        self.data = data
+        self.content_type = content_type or "application/octet-stream"
+        self.content_encoding = content_encoding
+        self.metadata = metadata or {}
+        self.content_md5 = content_md5 if content_md5 is not None else hashlib.md5(data).digest()
+        self.tags = {}
+        self.tier = "Hot"
+        self.last_modified = dt.datetime.now(dt.timezone.utc)
+        self.etag = '"0x%s"' % uuid.uuid4().hex[:16].upper()
+
+
+class FakeBlobStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.containers: Dict[str, Dict[str, _Blob]] = {}
+        self.uncommitted: Dict[tuple, Dict[str, bytes]] = {}
+        self.request_count = 0
+
+
+def _http_date(d: dt.datetime) -> str:
+    return formatdate(d.timestamp(), usegmt=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store: FakeBlobStore = None
+    latency: float = 0.0
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle + delayed ACK add ~40ms per response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):  # keep benchmark output quiet
+        pass
+
+    # -- plumbing -------------------------------------------------------------------------------
+    def parse_request(self):
+        # Simulated service round-trip time, so client-side concurrency has latency to hide
+        if self.latency:
+            time.sleep(self.latency)
+        return super().parse_request()
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        headers = dict(headers or {})
+        headers.setdefault("x-ms-version", "2025-01-05")
+        headers.setdefault("x-ms-request-id", str(uuid.uuid4()))
+        headers.setdefault("Date", formatdate(usegmt=True))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        body = f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code><Message>{code}</Message></Error>'.encode()
+        self._send(status, body if self.command != "HEAD" else b"", {"x-ms-error-code": code, "Content-Type": "application/xml"})
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split("/", 3)[1:]]
+        # Path-style addressing: /<account>/<container>/<blob>
+        if parts and parts[0] == ACCOUNT_NAME:
+            parts = parts[1:]
+        container = parts[0] if parts and parts[0] else None
+        blob = parts[1] if len(parts) > 1 and parts[1] else None
+        if len(parts) > 2:
+            blob = parts[1] + "/" + parts[2]
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        return container, blob, query
+
+    def _blob_headers(self, b: _Blob) -> dict:
+        h = {
+            "ETag": b.etag,
+            "Last-Modified": _http_date(b.last_modified),
+            "x-ms-creation-time": _http_date(b.last_modified),
+            "x-ms-blob-type": "BlockBlob",
+            "Content-Type": b.content_type,
+            "Content-MD5": base64.b64encode(b.content_md5).decode(),
+            "x-ms-access-tier": b.tier,
+            "x-ms-tag-count": str(len(b.tags)),
+            "Accept-Ranges": "bytes",
+        }
+        if b.content_encoding:
+            h["Content-Encoding"] = b.content_encoding
+        for k, v in b.metadata.items():
+            h[f"x-ms-meta-{k}"] = v
+        return h
+
+    def _metadata_from_headers(self) -> dict:
+        return {k[len("x-ms-meta-"):]: v for k, v in self.headers.items() if k.lower().startswith("x-ms-meta-")}
+
+    def _check_conditions(self, existing: Optional[_Blob]) -> bool:
+        inm = self.headers.get("If-None-Match")
+        if inm == "*" and existing is not None:
+            self._error(409, "BlobAlreadyExists")
+            return False
+        return True
+
+    # -- verbs ----------------------------------------------------------------------------------
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        container, blob, q = self._route()
+        with self.store.lock:
+            self.store.request_count += 1
+        if container is None:
+            if q.get("comp") == "list":
+                return self._list_containers(q)
+            if q.get("comp") == "blobs":
+                return self._find_by_tags(None, q)
+            return self._error(400, "InvalidQueryParameterValue")
+        blobs = self.store.containers.get(container)
+        if blobs is None:
+            return self._error(404, "ContainerNotFound")
+        if blob is None:
+            if q.get("comp") == "list":
+                return self._list_blobs(container, blobs, q)
+            if q.get("comp") == "blobs":
+                return self._find_by_tags(container, q)
+            return self._send(200, headers={"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True)})
+        b = blobs.get(blob)
+        if q.get("comp") == "blocklist":
+            return self._get_block_list(container, blob, b, q)
+        if b is None:
+            return self._error(404, "BlobNotFound")
+        if q.get("comp") == "tags":
+            tags = "".join(f"<Tag><Key>{escape(k)}</Key><Value>{escape(v)}</Value></Tag>" for k, v in b.tags.items())
+            body = f'<?xml version="1.0" encoding="utf-8"?><Tags><TagSet>{tags}</TagSet></Tags>'.encode()
+            return self._send(200, body, {"Content-Type": "application/xml"})
+        inm = self.headers.get("If-None-Match")
+        if inm and inm == b.etag:
+            return self._send(304, headers={"ETag": b.etag})
+        headers = self._blob_headers(b)
+        rng = self.headers.get("x-ms-range") or self.headers.get("Range")
+        if self.command == "HEAD" or not rng:
+            if self.command == "HEAD":
+                self.send_response(200)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("x-ms-version", "2025-01-05")
+                self.send_header("Content-Length", str(len(b.data)))
+                self.end_headers()
+                return
+            return self._send(200, b.data, headers)
+        m = re.match(r"bytes=(\d+)-(\d*)", rng)
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else len(b.data) - 1
+        if start >= len(b.data) and len(b.data) > 0:
+            return self._error(416, "InvalidRange")
+        end = min(end, len(b.data) - 1)
+        chunk = b.data[start:end + 1]
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(b.data)}"
+        if self.headers.get("x-ms-range-get-content-md5") == "true":
+            headers["Content-MD5"] = base64.b64encode(hashlib.md5(chunk).digest()).decode()
+        else:
+            headers.pop("Content-MD5", None)
+            headers["x-ms-blob-content-md5"] = base64.b64encode(b.content_md5).decode()
+        return self._send(206, chunk, headers)
+
+    def do_PUT(self):
+        container, blob, q = self._route()
+        body = self._read_body()
+        with self.store.lock:
+            self.store.request_count += 1
+            if blob is None:
+                if q.get("restype") == "container":
+                    if container in self.store.containers:
+                        return self._error(409, "ContainerAlreadyExists")
+                    self.store.containers[container] = {}
+                    return self._send(201, headers={"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True)})
+                return self._error(400, "InvalidQueryParameterValue")
+            blobs = self.store.containers.get(container)
+            if blobs is None:
+                return self._error(404, "ContainerNotFound")
+            existing = blobs.get(blob)
+            comp = q.get("comp")
+            if comp == "block":
+                self.store.uncommitted.setdefault((container, blob), {})[q["blockid"]] = body
+                return self._send(201, headers={"Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode()})
+            if comp == "blocklist":
+                return self._put_block_list(container, blob, blobs, existing, body)
+            if comp == "tags":
+                if existing is None:
+                    return self._error(404, "BlobNotFound")
+                existing.tags = dict(re.findall(r"<Key>(.*?)</Key>\s*<Value>(.*?)</Value>", body.decode()))
+                return self._send(204)
+            if comp == "tier":
+                if existing is None:
+                    return self._error(404, "BlobNotFound")
+                existing.tier = self.headers.get("x-ms-access-tier")
+                return self._send(200)
+            if comp == "metadata":
+                if existing is None:
+                    return self._error(404, "BlobNotFound")
+                existing.metadata = self._metadata_from_headers()
+                return self._send(200, headers={"ETag": existing.etag, "Last-Modified": _http_date(existing.last_modified)})
+            copy_source = self.headers.get("x-ms-copy-source")
+            if copy_source:
+                return self._copy_blob(blobs, blob, existing, copy_source)
+            if not self._check_conditions(existing):
+                return
+            md5 = self.headers.get("x-ms-blob-content-md5")
+            new = _Blob(body,
+                        content_type=self.headers.get("x-ms-blob-content-type"),
+                        content_encoding=self.headers.get("x-ms-blob-content-encoding"),
+                        metadata=self._metadata_from_headers(),
+                        content_md5=base64.b64decode(md5) if md5 else None)
+            new.tags = self._tags_from_headers()
+            blobs[blob] = new
+            return self._send(201, headers={"ETag": new.etag, "Last-Modified": _http_date(new.last_modified),
+                                            "Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode(),
+                                            "x-ms-request-server-encrypted": "true"})
+
+    def do_DELETE(self):
+        container, blob, q = self._route()
+        with self.store.lock:
+            self.store.request_count += 1
+            blobs = self.store.containers.get(container)
+            if blobs is None:
+                return self._error(404, "ContainerNotFound")
+            if blob is None:
+                del self.store.containers[container]
+                return self._send(202)
+            if blobs.pop(blob, None) is None:
+                return self._error(404, "BlobNotFound")
+            return self._send(202)
+
+    def do_POST(self):
+        container, blob, q = self._route()
+        body = self._read_body()
+        with self.store.lock:
+            self.store.request_count += 1
+        if q.get("comp") == "batch":
+            return self._batch(container, body)
+        return self._error(400, "InvalidQueryParameterValue")
+
+    # -- operation helpers ----------------------------------------------------------------------
+    def _tags_from_headers(self):
+        tags = self.headers.get("x-ms-tags")
+        if not tags:
+            return {}
+        return {unquote(k): unquote(v) for k, v in (kv.split("=", 1) for kv in tags.split("&"))}
+
+    def _copy_blob(self, blobs, blob, existing, copy_source):
+        src = urlparse(copy_source)
+        parts = [unquote(p) for p in src.path.split("/")[1:]]
+        if parts and parts[0] == ACCOUNT_NAME:
+            parts = parts[1:]
+        src_container, src_blob = parts[0], "/".join(parts[1:])
+        src_obj = self.store.containers.get(src_container, {}).get(src_blob)
+        if src_obj is None:
+            return self._error(404, "CannotVerifyCopySource")
+        if not self._check_conditions(existing):
+            return
+        new = _Blob(src_obj.data, src_obj.content_type, dict(src_obj.metadata), src_obj.content_md5, src_obj.content_encoding)
+        new.metadata.update(self._metadata_from_headers())
+        new.tags = self._tags_from_headers()
+        blobs[blob] = new
+        return self._send(202, headers={"ETag": new.etag, "Last-Modified": _http_date(new.last_modified),
+                                        "x-ms-copy-id": str(uuid.uuid4()), "x-ms-copy-status": "success"})
+
+    def _batch(self, container, body):
+        """Blob Batch: multipart/mixed Delete Blob / Set Blob Tier sub-requests, answered in one multipart response"""
+        boundary = re.search(r"boundary=([^;\s]+)", self.headers.get("Content-Type", "")).group(1)
+        responses = []
+        for part in body.decode().split(f"--{boundary}")[1:]:
+            if part.startswith("--"):
+                break
+            content_id = re.search(r"Content-ID:\s*(\d+)", part, re.IGNORECASE).group(1)
+            request = part.split("\r\n\r\n", 1)[1]
+            request_line, _, rest = request.partition("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = dict(re.findall(r"^([\w\-]+):\s*(.*?)\r?$", rest.split("\r\n\r\n", 1)[0], re.MULTILINE))
+            url = urlparse(target)
+            parts = [unquote(p) for p in url.path.split("/")[1:]]
+            if parts and parts[0] == ACCOUNT_NAME:
+                parts = parts[1:]
+            blob_container, blob_name = parts[0], "/".join(parts[1:])
+            sub_query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+
+            with self.store.lock:
+                blobs = self.store.containers.get(blob_container, {})
+                existing = blobs.get(blob_name)
+                if existing is None:
+                    status, reason, code = 404, "The specified blob does not exist.", "BlobNotFound"
+                elif method == "DELETE":
+                    del blobs[blob_name]
+                    status, reason, code = 202, "Accepted", None
+                elif method == "PUT" and sub_query.get("comp") == "tier":
+                    existing.tier = headers.get("x-ms-access-tier")
+                    status, reason, code = 200, "OK", None
+                else:
+                    status, reason, code = 400, "Unsupported batch operation", "InvalidInput"
+
+            lines = [f"--batchresponse_{boundary}", "Content-Type: application/http", f"Content-ID: {content_id}", "",
+                     f"HTTP/1.1 {status} {reason}", f"x-ms-request-id: {uuid.uuid4()}", "x-ms-version: 2025-01-05"]
+            if code:
+                error = f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code><Message>{reason}</Message></Error>'
+                lines += [f"x-ms-error-code: {code}", "Content-Type: application/xml", f"Content-Length: {len(error)}", "", error]
+            else:
+                lines += ["", ""]
+            responses.append("\r\n".join(lines))
+        payload = ("\r\n".join(responses) + f"\r\n--batchresponse_{boundary}--\r\n").encode()
+        return self._send(202, payload, {"Content-Type": f"multipart/mixed; boundary=batchresponse_{boundary}"})
+
+    def _get_block_list(self, container, blob, b, q):
+        staged = self.store.uncommitted.get((container, blob), {})
+        if b is None and not staged:
+            return self._error(404, "BlobNotFound")
+        unc = "".join(f"<Block><Name>{bid}</Name><Size>{len(data)}</Size></Block>" for bid, data in staged.items())
+        body = (f'<?xml version="1.0" encoding="utf-8"?><BlockList><CommittedBlocks></CommittedBlocks>'
+                f'<UncommittedBlocks>{unc}</UncommittedBlocks></BlockList>').encode()
+        return self._send(200, body, {"Content-Type": "application/xml"})
+
+    def _put_block_list(self, container, blob, blobs, existing, body):
+        if not self._check_conditions(existing):
+            return
+        staged = self.store.uncommitted.get((container, blob), {})
+        ids = re.findall(r"<(?:Latest|Uncommitted|Committed)>(.*?)</(?:Latest|Uncommitted|Committed)>", body.decode())
+        try:
+            data = b"".join(staged[i] for i in ids)
+        except KeyError:
+            return self._error(400, "InvalidBlockList")
+        md5 = self.headers.get("x-ms-blob-content-md5")
+        new = _Blob(data,
+                    content_type=self.headers.get("x-ms-blob-content-type"),
+                    content_encoding=self.headers.get("x-ms-blob-content-encoding"),
+                    metadata=self._metadata_from_headers(),
+                    content_md5=base64.b64decode(md5) if md5 else None)
+        new.tags = self._tags_from_headers()
+        blobs[blob] = new
+        self.store.uncommitted.pop((container, blob), None)
+        return self._send(201, headers={"ETag": new.etag, "Last-Modified": _http_date(new.last_modified)})
+
+    def _list_containers(self, q):
+        names = sorted(self.store.containers)
+        items = "".join(f"<Container><Name>{escape(n)}</Name><Properties><Last-Modified>{formatdate(usegmt=True)}</Last-Modified>"
+                        f"<Etag>\"0x1\"</Etag></Properties></Container>" for n in names)
+        body = (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="http://fake/">'
+                f'<Containers>{items}</Containers><NextMarker/></EnumerationResults>').encode()
+        return self._send(200, body, {"Content-Type": "application/xml"})
+
+    def _list_blobs(self, container, blobs, q):
+        prefix = q.get("prefix", "")
+        marker = q.get("marker", "")
+        delimiter = q.get("delimiter")
+        maxresults = int(q.get("maxresults", 5000))
+        include = set(q.get("include", "").split(","))
+        with self.store.lock:
+            names = sorted(n for n in blobs if n.startswith(prefix) and n > marker)
+            snapshot = {n: blobs[n] for n in names}
+        out, seen_prefixes, next_marker, out_last = [], set(), "", ""
+        count = 0
+        for n in names:
+            if count >= maxresults:
+                next_marker = out_last
+                break
+            if delimiter:
+                rest = n[len(prefix):]
+                idx = rest.find(delimiter)
+                if idx >= 0:
+                    p = prefix + rest[:idx + len(delimiter)]
+                    if p not in seen_prefixes and p > marker:
+                        seen_prefixes.add(p)
+                        out.append(f"<BlobPrefix><Name>{escape(p)}</Name></BlobPrefix>")
+                        count += 1
+                    out_last = n
+                    continue
+            b = snapshot[n]
+            meta = ""
+            if "metadata" in include:
+                meta = "<Metadata>" + "".join(f"<{k}>{escape(v)}</{k}>" for k, v in b.metadata.items()) + "</Metadata>"
+            tags = ""
+            if "tags" in include and b.tags:
+                tags = "<Tags><TagSet>" + "".join(f"<Tag><Key>{escape(k)}</Key><Value>{escape(v)}</Value></Tag>"
+                                                  for k, v in b.tags.items()) + "</TagSet></Tags>"
+            out.append(
+                f"<Blob><Name>{escape(n)}</Name><Properties>"
+                f"<Last-Modified>{_http_date(b.last_modified)}</Last-Modified><Etag>{b.etag}</Etag>"
+                f"<Content-Length>{len(b.data)}</Content-Length><Content-Type>{escape(b.content_type)}</Content-Type>"
+                f"<Content-MD5>{base64.b64encode(b.content_md5).decode()}</Content-MD5>"
+                f"<BlobType>BlockBlob</BlobType><AccessTier>{b.tier}</AccessTier></Properties>{meta}{tags}</Blob>")
+            count += 1
+            out_last = n
+        body = (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="http://fake/" '
+                f'ContainerName="{escape(container)}"><Prefix>{escape(prefix)}</Prefix>'
+                f'<MaxResults>{maxresults}</MaxResults><Blobs>{"".join(out)}</Blobs>'
+                f'<NextMarker>{escape(next_marker)}</NextMarker></EnumerationResults>').encode()
+        return self._send(200, body, {"Content-Type": "application/xml"})
+
+    def _find_by_tags(self, container, q):
+        where = unquote(q.get("where", ""))
+        conds = re.findall(r'"?([\w\-]+)"?\s*=\s*\'(.*?)\'', where)
+        scope = {container: self.store.containers.get(container, {})} if container else self.store.containers
+        out = []
+        for c, blobs in sorted(scope.items()):
+            for n, b in sorted(blobs.items()):
+                if conds and all(b.tags.get(k) == v for k, v in conds):
+                    t = "".join(f"<Tag><Key>{escape(k)}</Key><Value>{escape(v)}</Value></Tag>" for k, v in b.tags.items())
+                    out.append(f"<Blob><Name>{escape(n)}</Name><ContainerName>{escape(c)}</ContainerName>"
+                               f"<Tags><TagSet>{t}</TagSet></Tags></Blob>")
+        body = (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="http://fake/">'
+                f'<Where>{escape(where)}</Where><Blobs>{"".join(out)}</Blobs><NextMarker/></EnumerationResults>').encode()
+        return self._send(200, body, {"Content-Type": "application/xml"})
+
+
+class FakeBlobServer:
+    """Run a FakeBlobStore behind a local HTTP server on a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.store = FakeBlobStore()
+        handler = type("Handler", (_Handler,), {"store": self.store, "latency": latency_ms / 1000})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{ACCOUNT_NAME}"
+
+    @property
+    def connection_string(self) -> str:
+        return (f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};"
+                f"BlobEndpoint={self.endpoint};")
+
+    def create_container(self, name: str) -> None:
+        with self.store.lock:
+            self.store.containers.setdefault(name, {})
+
+    def start(self) -> "FakeBlobServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,240 @@
+"""Offline benchmarks for azb_manager, run against an in-process fake Blob endpoint (or Azurite).
+
+With the package installed (`pip install -e .`), results are printed (or written with --output) as JSON
+so they can be compared between releases:
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --connection-string "<azurite connection string>"
+
+Timings against the fake server measure the client side (request construction, parsing, local I/O and
+concurrency overheads) over loopback; they are not a model of service-side latency.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from azure.storage.blob import BlobServiceClient
+
+import azb_manager
+from azb_manager.azb_manager import AzureBlobContainerManager, AzureBlobStorageAccountManager
+
+from .fake_blob_server import FakeBlobServer
+
+MB = 1024 * 1024
+
+
+def _timed(fn: Callable, repeat: int = 1) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _latency_stats(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+
+class BenchmarkContext:
+    def __init__(self, connection_string: str, scratch_dir: str):
+        self.connection_string = connection_string
+        self.scratch_dir = scratch_dir
+        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+
+    def new_container(self) -> AzureBlobContainerManager:
+        name = f"bench-{uuid.uuid4().hex[:12]}"
+        self.service_client.create_container(name)
+        return AzureBlobContainerManager(connection_str=self.connection_string,
+                                         container_name=name,
+                                         download_dir=self.scratch_dir)
+
+    def fill(self, manager: AzureBlobContainerManager, count: int, size: int = 16) -> List[str]:
+        src = os.path.join(self.scratch_dir, f"fill-{uuid.uuid4().hex[:8]}")
+        os.makedirs(src)
+        payload = os.urandom(size)
+        for i in range(count):
+            with open(os.path.join(src, f"blob-{i:07d}.bin"), "wb") as f:
+                f.write(payload)
+        manager.sync_up(src, prefix="data", max_concurrency=32)
+        shutil.rmtree(src)
+        return [f"data/blob-{i:07d}.bin" for i in range(count)]
+
+
+def bench_list(ctx: BenchmarkContext, sizes: List[int]) -> List[dict]:
+    results = []
+    for size in sizes:
+        manager = ctx.new_container()
+        ctx.fill(manager, size)
+        seconds = min(_timed(lambda: sum(1 for _ in manager.iter_blobs()), repeat=3))
+        results.append({"container_size": size, "seconds": seconds, "blobs_per_second": size / seconds})
+    return results
+
+
+def _require_hits(results: List[bool], what: str) -> None:
+    # Every probe names an existing blob; a miss means the numbers would be for the wrong (cheaper) path
+    if not all(results):
+        raise RuntimeError(f"{what} reported {results.count(False)} of {len(results)} existing blobs as missing")
+
+
+def bench_has_blob(ctx: BenchmarkContext, container_size: int, probes: int) -> dict:
+    manager = ctx.new_container()
+    names = ctx.fill(manager, container_size)
+    probe_names = [names[i % len(names)] for i in range(probes)]
+
+    found = []
+    head = [_timed(lambda n=n: found.append(manager.has_blob(blob_name=n, use_index=False)))[0] for n in probe_names]
+    _require_hits(found, "has_blob() (HEAD)")
+
+    indexed = AzureBlobContainerManager(container_client=manager.container_client, index_blobs=True, index_ttl=None)
+    build = _timed(indexed.refresh_blob_index)[0]
+    found = []
+    lookups = [_timed(lambda n=n: found.append(indexed.has_blob(blob_name=n)))[0] for n in probe_names]
+    _require_hits(found, "has_blob() (index)")
+    bulk_result = {}
+    bulk = _timed(lambda: bulk_result.update(indexed.has_blobs(blob_names=names)))[0]
+    _require_hits([bulk_result.get(n, False) for n in names], "has_blobs()")
+
+    return {
+        "container_size": container_size,
+        "head": _latency_stats(head),
+        "index_build_seconds": build,
+        "index_lookup": _latency_stats(lookups),
+        "has_blobs_all_seconds": bulk,
+    }
+
+
+def bench_small_files(ctx: BenchmarkContext, count: int, size: int, concurrencies: List[int]) -> dict:
+    src = os.path.join(ctx.scratch_dir, "small-src")
+    os.makedirs(src, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(src, f"f{i:06d}.bin"), "wb") as f:
+            f.write(os.urandom(size))
+
+    serial_manager = ctx.new_container()
+    files = sorted(os.listdir(src))
+    upload_serial = _timed(lambda: [serial_manager.upload_blob(file_name=os.path.join(src, f), overwrite=True) for f in files])[0]
+    download_serial = _timed(lambda: [serial_manager.download_blob_bytes(f) for f in files])[0]
+
+    results = {
+        "file_count": count,
+        "file_size": size,
+        "serial": {"upload_ops_per_second": count / upload_serial, "download_ops_per_second": count / download_serial},
+        "sync": [],
+    }
+    for concurrency in concurrencies:
+        manager = ctx.new_container()
+        dst = os.path.join(ctx.scratch_dir, f"small-dst-{concurrency}")
+        up = manager.sync_up(src, prefix="small", max_concurrency=concurrency)
+        down = manager.sync_down("small", dst, max_concurrency=concurrency)
+        results["sync"].append({"max_concurrency": concurrency,
+                                "upload_ops_per_second": up["files_per_second"],
+                                "download_ops_per_second": down["files_per_second"]})
+        shutil.rmtree(dst)
+    shutil.rmtree(src)
+    return results
+
+
+def bench_large_blob(ctx: BenchmarkContext, size_mb: int, concurrencies: List[int], chunk_sizes_mb: List[int]) -> dict:
+    path = os.path.join(ctx.scratch_dir, "large.bin")
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(MB))
+    manager = ctx.new_container()
+
+    results = {"size_mb": size_mb, "upload": [], "download": []}
+    for concurrency in concurrencies:
+        for chunk_mb in chunk_sizes_mb:
+            seconds = _timed(lambda: manager.upload_blob(file_name=path, blob_name="large.bin", overwrite=True, staged=True,
+                                                         block_size=chunk_mb * MB, max_concurrency=concurrency))[0]
+            results["upload"].append({"max_concurrency": concurrency, "block_size_mb": chunk_mb, "mb_per_second": size_mb / seconds})
+
+            out = os.path.join(ctx.scratch_dir, "large.out")
+            seconds = _timed(lambda: manager.download_blob_file("large.bin", download_path=out,
+                                                               max_concurrency=concurrency, chunk_size=chunk_mb * MB))[0]
+            results["download"].append({"max_concurrency": concurrency, "chunk_size_mb": chunk_mb, "mb_per_second": size_mb / seconds})
+            os.remove(out)
+    os.remove(path)
+    return results
+
+
+def bench_construction(ctx: BenchmarkContext, container_count: int, repeat: int) -> dict:
+    names = [ctx.new_container().container_name for _ in range(container_count)]
+    container = _timed(lambda: AzureBlobContainerManager(connection_str=ctx.connection_string, container_name=names[0]), repeat=repeat)
+    account = _timed(lambda: AzureBlobStorageAccountManager(storage_account_name="bench",
+                                                            connection_str=ctx.connection_string,
+                                                            containers=names), repeat=repeat)
+    return {
+        "container_manager": _latency_stats(container),
+        "account_manager": dict(_latency_stats(account), container_count=container_count),
+    }
+
+
+def run(connection_string: Optional[str] = None, quick: bool = False, latency_ms: float = 2.0) -> dict:
+    """Run every benchmark and return the results as a JSON-serializable dict"""
+    server = None
+    if connection_string is None:
+        server = FakeBlobServer(latency_ms=latency_ms).start()
+        connection_string = server.connection_string
+
+    scratch_dir = tempfile.mkdtemp(prefix="azb-bench-")
+    ctx = BenchmarkContext(connection_string, scratch_dir)
+    try:
+        results = {
+            "azb_manager_version": azb_manager.__version__,
+            "python": platform.python_version(),
+            "backend": "fake" if server else "external",
+            "fake_latency_ms": latency_ms if server else None,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "list": bench_list(ctx, [100, 1000] if quick else [100, 1000, 10000]),
+            "has_blob": bench_has_blob(ctx, 500 if quick else 5000, 20 if quick else 200),
+            "small_files": bench_small_files(ctx, 50 if quick else 500, 4096, [1, 8] if quick else [1, 8, 32]),
+            "large_blob": bench_large_blob(ctx, 8 if quick else 64, [1, 4] if quick else [1, 4, 8], [1, 4] if quick else [1, 4, 8]),
+            "construction": bench_construction(ctx, 10 if quick else 100, 5 if quick else 20),
+        }
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        if server is not None:
+            server.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connection-string", default=None,
+                        help="Run against this endpoint (e.g. Azurite) instead of the in-process fake")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--latency-ms", type=float, default=2.0,
+                        help="Simulated round-trip time added to each request by the fake server")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads, for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    # The managers report through logging (stderr unless configured otherwise); still keep anything a
+    # workload or the SDK prints off stdout, which may be carrying the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(connection_string=args.connection_string, quick=args.quick, latency_ms=args.latency_ms)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
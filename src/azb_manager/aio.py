@@ -0,0 +1,241 @@
+"""Asyncio counterparts of the container and storage account managers, built on azure.storage.blob.aio.
+
+Requires an async HTTP transport for the Azure SDK (install with the `aio` extra, i.e. aiohttp).
+"""
+import os
+from io import BytesIO
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
+
+from .azb_manager import AzureBlobContainerManager, BlobPage
+from .sas import BlobUrlSigner
+
+
+class AsyncAzureBlobContainerManager:
+    def __init__(self,
+                 connection_str:Optional[str]=None,
+                 container_name:Optional[str]=None,
+                 download_dir:Optional[str]=".",
+                 container_client:Optional[ContainerClient]=None):
+        """Asyncio wrapper for common use cases when working with a container in Azure.
+
+        Use as an async context manager (`async with AsyncAzureBlobContainerManager(...) as m:`)
+        or call close() when done, so the underlying HTTP session is released.
+
+        Args:
+            connection_str (Optional[str]): Connection string to an Azure storage account.
+            container_name (Optional[str]): Name of a container in the storage account.
+            download_dir (Optional[str]): Optional default directory to download files to.
+            container_client (Optional[ContainerClient]): Existing async container client to wrap instead
+                (e.g. one sharing its transport with an account manager). It is not closed by this manager.
+        """
+        if container_client is None:
+            if not (connection_str and container_name):
+                raise ValueError("Must provide connection_str and container_name, or container_client.")
+            container_client = ContainerClient.from_connection_string(conn_str=connection_str, container_name=container_name)
+            self._owns_client = True
+        else:
+            self._owns_client = False
+
+        self.container_client = container_client
+        self.container_name = container_client.container_name
+        self.url_signer = BlobUrlSigner(container_client)
+        self.download_dir = download_dir
+
+    async def __aenter__(self) -> "AsyncAzureBlobContainerManager":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._owns_client:
+            await self.container_client.close()
+
+    async def list_blobs(self,
+                         name_starts_with:Optional[str]=None,
+                         fields:Optional[Sequence[str]]=None,
+                         delimiter:Optional[str]=None,
+                         results_per_page:Optional[int]=None) -> AsyncIterator[Union[str, dict]]:
+        """Lazily iterate over the blobs in the container (see AzureBlobContainerManager.iter_blobs())"""
+        async for page in self.iter_blob_pages(name_starts_with=name_starts_with,
+                                               fields=fields,
+                                               delimiter=delimiter,
+                                               results_per_page=results_per_page):
+            for item in page['items']:
+                yield item
+
+    async def iter_blob_pages(self,
+                              name_starts_with:Optional[str]=None,
+                              fields:Optional[Sequence[str]]=None,
+                              delimiter:Optional[str]=None,
+                              results_per_page:Optional[int]=None,
+                              continuation_token:Optional[str]=None) -> AsyncIterator[BlobPage]:
+        """Lazily iterate over pages of the blob listing (see AzureBlobContainerManager.iter_blob_pages())"""
+        include = AzureBlobContainerManager._list_include(fields)
+
+        if delimiter:
+            paged = self.container_client.walk_blobs(name_starts_with=name_starts_with,
+                                                     include=include,
+                                                     delimiter=delimiter,
+                                                     results_per_page=results_per_page)
+        else:
+            paged = self.container_client.list_blobs(name_starts_with=name_starts_with,
+                                                     include=include,
+                                                     results_per_page=results_per_page)
+
+        pages = paged.by_page(continuation_token=continuation_token)
+        async for page in pages:
+            items = [AzureBlobContainerManager._project_blob(blob, fields) async for blob in page]
+            yield BlobPage(items=items, continuation_token=pages.continuation_token)
+
+    def get_blob_url(self, file_name:str, include_sas=False, expiry_hours=1) -> str:
+        """Get the url of a blob in the container (signing needs no request, so this is not a coroutine)"""
+        blob_base = os.path.basename(file_name)
+        return self.url_signer.blob_urls([blob_base], include_sas=include_sas, expiry_hours=expiry_hours)[0]
+
+    def get_blob_urls(self, blob_names:Iterable[str], include_sas=True, expiry_hours=1, permission='r') -> List[str]:
+        """Get the urls of many blobs in the container in one batch (see AzureBlobContainerManager.get_blob_urls())"""
+        return self.url_signer.blob_urls(blob_names, include_sas=include_sas, permission=permission, expiry_hours=expiry_hours)
+
+    async def has_blob(self, file_name:Optional[str]=None, blob_name:Optional[str]=None) -> bool:
+        """Check if the container has a blob of the given name (single HEAD request).
+        file_name is checked by its basename, blob_name as is (see AzureBlobContainerManager.has_blob())"""
+        blob_name = AzureBlobContainerManager._existence_name(file_name, blob_name)
+        return await self.container_client.get_blob_client(blob_name).exists()
+
+    async def has_blobs(self, file_names:Optional[Iterable[str]]=None, blob_names:Optional[Iterable[str]]=None) -> Dict[str, bool]:
+        """Check if the container has blobs of each of the given names in one listing pass, keyed by the given names"""
+        if (file_names is None) == (blob_names is None):
+            raise ValueError("Must provide exactly one of file_names or blob_names.")
+        keys = list(file_names if blob_names is None else blob_names)
+        names = {key: os.path.basename(key) if blob_names is None else key for key in keys}
+        if not keys:
+            return {}
+        remaining = set(names.values())
+        found = set()
+        prefix = os.path.commonprefix(list(remaining))
+        async for name in self.list_blobs(name_starts_with=prefix or None):
+            if name in remaining:
+                remaining.discard(name)
+                found.add(name)
+                if not remaining:
+                    break
+        return {key: names[key] in found for key in keys}
+
+    async def download_blob_file(self, blob_name:str, download_path=None, max_concurrency:int=1) -> None:
+        """Download a blob from the container to local storage."""
+        if download_path is None:
+            download_path = os.path.join(self.download_dir, os.path.basename(blob_name))
+
+        downloader = await self.container_client.get_blob_client(blob_name).download_blob(max_concurrency=max_concurrency)
+        with open(download_path, "wb") as file:
+            await downloader.readinto(file)
+
+    async def download_blob_bytes(self, blob_name:str, max_concurrency:int=1) -> BytesIO:
+        """Download a blob from the container directly to a BytesIO Stream"""
+        blob_data = BytesIO()
+        downloader = await self.container_client.get_blob_client(blob_name).download_blob(max_concurrency=max_concurrency)
+        await downloader.readinto(blob_data)
+        blob_data.seek(0)
+        return blob_data
+
+    async def upload_blob(self, data=None, file_name=None, blob_name=None, overwrite=False, encode_json=False, max_concurrency:int=1) -> dict:
+        """Upload a blob to blob storage in Azure (see AzureBlobContainerManager.upload_blob())"""
+        AzureBlobContainerManager._check_upload_args(data, file_name, blob_name)
+
+        if file_name:
+            if blob_name is None:
+                blob_name = os.path.basename(file_name)
+            blob_client = self.container_client.get_blob_client(blob_name)
+            with open(file_name, "rb") as file:
+                return await blob_client.upload_blob(file, overwrite=overwrite, max_concurrency=max_concurrency)
+
+        blob_client = self.container_client.get_blob_client(blob_name)
+        return await blob_client.upload_blob(AzureBlobContainerManager._prepare_upload_data(data, encode_json),
+                                             overwrite=overwrite,
+                                             max_concurrency=max_concurrency)
+
+
+class AsyncAzureBlobStorageAccountManager:
+    def __init__(self,
+                 storage_account_name:str,
+                 connection_str:str,
+                 containers:Optional[list]=None,
+                 download_dir:Optional[str]="."):
+        """Asyncio wrapper for common use cases when working with a storage account in Azure via connection string.
+
+        Container managers are set as attributes when the manager is opened (`async with ...` or `await open()`),
+        all sharing the one HTTP session of the account's BlobServiceClient.
+
+        Args:
+            connection_str (str): Connection string to an Azure storage account.
+            containers (Optional[list]): Names of containers in the storage account to use (default is all of them).
+            download_dir (Optional[str]): Optional default directory to download files to.
+        """
+        self._connection_str = connection_str
+        self._storage_account = storage_account_name
+        self._containers = containers
+        self.download_dir = download_dir
+        self.blob_service_client = BlobServiceClient.from_connection_string(self._connection_str)
+        self.container_managers = {}
+
+    async def __aenter__(self) -> "AsyncAzureBlobStorageAccountManager":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> "AsyncAzureBlobStorageAccountManager":
+        """Set a container manager attribute for each container"""
+        container_list = self._containers if self._containers else \
+            await self.list_containers(include_metadata=False)
+
+        for container_name in container_list:
+            container_manager = AsyncAzureBlobContainerManager(
+                                container_client=self.blob_service_client.get_container_client(container_name),
+                                download_dir=self.download_dir)
+            self.container_managers[container_name] = container_manager
+            setattr(self, container_name, container_manager)
+
+        return self
+
+    async def close(self) -> None:
+        """Close the account's HTTP session (shared by every container manager)"""
+        await self.blob_service_client.close()
+
+    async def list_containers(self, include_metadata=False) -> list:
+        """List containers in the storage account along with optional metadata"""
+        container_list = [c async for c in self.blob_service_client.list_containers(include_metadata=include_metadata)]
+
+        if include_metadata:
+            return [{'name':c['name'], 'metadata':c['metadata']} for c in container_list]
+        else:
+            return [c['name'] for c in container_list]
+
+    def _get_container_manager(self, container_name:str) -> AsyncAzureBlobContainerManager:
+        try:
+            return self.container_managers[container_name]
+        except KeyError:
+            raise AttributeError(f"Container '{container_name}' not set in attributes.")
+
+    async def upload_blob(self, container_name, **kwargs) -> dict:
+        """Wrapper for AsyncAzureBlobContainerManager.upload_blob()"""
+        return await self._get_container_manager(container_name).upload_blob(**kwargs)
+
+    async def download_blob_file(self, container_name, **kwargs) -> None:
+        """Wrapper for AsyncAzureBlobContainerManager.download_blob_file()"""
+        return await self._get_container_manager(container_name).download_blob_file(**kwargs)
+
+    async def download_blob_bytes(self, container_name, **kwargs) -> BytesIO:
+        """Wrapper for AsyncAzureBlobContainerManager.download_blob_bytes()"""
+        return await self._get_container_manager(container_name).download_blob_bytes(**kwargs)
+
+    @property
+    def connection_str(self):
+        return self._connection_str
+
+    @property
+    def storage_account(self):
+        return self._storage_account
@@ -1,93 +1,842 @@
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas, ContainerClient, BlobClient
+from azure.storage.blob import BlobServiceClient, ContainerClient, BlobClient, BlobPrefix, ContentSettings
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 import os
 from functools import wraps
-import datetime as dt 
 import re
 from typing_extensions import TypedDict
 import json 
-from io import BytesIO
-from typing import Optional 
+import logging 
+from io import BytesIO, IOBase
+import threading 
+import hashlib
+import shutil
+import mmap
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union 
+from .batch import DEFAULT_BATCH_CONCURRENCY, DEFAULT_TAGS_CONCURRENCY, BatchSummary, batch_delete, batch_set_tier, bulk_set_tags
+from .blob_index import BlobNameIndex
+from .cache import BlobCache
+from .dedup import CONTENT_HASH_TAG, DEFAULT_DEDUP_MIN_SIZE, ContentIndex, content_digests
+from .changes import BlobChanges, iter_changes
+from .fanout import DEFAULT_FANOUT_CONCURRENCY, FanoutResults, FanoutTask, merge_concurrently
+from .metrics import MetricsSink, current_operation, in_operation
+from .encoding import COMPRESSIONS, JSON_FORMATS, compress_chunks, iter_json_chunks, rechunk
+from .reader import DEFAULT_CACHED_BLOCKS, DEFAULT_READ_AHEAD, DEFAULT_READ_BLOCK_SIZE, BlobReader
+from .retry import DEFAULT_RETRY_TOTAL, AccountThrottle, ThrottledRetryPolicy, confirm_content_md5, create_idempotently
+from .sas import BlobUrlSigner
+from .server_copy import DEFAULT_COPY_CONCURRENCY, DEFAULT_SOURCE_SAS_HOURS, BlobCopyError, copy_blob, copy_many
+from .sync import DEFAULT_SYNC_CONCURRENCY, SyncSummary, _file_md5, sync_down, sync_up
+from .transfer import DEFAULT_BLOCK_SIZE, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_CONCURRENCY, download_to_buffer, download_to_file, map_readonly, upload_chunks_in_blocks, upload_file_in_blocks
+from .transport import DEFAULT_CONNECTION_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT, build_transport
+
+# Fields that list_blobs()/iter_blobs() can project from each listed blob, and the `include=` option the service needs to return them 
+BLOB_FIELDS = {
+    'name': None, 
+    'size': None, 
+    'etag': None, 
+    'last_modified': None, 
+    'content_md5': None, 
+    'content_type': None, 
+    'blob_tier': None, 
+    'tags': 'tags', 
+    'metadata': 'metadata', 
+}
+
+logger = logging.getLogger(__name__)
+
+def _instrumented(operation:str): 
+    """(Internal Helper) Report calls of a manager method to the manager's metrics sink, if it has one. 
+
+    Calls made while another operation is being reported on the same thread (e.g. upload_blob() streaming 
+    through upload_json_stream()) are counted as part of it rather than separately. 
+    """
+    def decorator(method): 
+        @wraps(method)
+        def wrapper(self, *args, **kwargs): 
+            if self.metrics is None or in_operation(): 
+                return method(self, *args, **kwargs)
+            # Account managers have no container_name (their __getattr__ raises AttributeError) 
+            with self.metrics.operation(operation, container=getattr(self, 'container_name', None)): 
+                return method(self, *args, **kwargs)
+        return wrapper 
+    return decorator 
+
+def _instrumented_iter(metrics:Optional[MetricsSink], operation:str, items:Iterable, container:Optional[str]=None) -> Iterator: 
+    """(Internal Helper) Report a lazily consumed iteration as one operation, from its first to its last item"""
+    if metrics is None: 
+        return (yield from items)
+    # Not tracked as the thread's current operation: the consumer runs its own code between items 
+    with metrics.operation(operation, track=False, container=container): 
+        return (yield from items)
+
+class BlobPage(TypedDict): 
+    """One page of a blob listing. Pass continuation_token back to iter_blob_pages() to resume after this page."""
+    items: List[Union[str, dict]]
+    continuation_token: Optional[str]
 
 class AzureBlobContainerManager: 
-    def __init__(self, connection_str:str, container_name:str, download_dir:Optional[str]="."): 
+    def __init__(self, connection_str:Optional[str]=None, container_name:Optional[str]=None, download_dir:Optional[str]=".", 
+                 index_blobs:bool=False, index_ttl:Optional[float]=300, index_path:Optional[str]=None, 
+                 container_client:Optional[ContainerClient]=None, user_delegation_sas:bool=False, 
+                 cache:Optional[BlobCache]=None, throttle:Optional[AccountThrottle]=None, retry_total:int=DEFAULT_RETRY_TOTAL, 
+                 metrics:Optional[MetricsSink]=None, dedup:bool=False, dedup_index_path:Optional[str]=None, 
+                 dedup_min_size:int=DEFAULT_DEDUP_MIN_SIZE): 
         """Wrapper for common use cases when working with a designated storage account in Azure. 
 
         Args: 
             connection_str (str): Connection string to an Azure storage account. 
             container (str): Name of a containers in the storage account. 
             download_dir (Optional[str]): Optional default directory to download files to. 
+            index_blobs (bool): Whether to keep a local index of blob names to answer has_blob()/has_blobs() from. 
+            index_ttl (Optional[float]): Seconds before the blob name index is rebuilt from a fresh listing (None = never). 
+            index_path (Optional[str]): Optional SQLite file to hold the blob name index on disk (for very large containers). 
+            container_client (Optional[ContainerClient]): Existing container client to wrap instead of connecting from 
+                connection_str (e.g. one sharing its transport with an account manager). 
+            user_delegation_sas (bool): Sign SAS urls with a (cached) user delegation key instead of the account key. 
+            cache (Optional[BlobCache]): Local read-through cache for download_blob_file()/download_blob_bytes() 
+                (may be shared by several managers, and by processes using the same cache_dir). 
+            throttle (Optional[AccountThrottle]): Rate/concurrency limits and counters for requests (when connecting from connection_str; 
+                an account manager passes its own). 
+            retry_total (int): Maximum number of retries of a failed or throttled request (when connecting from connection_str). 
+            metrics (Optional[MetricsSink]): Sink to report each operation's latency, bytes, retries and list pages to 
+                (e.g. a MetricsRecorder, LoggingSink or OpenTelemetrySink; default None reports nothing, at no cost). 
+            dedup (bool): Make upload_blob() content-addressed: content already held by a blob in the container is 
+                copied server-side instead of uploaded again. 
+            dedup_index_path (Optional[str]): Optional SQLite file to keep the local content hash index in (implies dedup). 
+            dedup_min_size (int): Smallest upload (bytes) worth looking up existing content for. 
         """
-        self.container_name = container_name
-        self.container_client = ContainerClient.from_connection_string(conn_str=connection_str, container_name=self.container_name)
+        if container_client is None: 
+            if not (connection_str and container_name): 
+                raise ValueError("Must provide connection_str and container_name, or container_client.")
+            throttle = throttle if throttle is not None else AccountThrottle()
+            container_client = ContainerClient.from_connection_string(conn_str=connection_str, container_name=container_name, 
+                                                                      retry_policy=ThrottledRetryPolicy(throttle, retry_total=retry_total))
+
+        self.container_name = container_client.container_name
+        self.container_client = container_client
+        self.url_signer = BlobUrlSigner(container_client, user_delegation=user_delegation_sas)
         self.download_dir = download_dir 
+        self.blob_index = BlobNameIndex(ttl=index_ttl, path=index_path) if (index_blobs or index_path) else None 
+        self.cache = cache 
+        self.throttle = throttle 
+        self.metrics = metrics 
+        self.content_index = ContentIndex(path=dedup_index_path) if (dedup or dedup_index_path) else None 
+        self.dedup_min_size = dedup_min_size 
+
+    def list_blobs(self, name_only=False, name_starts_with:Optional[str]=None) -> list: 
+        """Wrapper to list blobs in the container (Default to just blob names). 
+        
+        Materializes the whole listing; use iter_blobs()/iter_blob_pages() to stream large containers.
+        """
+        fields = None if name_only else ('name', 'tags')
+        return list(self.iter_blobs(name_starts_with=name_starts_with, fields=fields))
+
+    def iter_blobs(self, 
+                   name_starts_with:Optional[str]=None, 
+                   fields:Optional[Sequence[str]]=None, 
+                   delimiter:Optional[str]=None, 
+                   results_per_page:Optional[int]=None) -> Iterator[Union[str, dict]]: 
+        """Lazily iterate over the blobs in the container, fetching one page from the service at a time. 
+
+        Args: 
+            name_starts_with (Optional[str]): Only list blobs whose names begin with this prefix (filtered server-side). 
+            fields (Optional[Sequence[str]]): Fields to return for each blob (see BLOB_FIELDS). If None, yield just the names. 
+            delimiter (Optional[str]): List one level of a virtual directory hierarchy (e.g. '/'). 
+                Sub-directories are yielded as their prefix (ending in the delimiter), or as {'name': prefix, 'is_prefix': True} when fields are given. 
+            results_per_page (Optional[int]): Maximum number of blobs the service returns per page. 
+        """
+        for page in self.iter_blob_pages(name_starts_with=name_starts_with, 
+                                         fields=fields, 
+                                         delimiter=delimiter, 
+                                         results_per_page=results_per_page): 
+            yield from page['items']
+
+    def iter_blob_pages(self, 
+                        name_starts_with:Optional[str]=None, 
+                        fields:Optional[Sequence[str]]=None, 
+                        delimiter:Optional[str]=None, 
+                        results_per_page:Optional[int]=None, 
+                        continuation_token:Optional[str]=None) -> Iterator[BlobPage]: 
+        """Lazily iterate over pages of the blob listing, each with the continuation token to resume after it. 
 
-    def list_blobs(self, name_only=False) -> list: 
-        """Wrapper to list blobs in the container (Default to just blob names)"""
+        Args: 
+            name_starts_with, fields, delimiter, results_per_page: See iter_blobs(). 
+            continuation_token (Optional[str]): Token from a previous BlobPage to resume the listing from. 
+        """
+        include = self._list_include(fields)
 
-        blob_list = self.container_client.list_blobs()
-        if not name_only:
-            return [{'name':{blob.name}, "tags":blob.tags} for blob in blob_list] 
+        if delimiter: 
+            paged = self.container_client.walk_blobs(name_starts_with=name_starts_with, 
+                                                     include=include, 
+                                                     delimiter=delimiter, 
+                                                     results_per_page=results_per_page)
         else: 
-            return [blob.name for blob in blob_list] 
+            paged = self.container_client.list_blobs(name_starts_with=name_starts_with, 
+                                                     include=include, 
+                                                     results_per_page=results_per_page)
+
+        pages = paged.by_page(continuation_token=continuation_token)
+        if self.metrics is None: 
+            for page in pages: 
+                items = [self._project_blob(blob, fields) for blob in page]
+                yield BlobPage(items=items, continuation_token=pages.continuation_token)
+            return 
+
+        # Not tracked as the thread's current operation: the consumer runs its own code between pages 
+        with self.metrics.operation('list', track=False, container=self.container_name) as op: 
+            for page in pages: 
+                items = [self._project_blob(blob, fields) for blob in page]
+                op.pages += 1 
+                yield BlobPage(items=items, continuation_token=pages.continuation_token)
+
+    @staticmethod
+    def _list_include(fields:Optional[Sequence[str]]) -> Optional[List[str]]: 
+        """(Internal Helper) Validate requested fields and map them to the listing's `include=` option"""
+        if fields is not None: 
+            unknown = [f for f in fields if f not in BLOB_FIELDS]
+            if unknown: 
+                raise ValueError(f"Unknown blob field(s) {unknown}. Must be among {', '.join(BLOB_FIELDS)}")
+        return sorted({BLOB_FIELDS[f] for f in (fields or ()) if BLOB_FIELDS[f]}) or None 
+
+    @staticmethod
+    def _project_blob(blob, fields:Optional[Sequence[str]]) -> Union[str, dict]: 
+        """(Internal Helper) Reduce a listed BlobProperties (or virtual directory prefix) to the requested fields"""
+        if fields is None: 
+            return blob.name 
+        if isinstance(blob, BlobPrefix): 
+            return {'name': blob.name, 'is_prefix': True}
+
+        projected = {}
+        for f in fields: 
+            if f == 'content_md5': 
+                md5 = blob.content_settings.content_md5
+                projected[f] = bytes(md5) if md5 else None 
+            elif f == 'content_type': 
+                projected[f] = blob.content_settings.content_type
+            else: 
+                projected[f] = getattr(blob, f)
+        return projected 
         
+    def find_blobs_by_tags(self, 
+                           expression:str, 
+                           name_only:bool=False, 
+                           results_per_page:Optional[int]=None) -> Iterator[Union[str, dict]]: 
+        """Lazily iterate over the blobs in the container matching a tag expression, using the service's tag index. 
+
+        Args: 
+            expression (str): Tag filter, e.g. "tenant = 'x' AND \"year\" >= '2023'" (see the Find Blobs by Tags docs). 
+            name_only (bool): Yield just blob names instead of {'name', 'container_name', 'tags'} dicts. 
+            results_per_page (Optional[int]): Maximum number of blobs the service returns per page. 
+        """
+        blobs = self.container_client.find_blobs_by_tags(expression, results_per_page=results_per_page)
+        for blob in _instrumented_iter(self.metrics, 'find_by_tags', blobs, container=self.container_name): 
+            yield blob.name if name_only else self._project_filtered_blob(blob)
+
+    @staticmethod
+    def _project_filtered_blob(blob) -> dict: 
+        """(Internal Helper) FilteredBlob (tag query result) to a dict (tags holds the tags the expression matched on)"""
+        return {'name': blob.name, 'container_name': blob.container_name, 'tags': blob.tags}
+
+    @_instrumented('url')
     def get_blob_url(self, file_name:str, include_sas=False, expiry_hours=1) -> str:
-        """Get the url of a blob in the container""" 
+        """Get the url of a blob in the container (with a read-only SAS token if include_sas)""" 
 
         blob_base = os.path.basename(file_name)
-        blob_client = self.container_client.get_blob_client(blob=blob_base)
-        
-        url = blob_client.url 
-        
-        # Generate SAS token (read only)
-        if include_sas: 
-            expiry_time = dt.datetime.now() + dt.timedelta(hours=expiry_hours)  # Adjust the expiration time as needed
-            permissions = BlobSasPermissions(read=True)  # Adjust permissions as needed
+        return self.url_signer.blob_urls([blob_base], include_sas=include_sas, expiry_hours=expiry_hours)[0]
 
-            sas_token = generate_blob_sas(
-            account_name=blob_client.account_name,
-            container_name=self.container_name,
-            blob_name=blob_base,
-            account_key=blob_client.credential.account_key,
-            permission=permissions,
-            expiry=expiry_time,
-            start=dt.datetime.now(), 
-            protocol='https'
-            )
+    @_instrumented('url')
+    def get_blob_urls(self, blob_names:Iterable[str], include_sas=True, expiry_hours=1, permission='r') -> List[str]: 
+        """Get the urls of many blobs in the container in one batch. 
 
-            url += f"?{sas_token}"
+        The base url and signing key are resolved once for the batch, and tokens for the same 
+        (blob, permission, expiry window) are reused from an LRU cache across calls. 
 
-            print(blob_client.account_name)
+        Args: 
+            blob_names (Iterable[str]): Full names of the blobs (e.g. as yielded by iter_blobs()). 
+            include_sas (bool): Whether to append a SAS token to each url. 
+            expiry_hours (float): Minimum number of hours each SAS token stays valid. 
+            permission (Union[str, BlobSasPermissions]): SAS permissions (default read-only). 
+
+        Returns: 
+            list: Urls in the same order as blob_names. 
+        """
+        return self.url_signer.blob_urls(blob_names, include_sas=include_sas, permission=permission, expiry_hours=expiry_hours)
+
+    @_instrumented('has')
+    def has_blob(self, file_name:Optional[str]=None, use_index:bool=True, blob_name:Optional[str]=None) -> bool: 
+        """Check if the container has a blob of the given name.
+
+        Answered from the blob name index when one is enabled (rebuilding it first if it is stale), 
+        otherwise with a single HEAD request for the blob's properties. 
+
+        Args: 
+            file_name (Optional[str]): Path to a local file, checked by its basename (as upload_blob() names it by default). 
+            use_index (bool): Set False to bypass the blob name index and always ask the service. 
+            blob_name (Optional[str]): Full name of the blob instead (e.g. 'data/2024/x.bin'), used as is. 
+        """
+        blob_name = self._existence_name(file_name, blob_name)
+
+        if use_index and self.blob_index is not None: 
+            self._refresh_blob_index_if_stale()
+            return blob_name in self.blob_index 
+
+        return self.container_client.get_blob_client(blob_name).exists()
+
+    @_instrumented('has')
+    def has_blobs(self, file_names:Optional[Iterable[str]]=None, blob_names:Optional[Iterable[str]]=None) -> Dict[str, bool]: 
+        """Check if the container has blobs of each of the given names in one pass. 
+
+        Uses the blob name index when one is enabled. Otherwise makes a single listing pass over the container 
+        (from the longest prefix the names share), stopping as soon as every name has been found. 
+
+        Args: 
+            file_names (Optional[Iterable[str]]): Paths to local files, checked by their basenames. 
+            blob_names (Optional[Iterable[str]]): Full names of the blobs instead, used as is. 
 
-        return url
+        Returns: 
+            dict: Mapping of each of the given file_names (or blob_names) to whether its blob exists. 
+        """
+        if (file_names is None) == (blob_names is None): 
+            raise ValueError("Must provide exactly one of file_names or blob_names.")
+        keys = list(file_names if blob_names is None else blob_names)
+        names = {key: self._existence_name(key, None) if blob_names is None else key for key in keys}
+
+        if self.blob_index is not None: 
+            self._refresh_blob_index_if_stale()
+            found = self.blob_index.contains_many(list(set(names.values())))
+            return {key: found[names[key]] for key in keys}
+
+        if not keys: 
+            return {}
 
-    def has_blob(self, file_name:str) -> bool: 
-        """Check if the container has a blob of the given name"""
+        remaining = set(names.values())
+        found = set()
+        prefix = os.path.commonprefix(list(remaining))
+        for name in self.iter_blobs(name_starts_with=prefix or None): 
+            if name in remaining: 
+                remaining.discard(name)
+                found.add(name)
+                if not remaining: 
+                    break 
+        return {key: names[key] in found for key in keys}
 
-        return os.path.basename(file_name) in self.list_blobs(name_only=True) 
+    @staticmethod
+    def _existence_name(file_name:Optional[str], blob_name:Optional[str]) -> str: 
+        """(Internal Helper) Blob name to check for: blob_name as is, else the basename of file_name"""
+        if blob_name is not None: 
+            return blob_name 
+        if file_name is None: 
+            raise ValueError("Must provide file_name or blob_name.")
+        return os.path.basename(file_name)
+
+    @_instrumented('refresh_index')
+    def refresh_blob_index(self) -> int: 
+        """Rebuild the blob name index from a fresh listing of the container. Returns the number of names indexed."""
+        if self.blob_index is None: 
+            raise ValueError(f"Blob name index not enabled for container '{self.container_name}' (pass index_blobs=True).")
+        return self.blob_index.rebuild(self.iter_blobs())
+
+    def _refresh_blob_index_if_stale(self) -> None: 
+        """(Internal Helper) Rebuild the blob name index if it has expired. 
+
+        Only one caller lists the container. While it does, the others answer from the expired index, or wait 
+        for the rebuild if the index has never been built. 
+        """
+        if not self.blob_index.is_stale(): 
+            return 
+        if not self.blob_index.refresh_lock.acquire(blocking=not self.blob_index.is_built): 
+            return 
+        try: 
+            # Another caller may have rebuilt it while this one waited 
+            if self.blob_index.is_stale(): 
+                self.refresh_blob_index()
+        finally: 
+            self.blob_index.refresh_lock.release()
     
-    def download_blob_file(self, blob_name:str, download_path=None): 
-        """Download a blob from the container to local storage."""
+    @_instrumented('download')
+    def download_blob_file(self, 
+                           blob_name:str, 
+                           download_path=None, 
+                           max_concurrency:int=DEFAULT_MAX_CONCURRENCY, 
+                           chunk_size:int=DEFAULT_CHUNK_SIZE, 
+                           verify:bool=True, 
+                           use_cache:bool=True): 
+        """Download a blob from the container to local storage.
+        
+        Large blobs are split into ranges fetched concurrently and written at their offsets into a preallocated file, 
+        so peak memory is roughly max_concurrency * chunk_size regardless of blob size. 
+
+        Args: 
+            blob_name (str): Name of the blob to download. 
+            download_path (Optional[str]): Local path to write to (default is the blob's basename in download_dir). 
+            max_concurrency (int): Number of ranges to fetch in parallel. 
+            chunk_size (int): Size in bytes of each ranged request. 
+            verify (bool): Whether to check the download against the blob's Content-MD5 (when it has one). 
+            use_cache (bool): Whether to go through the manager's cache (if it has one), copying from the cached file. 
+        """
             
         blob_client = self.container_client.get_blob_client(blob_name)
 
         if download_path is None:
             download_path = os.path.join(self.download_dir, os.path.basename(blob_name)) 
+
+        if self.cache is not None and use_cache: 
+            with self.cache.open(blob_client, max_concurrency=max_concurrency) as cached, open(download_path, "wb") as file: 
+                shutil.copyfileobj(cached, file)
+                current_operation().bytes_in += file.tell()
+            return 
         
-        with open(download_path, "wb") as file:
-            download_bytes = blob_client.download_blob().readall()
-            file.write(download_bytes)
+        props = download_to_file(blob_client, download_path, max_concurrency=max_concurrency, chunk_size=chunk_size, verify=verify)
+        current_operation().bytes_in += props.size 
 
         return 
     
-    def download_blob_bytes(self, blob_name:str) -> BytesIO: 
-        """Download a blob from the container directly to a BytesIO Stream"""
+    @_instrumented('download')
+    def download_blob_bytes(self, 
+                            blob_name:str, 
+                            preallocate:bool=False, 
+                            max_concurrency:int=1, 
+                            chunk_size:int=DEFAULT_CHUNK_SIZE, 
+                            verify:bool=True, 
+                            use_cache:bool=True) -> Union[BytesIO, memoryview]: 
+        """Download a blob from the container directly to a BytesIO Stream
+
+        Args: 
+            blob_name (str): Name of the blob to download. 
+            preallocate (bool): Instead read the blob (in concurrent ranges) into a bytearray sized up front, 
+                and return a memoryview over it rather than a BytesIO. 
+            max_concurrency (int): Number of ranges to fetch in parallel. 
+            chunk_size (int): Size in bytes of each ranged request (when preallocate). 
+            verify (bool): Whether to check the download against the blob's Content-MD5 (when preallocate). 
+            use_cache (bool): Whether to go through the manager's cache (if it has one), reading from the cached file. 
+        """
         blob_client = self.container_client.get_blob_client(blob_name)
+
+        if self.cache is not None and use_cache: 
+            with self.cache.open(blob_client, max_concurrency=max_concurrency) as cached: 
+                size = os.fstat(cached.fileno()).st_size
+                current_operation().bytes_in += size 
+                if preallocate: 
+                    buffer = bytearray(size)
+                    cached.readinto(buffer)
+                    return memoryview(buffer)
+                return BytesIO(cached.read())
+
+        if preallocate: 
+            view = download_to_buffer(blob_client, max_concurrency=max_concurrency, chunk_size=chunk_size, verify=verify)
+            current_operation().bytes_in += view.nbytes 
+            return view 
+
         blob_data = BytesIO()
-        blob_client.download_blob().readinto(blob_data)
+        current_operation().bytes_in += blob_client.download_blob(max_concurrency=max_concurrency).readinto(blob_data)
         blob_data.seek(0)
         return blob_data
 
-    def upload_blob(self, data=None, file_name=None,  blob_name=None, overwrite=False, encode_json=False) -> BlobClient:
+    @_instrumented('open')
+    def open_blob(self, 
+                  blob_name:str, 
+                  block_size:int=DEFAULT_READ_BLOCK_SIZE, 
+                  cached_blocks:int=DEFAULT_CACHED_BLOCKS, 
+                  read_ahead:int=DEFAULT_READ_AHEAD) -> BlobReader: 
+        """Open a blob as a seekable, read-only file object that fetches only the byte ranges that are read. 
+
+        Libraries that seek (pyarrow, zipfile, tarfile) can read e.g. just a Parquet footer or one archive member 
+        from a multi-GB blob. Use as a context manager, or call close() to stop any read-ahead. 
+
+        Args: 
+            blob_name (str): Name of the blob to open. 
+            block_size (int): Size in bytes of each range request. 
+            cached_blocks (int): Maximum number of blocks to keep in memory. 
+            read_ahead (int): Number of blocks to prefetch in the background during sequential reads. 
+        """
+        return BlobReader(self.container_client.get_blob_client(blob_name), 
+                          block_size=block_size, 
+                          cached_blocks=cached_blocks, 
+                          read_ahead=read_ahead)
+
+    @_instrumented('download')
+    def download_blob_mmap(self, 
+                           blob_name:str, 
+                           max_concurrency:int=DEFAULT_MAX_CONCURRENCY, 
+                           chunk_size:int=DEFAULT_CHUNK_SIZE, 
+                           verify:bool=True, 
+                           use_cache:bool=True) -> mmap.mmap: 
+        """Download a blob to a local file and return a read-only memory map of it. 
+
+        Consumers such as numpy.frombuffer() or Arrow IPC readers can use the map without copying it into the heap. 
+        With a cache, the cached file itself is mapped, so worker processes reading the same blob share its pages. 
+        Without one, the blob lands in a temporary file that is removed once mapped (the map keeps it alive on POSIX). 
+
+        Args: 
+            blob_name (str): Name of the blob to download. 
+            max_concurrency, chunk_size, verify: See download_blob_file(). 
+            use_cache (bool): Whether to map the manager's cached copy (if it has a cache). 
+
+        Raises: 
+            ValueError: If the blob is empty (an empty file cannot be mapped; open_blob_view() returns an empty view instead). 
+        """
+        mapped = self._map_blob(blob_name, max_concurrency=max_concurrency, chunk_size=chunk_size, verify=verify, use_cache=use_cache)
+        if mapped is None: 
+            raise ValueError(f'Cannot memory-map empty blob {blob_name}')
+        current_operation().bytes_in += len(mapped)
+        return mapped 
+
+    @_instrumented('download')
+    def open_blob_view(self, blob_name:str, **kwargs) -> memoryview: 
+        """Read-only memoryview over a memory-mapped local copy of a blob (see download_blob_mmap() for the arguments)"""
+        mapped = self._map_blob(blob_name, **kwargs)
+        if mapped is None: 
+            return memoryview(b'')
+        current_operation().bytes_in += len(mapped)
+        return memoryview(mapped)
+
+    def _map_blob(self, 
+                  blob_name:str, 
+                  max_concurrency:int=DEFAULT_MAX_CONCURRENCY, 
+                  chunk_size:int=DEFAULT_CHUNK_SIZE, 
+                  verify:bool=True, 
+                  use_cache:bool=True) -> Optional[mmap.mmap]: 
+        """(Internal Helper) Land a blob in the cache or a temporary file and map it read-only (None if empty)"""
+        blob_client = self.container_client.get_blob_client(blob_name)
+
+        if self.cache is not None and use_cache: 
+            with self.cache.open(blob_client, max_concurrency=max_concurrency) as cached: 
+                return map_readonly(cached)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='azb-', suffix='.blob')
+        os.close(fd)
+        try: 
+            download_to_file(blob_client, tmp_path, max_concurrency=max_concurrency, chunk_size=chunk_size, verify=verify)
+            with open(tmp_path, 'rb') as file: 
+                return map_readonly(file)
+        finally: 
+            try: 
+                os.remove(tmp_path)
+            except OSError: 
+                # Windows cannot remove a file while it is mapped 
+                pass 
+
+    @_instrumented('upload')
+    def upload_json_stream(self, 
+                           records:Iterable, 
+                           blob_name:str, 
+                           fmt:str='json', 
+                           compression:Optional[str]=None, 
+                           overwrite=False, 
+                           block_size:int=DEFAULT_BLOCK_SIZE, 
+                           max_concurrency:int=DEFAULT_MAX_CONCURRENCY) -> dict: 
+        """Encode records to JSON incrementally and upload them as staged blocks, without building the whole payload. 
+
+        Records are serialized one at a time, optionally compressed in the same pass, and regrouped into blocks 
+        that are staged concurrently, so peak memory is bounded by about (max_concurrency + 1) * block_size. 
+
+        Args: 
+            records (Iterable): JSON-serializable records (a list, or a generator for very large record sets). 
+            blob_name (str): Name of blob to create/update. 
+            fmt (str): 'json' to upload a JSON array, or 'ndjson' for one JSON document per line. 
+            compression (Optional[str]): 'gzip' or 'zstd' to compress the stream (sets the blob's Content-Encoding). 
+            overwrite (bool): Whether to overwrite a blob of the same name in the container if it already exists. 
+            block_size (int): Size in bytes of each staged block. 
+            max_concurrency (int): Number of blocks to stage in parallel. 
+
+        Returns: 
+            dict: Blob-updated properties (etag, last_modified). 
+        """
+        if os.path.splitext(blob_name)[1] == '': 
+            raise ValueError(f'Must include file extension in name {blob_name}') 
+        if fmt not in JSON_FORMATS: 
+            raise ValueError(f"Unknown JSON format '{fmt}'. Must be one of {', '.join(JSON_FORMATS)}")
+        if compression is not None and compression not in COMPRESSIONS: 
+            raise ValueError(f"Unknown compression '{compression}'. Must be one of {', '.join(COMPRESSIONS)}")
+
+        chunks = self._count_bytes_out(compress_chunks(iter_json_chunks(records, fmt=fmt), compression), current_operation())
+        content_settings = ContentSettings(content_type=JSON_FORMATS[fmt], content_encoding=compression)
+        blob_client = self.container_client.get_blob_client(blob_name)
+        response = upload_chunks_in_blocks(blob_client, rechunk(chunks, block_size), 
+                                           max_concurrency=max_concurrency, 
+                                           overwrite=overwrite, 
+                                           content_settings=content_settings)
+
+        if self.blob_index is not None: 
+            self.blob_index.add(blob_name)
+        if self.cache is not None: 
+            self.cache.invalidate(blob_client)
+
+        return response 
+
+    @staticmethod
+    def _count_bytes_out(chunks:Iterable[bytes], op) -> Iterator[bytes]: 
+        """(Internal Helper) Pass chunks through, adding their size to an operation's bytes_out (whichever thread consumes them)"""
+        for chunk in chunks: 
+            op.bytes_out += len(chunk)
+            yield chunk 
+
+    @_instrumented('delete')
+    def delete_blobs(self, 
+                     names_or_prefix:Union[str, Iterable[str]], 
+                     dry_run:bool=False, 
+                     max_concurrency:int=DEFAULT_BATCH_CONCURRENCY, 
+                     delete_snapshots:Optional[str]=None) -> BatchSummary: 
+        """Delete many blobs using Blob Batch requests (up to 256 deletes each), several batches at a time. 
+
+        Args: 
+            names_or_prefix (Union[str, Iterable[str]]): Blob name prefix to delete everything under (read lazily from the listing), 
+                or the blob names to delete. 
+            dry_run (bool): Only report the blobs that would be deleted. 
+            max_concurrency (int): Number of batch requests in flight at once. 
+            delete_snapshots (Optional[str]): 'include' to also delete blobs' snapshots, or 'only' to delete just the snapshots. 
+
+        Returns: 
+            BatchSummary: Deleted (or would-be deleted) blob names, and an error message for each blob that failed. 
+        """
+        def forget(blob_name): 
+            if self.blob_index is not None: 
+                self.blob_index.discard(blob_name)
+            if self.cache is not None: 
+                self.cache.invalidate(self.container_client.get_blob_client(blob_name))
+
+        return batch_delete(self.container_client, self._resolve_blob_names(names_or_prefix), 
+                            max_concurrency=max_concurrency, 
+                            dry_run=dry_run, 
+                            delete_snapshots=delete_snapshots, 
+                            on_success=forget)
+
+    @_instrumented('set_tier')
+    def set_standard_blob_tier_batch(self, 
+                                     names_or_prefix:Union[str, Iterable[str]], 
+                                     tier:str, 
+                                     dry_run:bool=False, 
+                                     max_concurrency:int=DEFAULT_BATCH_CONCURRENCY, 
+                                     rehydrate_priority:Optional[str]=None) -> BatchSummary: 
+        """Set the access tier ('Hot', 'Cool', 'Cold', 'Archive') of many block blobs using Blob Batch requests. 
+
+        Args: 
+            names_or_prefix, dry_run, max_concurrency: See delete_blobs(). 
+            tier (str): Access tier to move the blobs to. 
+            rehydrate_priority (Optional[str]): 'Standard' or 'High', when rehydrating from Archive. 
+        """
+        return batch_set_tier(self.container_client, self._resolve_blob_names(names_or_prefix), tier, 
+                              max_concurrency=max_concurrency, 
+                              dry_run=dry_run, 
+                              rehydrate_priority=rehydrate_priority)
+
+    @_instrumented('set_tags')
+    def set_blob_tags_batch(self, 
+                            names_or_prefix:Union[str, Iterable[str]], 
+                            tags:Dict[str, str], 
+                            dry_run:bool=False, 
+                            max_concurrency:int=DEFAULT_TAGS_CONCURRENCY) -> BatchSummary: 
+        """Set the same index tags on many blobs (replacing their existing tags). 
+
+        The Blob Batch API does not accept Set Blob Tags, so these are individual requests, max_concurrency at a time. 
+
+        Args: 
+            names_or_prefix, dry_run: See delete_blobs(). 
+            tags (Dict[str, str]): Tags to set on every blob. 
+            max_concurrency (int): Number of requests in flight at once. 
+        """
+        return bulk_set_tags(self.container_client, self._resolve_blob_names(names_or_prefix), tags, 
+                             max_concurrency=max_concurrency, 
+                             dry_run=dry_run)
+
+    @_instrumented('copy')
+    def copy_blob(self, 
+                  blob_name:str, 
+                  destination_name:Optional[str]=None, 
+                  destination:Optional["AzureBlobContainerManager"]=None, 
+                  overwrite:bool=False, 
+                  move:bool=False, 
+                  timeout:Optional[float]=None) -> dict: 
+        """Copy a blob server-side (to another name, container or storage account) without downloading it. 
+
+        The service reads the source through a generated read-only SAS url, so the destination may be in another account. 
+
+        Args: 
+            blob_name (str): Name of the blob to copy. 
+            destination_name (Optional[str]): Name of the copy (default is blob_name). 
+            destination (Optional[AzureBlobContainerManager]): Manager of the container to copy into (default is this one). 
+            overwrite (bool): Whether to replace the destination blob if it already exists. 
+            move (bool): Whether to delete the source once the copy has succeeded (if it was not modified meanwhile). 
+            timeout (Optional[float]): Seconds to wait for a pending copy before aborting it. 
+
+        Returns: 
+            dict: The copy's id and final status ('copy_id', 'copy_status'). 
+        """
+        destination = self if destination is None else destination 
+        destination_name = blob_name if destination_name is None else destination_name 
+        if destination.container_client.url == self.container_client.url and destination_name == blob_name: 
+            raise ValueError(f'Cannot copy blob {blob_name} onto itself.')
+
+        source_url = self.url_signer.blob_urls([blob_name], include_sas=True, permission='r', expiry_hours=DEFAULT_SOURCE_SAS_HOURS)[0]
+        result = copy_blob(self.container_client.get_blob_client(blob_name), 
+                           source_url, 
+                           destination.container_client.get_blob_client(destination_name), 
+                           overwrite=overwrite, 
+                           move=move, 
+                           timeout=timeout)
+        self._after_copy(blob_name, destination, destination_name, move)
+        return result 
+
+    @_instrumented('copy')
+    def copy_prefix(self, 
+                    prefix:str, 
+                    destination_prefix:Optional[str]=None, 
+                    destination:Optional["AzureBlobContainerManager"]=None, 
+                    overwrite:bool=False, 
+                    move:bool=False, 
+                    max_concurrency:int=DEFAULT_COPY_CONCURRENCY, 
+                    dry_run:bool=False, 
+                    timeout:Optional[float]=None) -> BatchSummary: 
+        """Copy (or move) every blob under a prefix server-side, many copies at a time. 
+
+        Each blob keeps its name relative to the prefix, e.g. with prefix 'raw/' and destination_prefix 'archive/', 
+        'raw/2024/a.csv' is copied to 'archive/2024/a.csv'. 
+
+        Args: 
+            prefix (str): Blob name prefix to copy ('' for the whole container). 
+            destination_prefix (Optional[str]): Prefix to replace it with (default is the same prefix). 
+            destination (Optional[AzureBlobContainerManager]): Manager of the container to copy into (default is this one). 
+            max_concurrency (int): Number of copies in flight at once. 
+            dry_run (bool): Only report the blobs that would be copied. 
+            overwrite, move, timeout: See copy_blob(). 
+
+        Returns: 
+            BatchSummary: Source blob names copied, and an error message for each blob that failed. 
+        """
+        destination = self if destination is None else destination 
+        destination_prefix = prefix if destination_prefix is None else destination_prefix 
+        same_container = destination.container_client.url == self.container_client.url 
+        if same_container and destination_prefix == prefix: 
+            raise ValueError(f'Cannot copy prefix {prefix} onto itself.')
+
+        names = self.iter_blobs(name_starts_with=prefix)
+        if same_container and destination_prefix.startswith(prefix): 
+            # The copies would otherwise show up later in the same lazy listing 
+            names = list(names)
+
+        def rename(blob_name): 
+            return destination_prefix + blob_name[len(prefix):]
+
+        return copy_many(self.container_client, self.url_signer, destination.container_client, names, rename, 
+                         overwrite=overwrite, 
+                         move=move, 
+                         max_concurrency=max_concurrency, 
+                         dry_run=dry_run, 
+                         timeout=timeout, 
+                         on_success=lambda blob_name: self._after_copy(blob_name, destination, rename(blob_name), move))
+
+    def _after_copy(self, blob_name:str, destination:"AzureBlobContainerManager", destination_name:str, move:bool) -> None: 
+        """(Internal Helper) Keep both managers' blob name indexes and caches in step with a finished copy/move"""
+        if destination.blob_index is not None: 
+            destination.blob_index.add(destination_name)
+        if destination.cache is not None: 
+            destination.cache.invalidate(destination.container_client.get_blob_client(destination_name))
+        if move: 
+            if self.blob_index is not None: 
+                self.blob_index.discard(blob_name)
+            if self.cache is not None: 
+                self.cache.invalidate(self.container_client.get_blob_client(blob_name))
+
+    def _resolve_blob_names(self, names_or_prefix:Union[str, Iterable[str]]) -> Iterable[str]: 
+        """(Internal Helper) A prefix becomes a lazy listing of the blobs under it; anything else is taken as blob names"""
+        if isinstance(names_or_prefix, str): 
+            if not names_or_prefix: 
+                # Guard against an empty prefix silently matching the whole container 
+                raise ValueError("Prefix must not be empty (pass iter_blobs() to act on every blob in the container).")
+            return self.iter_blobs(name_starts_with=names_or_prefix)
+        return names_or_prefix
+
+    @_instrumented('sync_up')
+    def sync_up(self, local_dir:str, prefix:str="", max_concurrency:int=DEFAULT_SYNC_CONCURRENCY) -> SyncSummary: 
+        """Upload a local directory to blobs under a prefix, skipping files that are unchanged. 
+
+        The remote side is read with one listing of the prefix. A file is skipped when a blob of the same size 
+        has a matching Content-MD5 (or, lacking one, was modified after the file). The remaining files are uploaded 
+        on a bounded thread pool, so many small files overlap their round-trip latency. 
+
+        Args: 
+            local_dir (str): Directory to upload (recursively). 
+            prefix (str): Blob name prefix ('virtual directory') to upload under. 
+            max_concurrency (int): Number of files to transfer in parallel. 
+
+        Returns: 
+            SyncSummary: Transferred/skipped/failed blob names, bytes transferred and throughput. 
+        """
+        summary = sync_up(self.container_client, local_dir, prefix=prefix, max_concurrency=max_concurrency)
+        current_operation().bytes_out += summary['bytes_transferred']
+
+        if self.blob_index is not None: 
+            self.blob_index.add_many(summary['transferred'] + summary['skipped'])
+        if self.cache is not None: 
+            # A failed upload may still have replaced the blob (e.g. a timeout after the service committed it) 
+            for blob_name in summary['transferred'] + list(summary['failed']): 
+                self.cache.invalidate(self.container_client.get_blob_client(blob_name))
+        return summary 
+
+    @_instrumented('sync_down')
+    def sync_down(self, prefix:str, local_dir:Optional[str]=None, max_concurrency:int=DEFAULT_SYNC_CONCURRENCY) -> SyncSummary: 
+        """Download the blobs under a prefix into a local directory, skipping files that are unchanged. 
+
+        Args: 
+            prefix (str): Blob name prefix ('virtual directory') to download. 
+            local_dir (Optional[str]): Directory to download into (default is download_dir). 
+            max_concurrency (int): Number of blobs to transfer in parallel. 
+
+        Returns: 
+            SyncSummary: Transferred/skipped/failed blob names, bytes transferred and throughput. 
+        """
+        if local_dir is None: 
+            local_dir = self.download_dir 
+        summary = sync_down(self.container_client, prefix, local_dir, max_concurrency=max_concurrency)
+        current_operation().bytes_in += summary['bytes_transferred']
+
+        # Downloading changes no blobs (so nothing cached goes stale), but the listing showed which ones exist 
+        if self.blob_index is not None: 
+            self.blob_index.add_many(summary['transferred'] + summary['skipped'])
+        return summary 
+
+    def changes_since(self, 
+                      checkpoint:Optional[str]=None, 
+                      state_path:Optional[str]=None, 
+                      use_change_feed:Optional[bool]=None, 
+                      results_per_page:Optional[int]=None) -> BlobChanges: 
+        """Iterate over the blobs created, modified or deleted since a checkpoint, e.g. to keep a local mirror in step. 
+
+        When the account has the Blob Change Feed enabled (and azure-storage-blob-changefeed is installed), changes are 
+        read from the feed, so a cycle costs about the number of changes rather than the size of the container 
+        (the feed publishes events with a delay of a few minutes). Otherwise each cycle streams one listing of the 
+        container and merges it with a snapshot of the previous one (name, etag, size, last_modified) kept in SQLite. 
+
+        The snapshot is advanced only once every change has been consumed; the new checkpoint is then available as 
+        `.checkpoint`. Only the latest checkpoint of a snapshot can be resumed from. 
+
+            changes = azb_container.changes_since(checkpoint)
+            for change in changes: 
+                ...  # change['change'] is 'created', 'modified' or 'deleted'
+            checkpoint = changes.checkpoint
+
+        Args: 
+            checkpoint (Optional[str]): Checkpoint from the previous cycle (None reports every blob as created). 
+            state_path (Optional[str]): SQLite file holding the snapshot (default is a hidden file in download_dir). 
+            use_change_feed (Optional[bool]): True to require the change feed, False to always diff listings 
+                (default uses the feed when it is available). 
+            results_per_page (Optional[int]): Maximum number of blobs (or feed events) the service returns per page. 
+
+        Raises: 
+            ValueError: If the checkpoint does not belong to the snapshot's current state (raised on iteration). 
+        """
+        if state_path is None: 
+            state_path = os.path.join(self.download_dir, f'.azb-changes-{self.container_name}.db')
+        changes = iter_changes(self.container_client, state_path, 
+                               checkpoint=checkpoint, 
+                               use_change_feed=use_change_feed, 
+                               results_per_page=results_per_page)
+        return BlobChanges(_instrumented_iter(self.metrics, 'changes', changes, container=self.container_name))
+
+    @_instrumented('upload')
+    def upload_blob(self, data=None, file_name=None,  blob_name=None, overwrite=False, encode_json=False, 
+                    staged=False, block_size=DEFAULT_BLOCK_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY, checkpoint_path=None, 
+                    dedup:Optional[bool]=None) -> BlobClient:
         """
         Upload a blob to blob storage in Azure
         
@@ -97,7 +846,13 @@ class AzureBlobContainerManager:
             file_name (str): Path to a file to upload
             blob_name (str): Name of blob to create/update (if file_name, default is basename of file_name)
             overwrite (bool): Whether to overwrite a blob of the same name in the container if it already exists.   
-            encode_json (bool): Whether to try to encode data to binary JSON data before uploading  
+            encode_json (bool): Whether to try to encode data to binary JSON data before uploading (iterators of records, other than file objects, are streamed, see upload_json_stream())  
+            staged (bool): Upload file_name as concurrently staged blocks, resuming from a local checkpoint if a previous attempt was interrupted. 
+            block_size (int): Size in bytes of each staged block (staged uploads and streamed records only). 
+            max_concurrency (int): Number of blocks to stage in parallel (staged uploads and streamed records only). 
+            checkpoint_path (Optional[str]): Where to keep the resume checkpoint (default is next to file_name). 
+            dedup (Optional[bool]): Whether to upload content-addressed (default is the manager's dedup setting; see 
+                _upload_deduplicated()). Streamed record uploads are never deduplicated. 
 
         Returns: 
 
@@ -106,15 +861,13 @@ class AzureBlobContainerManager:
         """
 
         ## Check parameters 
-        # Required parameters provided 
-        if (data and file_name) or (not data and not file_name): 
-            raise ValueError(f"Must provide exactly one: file path or binary data.")
-        if (data and not blob_name):
-            raise ValueError(f'Must provide blob_name if uploading binary data.')
-        # Valid parameter names 
-        for x in (blob_name, file_name): 
-            if x and os.path.splitext(x)[1] == '': 
-                raise ValueError(f'Must include file extension in name {x}') 
+        self._check_upload_args(data, file_name, blob_name)
+        if staged and not file_name: 
+            raise ValueError(f'Staged uploads require file_name.')
+        if dedup is None: 
+            dedup = self.content_index is not None 
+        elif dedup and self.content_index is None: 
+            raise ValueError(f"Content-addressed uploads not enabled for container '{self.container_name}' (pass dedup=True).")
                
         ## Upload blobs 
         if file_name:    
@@ -122,26 +875,185 @@ class AzureBlobContainerManager:
                 blob_name = os.path.basename(file_name)
             blob_client = self.container_client.get_blob_client(blob_name)
             # Upload the file
-            with open(file_name, "rb") as file:
-                response = blob_client.upload_blob(file, overwrite=overwrite)
-            print(f"Blob {blob_name} uploaded successfully.")
+            if dedup: 
+                response = self._upload_deduplicated(blob_client, overwrite, file_name=file_name, staged=staged, 
+                                                     block_size=block_size, 
+                                                     max_concurrency=max_concurrency, 
+                                                     checkpoint_path=checkpoint_path)
+            elif staged: 
+                response = upload_file_in_blocks(blob_client, file_name, 
+                                                 block_size=block_size, 
+                                                 max_concurrency=max_concurrency, 
+                                                 overwrite=overwrite, 
+                                                 checkpoint_path=checkpoint_path)
+            else: 
+                # Hashing the file costs a full read, so it is only done if a retry leaves the outcome in doubt 
+                digest = None if overwrite else (lambda: _file_md5(file_name))
+                with open(file_name, "rb") as file:
+                    response = self._upload_single(blob_client, file, overwrite, digest)
+            if not dedup: 
+                current_operation().bytes_out += os.path.getsize(file_name)
+            logger.info("Uploaded blob %s", blob_name, extra={'container': self.container_name, 'blob_name': blob_name})
+
+        elif encode_json and self._is_record_stream(data): 
+            # Generators of records are encoded and uploaded incrementally rather than materialized 
+            return self.upload_json_stream(data, blob_name, overwrite=overwrite, block_size=block_size, max_concurrency=max_concurrency)
 
         elif data:             
-            response = blob_client = self.container_client.get_blob_client(blob_name)
-            # Check that provided data is valid 
-            valid_types = (bytes, str, BytesIO)
-            if not any(isinstance(data, t) for t in valid_types): 
-                if not encode_json: 
-                    raise TypeError(f"Parameter 'data' must be one of {', '.join((str(t) for t in valid_types))}")
-                else: 
-                    print(f"Encoding 'data' to binary JSON before uploading")
-                    bin_data = AzureBlobStorageAccountManager._encode_json(data)  
-                    response = blob_client.upload_blob(bin_data, overwrite=overwrite)
+            blob_client = self.container_client.get_blob_client(blob_name)
+            body = self._prepare_upload_data(data, encode_json)
+            if dedup: 
+                response = self._upload_deduplicated(blob_client, overwrite, body=body)
             else: 
-                response = blob_client.upload_blob(data, overwrite=overwrite)
+                digest = None 
+                if not overwrite and isinstance(body, (bytes, str)): 
+                    digest = hashlib.md5(body.encode('utf-8') if isinstance(body, str) else body).digest()
+                response = self._upload_single(blob_client, body, overwrite, digest)
+                current_operation().bytes_out += self._body_size(body)
+
+        # Keep the blob name index and cache in step with this manager's own uploads 
+        if self.blob_index is not None: 
+            self.blob_index.add(blob_name)
+        if self.cache is not None: 
+            self.cache.invalidate(self.container_client.get_blob_client(blob_name))
 
         return response 
 
+    def _upload_deduplicated(self, 
+                             blob_client:BlobClient, 
+                             overwrite:bool, 
+                             body=None, 
+                             file_name:Optional[str]=None, 
+                             staged:bool=False, 
+                             **staged_kwargs) -> dict: 
+        """(Internal Helper) Content-addressed upload: copy a blob that already holds the same bytes, else upload them. 
+
+        The content is hashed in one pass (SHA-256 as its address, MD5 for its Content-MD5). Blobs holding a given 
+        content are found through the local content index, then the blob index tag CONTENT_HASH_TAG that every 
+        content-addressed upload sets, and are checked (size and Content-MD5) before being copied server-side. 
+
+        Returns: 
+            dict: The new blob's etag, last_modified and content_md5, whichever way it was written. 
+        """
+        sha256, digest, size = content_digests(body=body, file_path=file_name)
+        tags = {CONTENT_HASH_TAG: sha256}
+
+        if size >= self.dedup_min_size: 
+            for source_name in self._find_content(sha256, digest, size, exclude=None if overwrite else blob_client.blob_name): 
+                if source_name == blob_client.blob_name: 
+                    # Overwriting a blob with the content it already holds 
+                    props = blob_client.get_blob_properties()
+                    return {'etag': props.etag, 'last_modified': props.last_modified, 'content_md5': bytearray(digest)}
+                source_url = self.url_signer.blob_urls([source_name], include_sas=True, permission='r', expiry_hours=DEFAULT_SOURCE_SAS_HOURS)[0]
+                try: 
+                    result = copy_blob(self.container_client.get_blob_client(source_name), source_url, blob_client, 
+                                       overwrite=overwrite, 
+                                       tags=tags)
+                except (ResourceNotFoundError, BlobCopyError): 
+                    # Deleted (or changed) since it was checked 
+                    self.content_index.discard(sha256, source_name)
+                    continue 
+                logger.debug("Copied blob %s from %s (same content)", blob_client.blob_name, source_name, 
+                             extra={'container': self.container_name, 'blob_name': blob_client.blob_name})
+                return {'etag': result['etag'], 'last_modified': result['last_modified'], 'content_md5': bytearray(digest)}
+
+        if staged: 
+            response = upload_file_in_blocks(blob_client, file_name, overwrite=overwrite, 
+                                             content_settings=ContentSettings(content_md5=bytearray(digest)), 
+                                             tags=tags, 
+                                             **staged_kwargs)
+        elif file_name: 
+            with open(file_name, "rb") as file: 
+                response = self._upload_single(blob_client, file, overwrite, digest, tags=tags)
+        else: 
+            response = self._upload_single(blob_client, body, overwrite, digest, tags=tags)
+        current_operation().bytes_out += size 
+        self.content_index.put(sha256, blob_client.blob_name)
+        return {'etag': response['etag'], 'last_modified': response['last_modified'], 'content_md5': bytearray(digest)}
+
+    def _find_content(self, sha256:str, digest:bytes, size:int, exclude:Optional[str]=None) -> Iterator[str]: 
+        """(Internal Helper) Names of blobs in the container that hold the content (checked to still match when yielded)"""
+        def holds_content(name): 
+            try: 
+                props = self.container_client.get_blob_client(name).get_blob_properties()
+            except ResourceNotFoundError: 
+                return False 
+            md5 = props.content_settings.content_md5
+            return props.size == size and md5 is not None and bytes(md5) == digest 
+
+        cached = self.content_index.get(sha256)
+        if cached is not None and cached != exclude: 
+            if holds_content(cached): 
+                yield cached 
+            else: 
+                self.content_index.discard(sha256, cached)
+
+        try: 
+            # Read lazily: copies are tagged too, so popular content can match many blobs. The tag index is 
+            # updated asynchronously, so very recent uploads may not be found yet. 
+            for name in self.find_blobs_by_tags(f"\"{CONTENT_HASH_TAG}\" = '{sha256}'", name_only=True): 
+                if name not in (cached, exclude) and holds_content(name): 
+                    self.content_index.put(sha256, name)
+                    yield name 
+        except HttpResponseError: 
+            # e.g. no permission to query tags; the local index is all there is 
+            return 
+
+    @staticmethod
+    def _upload_single(blob_client:BlobClient, body, overwrite:bool, digest:Union[bytes, Callable[[], bytes], None]=None, 
+                       tags:Optional[Dict[str, str]]=None) -> dict: 
+        """(Internal Helper) Upload a body, with its MD5 as Content-MD5 when known. 
+
+        Without overwrite, a conflict after a retried attempt is checked against the MD5 (see confirm_content_md5()). 
+        A callable digest is only computed for that check, and the upload carries no Content-MD5 of its own. 
+        """
+        if digest is None or (overwrite and callable(digest)): 
+            return blob_client.upload_blob(body, overwrite=overwrite, tags=tags)
+        content_settings = None if callable(digest) else ContentSettings(content_md5=bytearray(digest))
+        if overwrite: 
+            return blob_client.upload_blob(body, overwrite=True, content_settings=content_settings, tags=tags)
+        return create_idempotently(lambda: blob_client.upload_blob(body, 
+                                                                   overwrite=False, 
+                                                                   content_settings=content_settings, 
+                                                                   tags=tags), 
+                                   lambda: confirm_content_md5(blob_client, digest))
+
+    @staticmethod
+    def _body_size(body) -> int: 
+        """(Internal Helper) Size in bytes of an upload body (bytes, str or BytesIO, which is sent from its position)"""
+        if isinstance(body, BytesIO): 
+            return body.getbuffer().nbytes - body.tell()
+        return len(body.encode('utf-8') if isinstance(body, str) else body)
+
+    @staticmethod
+    def _is_record_stream(data) -> bool: 
+        """(Internal Helper) Whether data is an iterator of records to stream, rather than a file object (which also iterates, over lines)"""
+        return isinstance(data, Iterator) and not isinstance(data, (IOBase, bytes, str)) and not hasattr(data, 'read')
+
+    @staticmethod
+    def _check_upload_args(data, file_name, blob_name) -> None: 
+        """(Internal Helper) Validate the combination of upload_blob() arguments"""
+        # Required parameters provided 
+        if (data and file_name) or (not data and not file_name): 
+            raise ValueError(f"Must provide exactly one: file path or binary data.")
+        if (data and not blob_name):
+            raise ValueError(f'Must provide blob_name if uploading binary data.')
+        # Valid parameter names 
+        for x in (blob_name, file_name): 
+            if x and os.path.splitext(x)[1] == '': 
+                raise ValueError(f'Must include file extension in name {x}') 
+
+    @classmethod
+    def _prepare_upload_data(cls, data, encode_json=False): 
+        """(Internal Helper) Check that provided data is valid to upload, encoding it to binary JSON if requested"""
+        valid_types = (bytes, str, BytesIO)
+        if any(isinstance(data, t) for t in valid_types): 
+            return data 
+        if not encode_json: 
+            raise TypeError(f"Parameter 'data' must be one of {', '.join((str(t) for t in valid_types))}")
+        logger.debug("Encoding %s to binary JSON before uploading", type(data).__name__)
+        return cls._encode_json(data)
+
     @classmethod
     def _encode_json(cls, data):
         """Internal wrapper to encode passed data objects to binary JSON prior to uploading.""" 
@@ -153,27 +1065,201 @@ class AzureBlobStorageAccountManager:
                  storage_account_name:str,
                  connection_str:str, 
                  containers: Optional[list] = None, 
-                 download_dir: Optional[str] = "."):
+                 download_dir: Optional[str] = ".", 
+                 pool_size: int = DEFAULT_POOL_SIZE, 
+                 connection_timeout: float = DEFAULT_CONNECTION_TIMEOUT, 
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, 
+                 transport = None, 
+                 cache: Optional[BlobCache] = None, 
+                 throttle: Optional[AccountThrottle] = None, 
+                 retry_total: int = DEFAULT_RETRY_TOTAL, 
+                 metrics: Optional[MetricsSink] = None):
         """Wrapper for common use cases when working with a designated storage account in Azure via connection string. 
+
+        Every container manager is derived from the account's one BlobServiceClient, so they all share a single 
+        HTTP transport and connection pool. Container managers are created on first attribute access. 
         
         Args: 
             connection_str (str): Connection string to an Azure storage account. 
             containers (Optional[list]): Names of containers in the storage account to use. 
             download_dir (Optional[str]): Optional default directory to download files to. 
+            pool_size (int): Maximum number of kept-alive connections to the account. 
+            connection_timeout (float): Seconds to wait to establish a connection. 
+            read_timeout (float): Seconds to wait between bytes of a response. 
+            transport (Optional[HttpTransport]): Transport to use instead of building one from the settings above. 
+            cache (Optional[BlobCache]): Local read-through cache shared by every container manager of the account. 
+            throttle (Optional[AccountThrottle]): Rate limit and adaptive concurrency limit applied to every request to the account 
+                (default only counts requests, retries and throttling responses). 
+            retry_total (int): Maximum number of retries of a failed or throttled request. 
+            metrics (Optional[MetricsSink]): Sink every container manager of the account reports its operations to. 
         """
 
         self._connection_str = connection_str
-        self.blob_service_client = BlobServiceClient.from_connection_string(self._connection_str)
+        if transport is None: 
+            transport = build_transport(pool_size=pool_size, connection_timeout=connection_timeout, read_timeout=read_timeout)
+        # One retry policy (and so one throttle) in the pipeline every container client derives from 
+        self.throttle = throttle if throttle is not None else AccountThrottle()
+        self.blob_service_client = BlobServiceClient.from_connection_string(self._connection_str, 
+                                                                            transport=transport, 
+                                                                            retry_policy=ThrottledRetryPolicy(self.throttle, retry_total=retry_total))
 
         # The default directory to which to download a blob.
         self.download_dir = download_dir
+        self.cache = cache
+        self.metrics = metrics
 
+        self._container_lock = threading.Lock()
         self._set_container_clients(containers)
 
         # Parse the connection string for the storage account name 
         self._storage_account = storage_account_name
 
+    def __getattr__(self, name:str): 
+        """Create a container's manager the first time it is accessed as an attribute"""
+        # Only consulted for attributes not found normally; guard internals that may not be set yet 
+        if name.startswith('_') or name not in self.__dict__.get('_container_names', ()): 
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return self.get_container_manager(name)
+
+    def get_container_manager(self, container_name:str) -> AzureBlobContainerManager: 
+        """Get (creating on first use) the manager for a container set on this account manager"""
+        if container_name not in self._container_names: 
+            raise AttributeError(f"Container '{container_name}' not set in attributes.")
+
+        with self._container_lock: 
+            container_manager = self.__dict__.get(container_name)
+            if container_manager is None: 
+                container_manager = AzureBlobContainerManager(
+                                    container_client=self.blob_service_client.get_container_client(container_name), 
+                                    download_dir=self.download_dir, 
+                                    cache=self.cache, 
+                                    throttle=self.throttle, 
+                                    metrics=self.metrics)
+                # Set as attribute 
+                setattr(self, container_name, container_manager)
+        return container_manager 
+
+    @property 
+    def container_names(self) -> list: 
+        return list(self._container_names)
+
+    def fan_out(self, 
+                operation:Callable[[AzureBlobContainerManager], Iterable], 
+                containers:Optional[Iterable[str]]=None, 
+                max_concurrency:int=DEFAULT_FANOUT_CONCURRENCY, 
+                timeout:Optional[float]=None, 
+                raise_on_error:bool=False) -> FanoutResults: 
+        """Run the same operation on many containers concurrently, merging what it yields into one stream. 
+
+        Items arrive as {'account', 'container', 'item'} dicts, in whatever order the containers produce them. 
+        A container whose operation fails is recorded in `.failed` (and its report) while the others carry on, 
+        and `.reports` holds each container's item count and timing. 
+
+            results = azb_account.fan_out(lambda m: m.iter_blobs(fields=('name', 'size')))
+            for entry in results: 
+                ...  # entry['container'], entry['item']
+            results.failed  # {'account/container': error}
+
+        Args: 
+            operation (Callable[[AzureBlobContainerManager], Iterable]): Called with each container's manager (on a worker 
+                thread), returning an iterable of items; wrap single values in a list (e.g. lambda m: [m.has_blob(name)]). 
+            containers (Optional[Iterable[str]]): Containers to run on (default is every container set on the manager). 
+            max_concurrency (int): Number of containers worked on at once. 
+            timeout (Optional[float]): Seconds a container's operation may run before it is abandoned (checked between items). 
+            raise_on_error (bool): Re-raise the first failure instead of recording it, stopping the other containers. 
+        """
+        return FanoutResults(self._fan_out_tasks(operation, containers), 
+                             max_concurrency=max_concurrency, 
+                             timeout=timeout, 
+                             raise_on_error=raise_on_error)
 
+    def _fan_out_tasks(self, operation:Callable[[AzureBlobContainerManager], Iterable], containers:Optional[Iterable[str]]) -> List[FanoutTask]: 
+        """(Internal Helper) One task per container, resolving the managers up front so unknown containers fail early"""
+        names = self.container_names if containers is None else list(containers)
+        managers = [self.get_container_manager(name) for name in names]
+        return [(self.storage_account, m.container_name, lambda m=m: operation(m)) for m in managers]
+
+    def find_blobs_by_tags(self, 
+                           expression:str, 
+                           containers:Optional[Iterable[str]]=None, 
+                           max_concurrency:int=DEFAULT_FANOUT_CONCURRENCY, 
+                           results_per_page:Optional[int]=None) -> Iterator[dict]: 
+        """Lazily iterate over the blobs matching a tag expression, using the service's tag index. 
+
+        Without containers, one query covers the whole account (an expression may also restrict it with @container). 
+        With containers, each is queried separately, up to max_concurrency at once, and their results are merged 
+        as they arrive (so the order across containers is not fixed). 
+
+        Args: 
+            expression (str): Tag filter, e.g. "tenant = 'x'" (see AzureBlobContainerManager.find_blobs_by_tags()). 
+            containers (Optional[Iterable[str]]): Names of containers to query (default is the whole account). 
+            max_concurrency (int): Number of container queries in flight at once. 
+            results_per_page (Optional[int]): Maximum number of blobs the service returns per page. 
+
+        Yields: 
+            dict: {'name', 'container_name', 'tags'} for each matching blob. 
+        """
+        if containers is None: 
+            blobs = self.blob_service_client.find_blobs_by_tags(expression, results_per_page=results_per_page)
+            for blob in _instrumented_iter(self.metrics, 'find_by_tags', blobs): 
+                yield AzureBlobContainerManager._project_filtered_blob(blob)
+            return 
+
+        def query(container_name): 
+            container_client = self.blob_service_client.get_container_client(container_name)
+            return lambda: (AzureBlobContainerManager._project_filtered_blob(blob) 
+                            for blob in container_client.find_blobs_by_tags(expression, results_per_page=results_per_page))
+
+        yield from _instrumented_iter(self.metrics, 'find_by_tags', 
+                                      merge_concurrently([query(c) for c in containers], max_concurrency=max_concurrency))
+
+    def copy_blob(self, 
+                  source_container:str, 
+                  blob_name:str, 
+                  destination_container:str, 
+                  destination_name:Optional[str]=None, 
+                  destination_account:Optional["AzureBlobStorageAccountManager"]=None, 
+                  **kwargs) -> dict: 
+        """Copy a blob server-side between containers of this (or another) storage account. 
+
+        Args: 
+            source_container (str): Container of the blob to copy. 
+            blob_name (str): Name of the blob to copy. 
+            destination_container (str): Container to copy into. 
+            destination_name (Optional[str]): Name of the copy (default is blob_name). 
+            destination_account (Optional[AzureBlobStorageAccountManager]): Manager of the account to copy into (default is this one). 
+            **kwargs: overwrite, move, timeout (see AzureBlobContainerManager.copy_blob()). 
+        """
+        destination = (destination_account or self).get_container_manager(destination_container)
+        return self.get_container_manager(source_container).copy_blob(blob_name, 
+                                                                      destination_name=destination_name, 
+                                                                      destination=destination, 
+                                                                      **kwargs)
+
+    def copy_prefix(self, 
+                    source_container:str, 
+                    prefix:str, 
+                    destination_container:str, 
+                    destination_prefix:Optional[str]=None, 
+                    destination_account:Optional["AzureBlobStorageAccountManager"]=None, 
+                    **kwargs) -> BatchSummary: 
+        """Copy (or move) every blob under a prefix server-side between containers of this (or another) storage account. 
+
+        Args: 
+            source_container (str): Container to copy from. 
+            prefix (str): Blob name prefix to copy ('' for the whole container). 
+            destination_container (str): Container to copy into. 
+            destination_prefix (Optional[str]): Prefix to replace it with (default is the same prefix). 
+            destination_account (Optional[AzureBlobStorageAccountManager]): Manager of the account to copy into (default is this one). 
+            **kwargs: overwrite, move, max_concurrency, dry_run, timeout (see AzureBlobContainerManager.copy_prefix()). 
+        """
+        destination = (destination_account or self).get_container_manager(destination_container)
+        return self.get_container_manager(source_container).copy_prefix(prefix, 
+                                                                        destination_prefix=destination_prefix, 
+                                                                        destination=destination, 
+                                                                        **kwargs)
+
+    @_instrumented('list_containers')
     def list_containers(self, include_metadata=False) -> list: 
         """List containers in the storage account along with optional metadata
         https://learn.microsoft.com/en-us/azure/storage/blobs/storage-blob-containers-list-python
@@ -197,20 +1283,12 @@ class AzureBlobStorageAccountManager:
             raise Exception(f"Failed to encode {data} to binary JSON ({str(e)})")
     
     def _set_container_clients(self, containers:Optional[list]) -> None: 
-        """(Internal Helper) Get and set container clients based on container name"""
+        """(Internal Helper) Register the container names whose managers are created on first access"""
         
         container_list = containers if containers else \
             self.list_containers(include_metadata=False)
 
-        for container_name in container_list:
-            
-            # Initialize Container Manager  
-            container_manager = AzureBlobContainerManager(
-                                connection_str=self._connection_str,
-                                container_name=container_name, 
-                                download_dir=self.download_dir)
-            # Set as attribute 
-            setattr(self, container_name, container_manager)
+        self._container_names = dict.fromkeys(container_list)
 
         return
     
@@ -246,4 +1324,47 @@ class AzureBlobStorageAccountManager:
     
     @property
     def storage_account(self):
-        return self._storage_account
\ No newline at end of file
+        return self._storage_account
+
+
+class AzureBlobAccountGroup:
+    def __init__(self, accounts:Iterable[AzureBlobStorageAccountManager]): 
+        """Several storage accounts, to run operations across the containers of all of them at once. 
+
+        Args: 
+            accounts (Iterable[AzureBlobStorageAccountManager]): Managers of the accounts (each keeps its own connection 
+                pool, retry policy and throttle). 
+        """
+        self.accounts = {a.storage_account: a for a in accounts}
+
+    def __getitem__(self, storage_account:str) -> AzureBlobStorageAccountManager: 
+        return self.accounts[storage_account]
+
+    def fan_out(self, 
+                operation:Callable[[AzureBlobContainerManager], Iterable], 
+                containers:Optional[Dict[str, Iterable[str]]]=None, 
+                max_concurrency:int=DEFAULT_FANOUT_CONCURRENCY, 
+                max_per_account:Optional[int]=None, 
+                timeout:Optional[float]=None, 
+                raise_on_error:bool=False) -> FanoutResults: 
+        """Run the same operation on the containers of every account concurrently, merging what it yields into one stream. 
+
+        See AzureBlobStorageAccountManager.fan_out(). Containers are started taking the accounts in turn. 
+
+        Args: 
+            containers (Optional[Dict[str, Iterable[str]]]): Containers to run on per account name (default is every 
+                container set on each account's manager). 
+            max_concurrency (int): Number of containers worked on at once, across all accounts. 
+            max_per_account (Optional[int]): Number of containers of one account worked on at once (default no limit). 
+            Other args: See AzureBlobStorageAccountManager.fan_out(). 
+        """
+        if containers is None: 
+            containers = {name: None for name in self.accounts}
+        tasks = []
+        for account_name, names in containers.items(): 
+            tasks.extend(self.accounts[account_name]._fan_out_tasks(operation, names))
+        return FanoutResults(tasks, 
+                             max_concurrency=max_concurrency, 
+                             max_per_account=max_per_account, 
+                             timeout=timeout, 
+                             raise_on_error=raise_on_error)
@@ -0,0 +1,153 @@
+"""Bulk delete / tier / tag operations, fanned out over concurrent Blob Batch requests."""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import ContainerClient
+from typing_extensions import TypedDict
+
+from .metrics import bind_operation
+
+# The service rejects batches of more than 256 sub-requests
+MAX_BATCH_SIZE = 256
+DEFAULT_BATCH_CONCURRENCY = 8
+DEFAULT_TAGS_CONCURRENCY = 32
+
+# (blob name, error message or None on success) for each item of a batch
+ItemResults = List[Tuple[str, Optional[str]]]
+
+
+class BatchSummary(TypedDict):
+    """Outcome of a bulk operation. With dry_run, succeeded lists the blobs that would have been affected."""
+    succeeded: List[str]
+    failed: Dict[str, str]
+    dry_run: bool
+    seconds: float
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_bounded(fn: Callable[[List[str]], ItemResults], chunks: Iterator[List[str]], max_concurrency: int) -> Iterator[ItemResults]:
+    """(Internal Helper) Apply fn to each chunk on a pool, pulling chunks lazily so a huge listing is never held at once"""
+    fn = bind_operation(fn)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(fn, chunk))
+            if len(pending) >= max_concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def _error_message(error: HttpResponseError) -> str:
+    """(Internal Helper) Same 'status reason' form as a failed batch sub-response"""
+    return f"{error.status_code} {error.reason}" if error.status_code else str(error)
+
+
+def _batch_results(names: List[str], send: Callable[[List[str]], Iterable]) -> ItemResults:
+    """(Internal Helper) Send one batch, mapping each sub-response (or a failure of the whole batch) back to its blob"""
+    try:
+        responses = list(send(names))
+    except HttpResponseError as e:
+        return [(name, _error_message(e)) for name in names]
+    return [(name, None if 200 <= r.status_code < 300 else f"{r.status_code} {r.reason}")
+            for name, r in zip(names, responses)]
+
+
+def run_bulk(names: Iterable[str],
+             send_chunk: Callable[[List[str]], ItemResults],
+             chunk_size: int,
+             max_concurrency: int,
+             dry_run: bool = False,
+             on_success: Optional[Callable[[str], None]] = None) -> BatchSummary:
+    """Split names into chunks and send them concurrently, collecting a per-blob result.
+
+    Args:
+        names (Iterable[str]): Blob names (consumed lazily, e.g. straight from a listing).
+        send_chunk (Callable): Sends one chunk, returning (name, error or None) per blob.
+        chunk_size (int): Number of blobs per call of send_chunk.
+        max_concurrency (int): Number of chunks in flight at once.
+        dry_run (bool): Only report the blobs that would be affected, without sending anything.
+        on_success (Optional[Callable]): Called with each blob name that succeeded.
+    """
+    start = time.perf_counter()
+    succeeded, failed = [], {}
+
+    if dry_run:
+        succeeded = list(names)
+    else:
+        for results in _run_bounded(send_chunk, _chunks(names, chunk_size), max_concurrency):
+            for name, error in results:
+                if error is None:
+                    succeeded.append(name)
+                    if on_success is not None:
+                        on_success(name)
+                else:
+                    failed[name] = error
+
+    return BatchSummary(succeeded=succeeded, failed=failed, dry_run=dry_run, seconds=time.perf_counter() - start)
+
+
+def batch_delete(container_client: ContainerClient,
+                 names: Iterable[str],
+                 max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                 dry_run: bool = False,
+                 delete_snapshots: Optional[str] = None,
+                 on_success: Optional[Callable[[str], None]] = None) -> BatchSummary:
+    """Delete blobs with Blob Batch requests of up to 256 deletes each"""
+    options = {"delete_snapshots": delete_snapshots} if delete_snapshots else {}
+
+    def send(chunk):
+        return _batch_results(chunk, lambda c: container_client.delete_blobs(*c, raise_on_any_failure=False, **options))
+
+    return run_bulk(names, send, MAX_BATCH_SIZE, max_concurrency, dry_run=dry_run, on_success=on_success)
+
+
+def batch_set_tier(container_client: ContainerClient,
+                   names: Iterable[str],
+                   tier: str,
+                   max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                   dry_run: bool = False,
+                   rehydrate_priority: Optional[str] = None) -> BatchSummary:
+    """Set the access tier of block blobs with Blob Batch requests of up to 256 sub-requests each"""
+    options = {"rehydrate_priority": rehydrate_priority} if rehydrate_priority else {}
+
+    def send(chunk):
+        return _batch_results(chunk, lambda c: container_client.set_standard_blob_tier_blobs(tier, *c, raise_on_any_failure=False, **options))
+
+    return run_bulk(names, send, MAX_BATCH_SIZE, max_concurrency, dry_run=dry_run)
+
+
+def bulk_set_tags(container_client: ContainerClient,
+                  names: Iterable[str],
+                  tags: Dict[str, str],
+                  max_concurrency: int = DEFAULT_TAGS_CONCURRENCY,
+                  dry_run: bool = False) -> BatchSummary:
+    """Set the same tags on many blobs.
+
+    Set Blob Tags is not one of the operations the Blob Batch API accepts, so each blob gets its own
+    request, with many in flight at once.
+    """
+    def send(chunk):
+        results = []
+        for name in chunk:
+            try:
+                container_client.get_blob_client(name).set_blob_tags(tags)
+                results.append((name, None))
+            except HttpResponseError as e:
+                results.append((name, _error_message(e)))
+        return results
+
+    return run_bulk(names, send, 1, max_concurrency, dry_run=dry_run)
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Dict, Iterable, Optional
+
+# Names written to the on-disk index per transaction during a rebuild (lookups take turns with each batch)
+_REBUILD_BATCH = 10000
+
+
+class BlobNameIndex:
+    def __init__(self, ttl: Optional[float] = 300, path: Optional[str] = None):
+        """Local index of the blob names in a container, used to answer existence checks without a round trip.
+
+        Names are held in an in-memory set by default. For containers too large to hold in memory, pass
+        ``path`` to keep the index in an on-disk SQLite database instead.
+
+        Args:
+            ttl (Optional[float]): Seconds after a rebuild before the index is considered stale (None = never).
+            path (Optional[str]): Optional path to a SQLite file to store the index on disk.
+        """
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        # Held for the whole of a rebuild, so only one runs at a time (see rebuild())
+        self.refresh_lock = threading.RLock()
+        self._built_at = None  # monotonic time of the last rebuild
+        self._pending = None  # during a rebuild: name -> whether it was last added (True) or discarded (False)
+        self._invalidations = 0
+
+        if path is None:
+            self._names = set()
+            self._db = None
+        else:
+            dir_name = os.path.dirname(path)
+            if dir_name and not os.path.exists(dir_name):
+                os.makedirs(dir_name)
+            self._names = None
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS blob_names (name TEXT PRIMARY KEY) WITHOUT ROWID")
+            self._db.commit()
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def is_stale(self) -> bool:
+        """Whether the index has never been built or is older than its TTL"""
+        if self._built_at is None:
+            return True
+        if self.ttl is None:
+            return False
+        return (time.monotonic() - self._built_at) > self.ttl
+
+    def rebuild(self, names: Iterable[str]) -> int:
+        """Replace the contents of the index with the given names (consumed lazily). Returns the new size.
+
+        Lookups keep answering from the old contents while the names are consumed (e.g. during a slow listing),
+        and names added or discarded meanwhile are applied on top of the new contents, so they are not lost.
+        Holds refresh_lock throughout, so concurrent rebuilds run one after the other.
+        """
+        with self.refresh_lock:
+            with self._lock:
+                self._pending = {}
+                invalidations = self._invalidations
+                if self._db is not None:
+                    self._db.execute("DROP TABLE IF EXISTS blob_names_rebuild")
+                    self._db.execute("CREATE TABLE blob_names_rebuild (name TEXT PRIMARY KEY) WITHOUT ROWID")
+                    self._db.commit()
+            try:
+                if self._db is None:
+                    new_names = set(names)
+                else:
+                    names = iter(names)
+                    for batch in iter(lambda: list(islice(names, _REBUILD_BATCH)), []):
+                        with self._lock, self._db:
+                            self._db.executemany("INSERT OR IGNORE INTO blob_names_rebuild (name) VALUES (?)",
+                                                 ((n,) for n in batch))
+
+                with self._lock:
+                    added = [n for n, present in self._pending.items() if present]
+                    discarded = [n for n, present in self._pending.items() if not present]
+                    if self._db is None:
+                        new_names.update(added)
+                        new_names.difference_update(discarded)
+                        self._names = new_names
+                        count = len(new_names)
+                    else:
+                        self._db.execute("BEGIN")
+                        try:
+                            self._db.executemany("INSERT OR IGNORE INTO blob_names_rebuild (name) VALUES (?)",
+                                                 ((n,) for n in added))
+                            self._db.executemany("DELETE FROM blob_names_rebuild WHERE name = ?", ((n,) for n in discarded))
+                            self._db.execute("DROP TABLE blob_names")
+                            self._db.execute("ALTER TABLE blob_names_rebuild RENAME TO blob_names")
+                            self._db.commit()
+                        except BaseException:
+                            self._db.rollback()
+                            raise
+                        count = self._db.execute("SELECT COUNT(*) FROM blob_names").fetchone()[0]
+                    # An invalidation during the rebuild may concern changes the listing missed
+                    if self._invalidations == invalidations:
+                        self._built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._pending = None
+        return count
+
+    def _record(self, names: Iterable[str], present: bool) -> None:
+        """(Internal Helper) Remember writes made during a rebuild, to apply on top of its listing. Call under _lock."""
+        if self._pending is not None:
+            self._pending.update((n, present) for n in names)
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self._record([name], True)
+            if self._db is None:
+                self._names.add(name)
+            else:
+                with self._db:
+                    self._db.execute("INSERT OR IGNORE INTO blob_names (name) VALUES (?)", (name,))
+
+    def add_many(self, names: Iterable[str]) -> None:
+        """Add several names in one step (one transaction when on disk)."""
+        names = list(names)
+        with self._lock:
+            self._record(names, True)
+            if self._db is None:
+                self._names.update(names)
+            else:
+                with self._db:
+                    self._db.executemany("INSERT OR IGNORE INTO blob_names (name) VALUES (?)", ((n,) for n in names))
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._record([name], False)
+            if self._db is None:
+                self._names.discard(name)
+            else:
+                with self._db:
+                    self._db.execute("DELETE FROM blob_names WHERE name = ?", (name,))
+
+    def invalidate(self) -> None:
+        """Mark the index stale so the next lookup triggers a rebuild"""
+        with self._lock:
+            self._invalidations += 1
+            self._built_at = None
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            if self._db is None:
+                return name in self._names
+            row = self._db.execute("SELECT 1 FROM blob_names WHERE name = ?", (name,)).fetchone()
+            return row is not None
+
+    def contains_many(self, names: Iterable[str]) -> Dict[str, bool]:
+        """Check many names against the index in one pass."""
+        names = list(names)
+        with self._lock:
+            if self._db is None:
+                return {n: n in self._names for n in names}
+
+            found = set()
+            chunk_size = 900  # stay under SQLite's bound-parameter limit
+            for i in range(0, len(names), chunk_size):
+                chunk = names[i:i + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(f"SELECT name FROM blob_names WHERE name IN ({placeholders})", chunk)
+                found.update(r[0] for r in rows)
+            return {n: n in found for n in names}
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._db is None:
+                return len(self._names)
+            return self._db.execute("SELECT COUNT(*) FROM blob_names").fetchone()[0]
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
@@ -0,0 +1,190 @@
+"""Disk-backed read-through cache of blob content, revalidated by ETag."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import BlobClient
+
+from .transfer import download_to_file
+
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_FRESHNESS = 0.0
+
+
+class BlobCache:
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 freshness_seconds: float = DEFAULT_CACHE_FRESHNESS):
+        """Local cache of downloaded blobs, shared safely by every process on the host that uses the same cache_dir.
+
+        Each cached blob is stored as a file alongside the ETag it was downloaded at. Within `freshness_seconds`
+        of being fetched or revalidated, a cached blob is served with no network call at all. After that it is
+        revalidated with a conditional GET (If-None-Match), which costs a round trip but no transfer when the
+        blob is unchanged. The least recently used blobs are evicted to keep the cache under `max_bytes`.
+
+        Args:
+            cache_dir (str): Directory to hold the cached blobs and their index.
+            max_bytes (int): Size budget for cached content.
+            freshness_seconds (float): Seconds a cached blob is trusted without revalidation (0 = always revalidate).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.freshness_seconds = freshness_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # SQLite's file locking coordinates the index between processes; the thread lock within this one
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.db"), timeout=60,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS entries (
+                                key TEXT PRIMARY KEY,
+                                etag TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                fetched_at REAL NOT NULL,
+                                last_access REAL NOT NULL)""")
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "bytes_saved": 0, "bytes_downloaded": 0, "evictions": 0}
+
+    @staticmethod
+    def cache_key(blob_client: BlobClient) -> str:
+        return f"{blob_client.account_name}/{blob_client.container_name}/{blob_client.blob_name}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".blob")
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for this process: hits (incl. revalidated), misses, revalidated (304s), bytes saved/downloaded, evictions"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **increments) -> None:
+        with self._lock:
+            for k, v in increments.items():
+                self._stats[k] += v
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self._db.execute("SELECT etag, size, fetched_at FROM entries WHERE key = ?", (key,)).fetchone()
+
+    def _touch(self, key: str, revalidated: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._db.execute("UPDATE entries SET last_access = ?, fetched_at = ? WHERE key = ?", (now, now, key))
+            else:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+
+    def fetch(self, blob_client: BlobClient, max_concurrency: int = 1) -> str:
+        """Return the path of a local copy of the blob, downloading it only if the cached copy is missing or stale.
+
+        The returned file is replaced atomically when the blob changes and may be evicted later, so read or
+        copy it promptly (an already opened handle stays valid either way). It is downloaded with
+        transfer.download_to_file(), so it holds exactly what an uncached download of the blob returns.
+        """
+        key = self.cache_key(blob_client)
+        path = self._path(key)
+        entry = self._lookup(key)
+        etag = match_condition = None
+
+        if entry is not None and os.path.exists(path):
+            etag, size, fetched_at = entry
+            if time.time() - fetched_at <= self.freshness_seconds:
+                self._touch(key)
+                self._count(hits=1, bytes_saved=size)
+                return path
+            match_condition = MatchConditions.IfModified
+
+        # Land the new content under a unique name, then swap it in so readers never see a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            props = download_to_file(blob_client, tmp_path, max_concurrency=max_concurrency,
+                                     etag=etag, match_condition=match_condition)
+        except HttpResponseError as e:
+            # The download path reports 304 as a plain HttpResponseError rather than ResourceNotModifiedError
+            if e.status_code != 304:
+                raise
+            self._touch(key, revalidated=True)
+            self._count(hits=1, revalidated=1, bytes_saved=size)
+            return path
+        try:
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries (key, etag, size, fetched_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                             (key, props.etag, size, now, now))
+        self._count(misses=1, bytes_downloaded=size)
+        self._evict(keep=key)
+        return path
+
+    def open(self, blob_client: BlobClient, max_concurrency: int = 1) -> BinaryIO:
+        """Open the cached copy of the blob for reading (see fetch()), fetching again if another process evicts it first"""
+        for _ in range(3):
+            path = self.fetch(blob_client, max_concurrency=max_concurrency)
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"Cached copy of blob '{blob_client.blob_name}' was evicted before it could be opened.")
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """(Internal Helper) Drop least recently used entries until the cache fits its byte budget"""
+        evicted = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._db.execute("SELECT key, size FROM entries WHERE key != ? ORDER BY last_access",
+                                            (keep or "",)).fetchall()
+                    for key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        try:
+                            os.remove(self._path(key))
+                        except FileNotFoundError:
+                            pass
+                        total -= size
+                        evicted += 1
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if evicted:
+            self._count(evictions=evicted)
+
+    def invalidate(self, blob_client: BlobClient) -> None:
+        """Drop a blob from the cache (e.g. after this process overwrote it)"""
+        key = self.cache_key(blob_client)
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = [r[0] for r in self._db.execute("SELECT key FROM entries").fetchall()]
+            self._db.execute("DELETE FROM entries")
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,242 @@
+"""Incremental listing of what changed in a container, from the Blob Change Feed or a local snapshot."""
+import datetime as dt
+import json
+import os
+import sqlite3
+from typing import Generator, Iterator, List, Optional
+
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import ContainerClient
+from typing_extensions import TypedDict
+
+# System container the service writes the change feed to, when it is enabled on the account
+CHANGE_FEED_CONTAINER = "$blobchangefeed"
+# When switching from a listing to the feed, start reading the feed this long before the listing began, so
+# clock skew and events the feed publishes late are not missed (older events are recognised as stale and skipped)
+FEED_OVERLAP = dt.timedelta(minutes=15)
+_SQLITE_MAX_PARAMS = 900
+
+
+class BlobChange(TypedDict):
+    """One blob that was created, modified or deleted. etag, size and last_modified are the blob's latest known values."""
+    change: str
+    name: str
+    etag: Optional[str]
+    size: Optional[int]
+    last_modified: Optional[dt.datetime]
+
+
+class BlobChanges:
+    def __init__(self, changes: Generator[BlobChange, None, str]):
+        """Single-use iterator over the changes since a checkpoint. Once it is exhausted, `checkpoint` holds the
+        checkpoint to pass to the next changes_since() call. The local snapshot is only advanced when the
+        iteration completes, so abandoning it part-way leaves the previous checkpoint valid."""
+        self._changes = changes
+        self._checkpoint = None
+
+    def __iter__(self) -> Iterator[BlobChange]:
+        self._checkpoint = yield from self._changes
+
+    @property
+    def checkpoint(self) -> str:
+        if self._checkpoint is None:
+            raise RuntimeError("The new checkpoint is only available once every change has been consumed.")
+        return self._checkpoint
+
+
+def _as_datetime(value) -> Optional[dt.datetime]:
+    """(Internal Helper) Timestamp from the SDK (datetime) or the change feed (ISO string with up to 7 fractional digits)"""
+    if value is None or isinstance(value, dt.datetime):
+        return value
+    text = value.rstrip("Z")
+    if "." in text:
+        whole, fraction = text.split(".", 1)
+        text = f"{whole}.{fraction[:6]}"
+    return dt.datetime.fromisoformat(text).replace(tzinfo=dt.timezone.utc)
+
+
+class _SnapshotStore:
+    def __init__(self, path: str):
+        """(Internal Helper) The last known name/etag/size/last_modified of every blob, in a SQLite file.
+
+        Writes go through one connection and are committed together with the new generation number, while
+        listings are diffed against a second connection's consistent (WAL) view of the previous snapshot.
+        """
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS blobs (name TEXT PRIMARY KEY, etag TEXT, size INTEGER, "
+                         "last_modified TEXT) WITHOUT ROWID")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        self._db.commit()
+        self._reader = sqlite3.connect(path)
+
+    @property
+    def generation(self) -> int:
+        row = self._db.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def read_sorted(self) -> Iterator[tuple]:
+        return self._reader.execute("SELECT name, etag, size, last_modified FROM blobs ORDER BY name")
+
+    def get_many(self, names: List[str]) -> dict:
+        found = {}
+        for i in range(0, len(names), _SQLITE_MAX_PARAMS):
+            chunk = names[i:i + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._db.execute(f"SELECT name, etag, size, last_modified FROM blobs WHERE name IN ({placeholders})", chunk)
+            found.update((r[0], r) for r in rows)
+        return found
+
+    def put(self, change: BlobChange) -> None:
+        if change["change"] == "deleted":
+            self._db.execute("DELETE FROM blobs WHERE name = ?", (change["name"],))
+        else:
+            modified = change["last_modified"]
+            self._db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)",
+                             (change["name"], change["etag"], change["size"], modified.isoformat() if modified else None))
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM blobs")
+
+    def commit(self, generation: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO state VALUES ('generation', ?)", (str(generation),))
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.rollback()
+        self._reader.close()
+        self._db.close()
+
+
+def _change(kind: str, name: str, etag, size, last_modified) -> BlobChange:
+    return BlobChange(change=kind, name=name, etag=etag, size=size, last_modified=_as_datetime(last_modified))
+
+
+def _diff_listing(container_client: ContainerClient, previous: Iterator[tuple], results_per_page: Optional[int]) -> Iterator[BlobChange]:
+    """(Internal Helper) Merge a streaming listing with the previous snapshot's rows, both in name order, yielding the differences"""
+    previous = iter(previous)
+    old = next(previous, None)
+    last_name = None
+    for blob in container_client.list_blobs(results_per_page=results_per_page):
+        if last_name is not None and blob.name <= last_name:
+            # The merge relies on the service listing names in (UTF-8 binary) order, as SQLite sorts them
+            raise RuntimeError(f"Listing of '{container_client.container_name}' is out of order at '{blob.name}'.")
+        last_name = blob.name
+        while old is not None and old[0] < blob.name:
+            yield _change("deleted", *old)
+            old = next(previous, None)
+        if old is None or old[0] != blob.name:
+            yield _change("created", blob.name, blob.etag, blob.size, blob.last_modified)
+        else:
+            if old[1] != blob.etag:
+                yield _change("modified", blob.name, blob.etag, blob.size, blob.last_modified)
+            old = next(previous, None)
+    while old is not None:
+        yield _change("deleted", *old)
+        old = next(previous, None)
+
+
+def _diff_feed(feed_pages, container_name: str, store: _SnapshotStore) -> Iterator[BlobChange]:
+    """(Internal Helper) Changes to this container's blobs from change feed events, checked against the snapshot"""
+    subject_prefix = f"/blobServices/default/containers/{container_name}/blobs/"
+    for page in feed_pages:
+        events = [e for e in page if e.get("subject", "").startswith(subject_prefix)
+                  and e.get("eventType") in ("BlobCreated", "BlobPropertiesUpdated", "BlobDeleted")]
+        known = store.get_many([e["subject"][len(subject_prefix):] for e in events])
+        for event in events:
+            name = event["subject"][len(subject_prefix):]
+            data = event.get("data") or {}
+            event_time = _as_datetime(event.get("eventTime"))
+            old = known.get(name)
+            if old is not None and old[3] is not None and event_time is not None and event_time < _as_datetime(old[3]):
+                # Older than what the snapshot already holds (e.g. from the overlap with a listing)
+                continue
+            if event["eventType"] == "BlobDeleted":
+                if old is None:
+                    continue
+                change = _change("deleted", name, old[1], old[2], old[3])
+                known.pop(name)
+            else:
+                etag = data.get("etag")
+                if old is not None and old[1] == etag:
+                    continue
+                size = data.get("contentLength", old[2] if old is not None else None)
+                change = _change("created" if old is None else "modified", name, etag, size, event_time)
+                known[name] = (name, etag, size, event_time.isoformat() if event_time else None)
+            store.put(change)
+            yield change
+
+
+def _change_feed_client(container_client: ContainerClient, use_change_feed: Optional[bool]):
+    """(Internal Helper) A ChangeFeedClient for the container's account, or None to fall back to listings"""
+    if use_change_feed is False:
+        return None
+    try:
+        from azure.storage.blob.changefeed import ChangeFeedClient
+    except ImportError:
+        if use_change_feed:
+            raise ImportError("The change feed requires the 'azure-storage-blob-changefeed' package (pip install azb-manager[changefeed]).")
+        return None
+
+    service_client = container_client._get_blob_service_client()
+    try:
+        enabled = service_client.get_container_client(CHANGE_FEED_CONTAINER).exists()
+    except HttpResponseError:
+        # e.g. a container-scoped SAS, which cannot read the feed either
+        enabled = False
+    if not enabled:
+        if use_change_feed:
+            raise ValueError(f"The Blob Change Feed is not enabled on storage account '{container_client.account_name}'.")
+        return None
+    return ChangeFeedClient(service_client.url, credential=service_client.credential)
+
+
+def iter_changes(container_client: ContainerClient,
+                 state_path: str,
+                 checkpoint: Optional[str] = None,
+                 use_change_feed: Optional[bool] = None,
+                 results_per_page: Optional[int] = None) -> Generator[BlobChange, None, str]:
+    """Yield the blobs created, modified or deleted since a checkpoint, returning the new checkpoint.
+
+    The snapshot at state_path holds the state the checkpoint refers to, so each checkpoint is only valid
+    with the snapshot it came from, and only the latest checkpoint can be resumed from.
+    See AzureBlobContainerManager.changes_since().
+    """
+    state = json.loads(checkpoint) if checkpoint else None
+    store = _SnapshotStore(state_path)
+    try:
+        generation = store.generation
+        if state is None:
+            store.clear()
+        elif state["generation"] != generation:
+            raise ValueError(f"Checkpoint is for generation {state['generation']} of the snapshot in {state_path}, "
+                             f"which is at generation {generation} (start over with checkpoint=None).")
+
+        feed_client = _change_feed_client(container_client, use_change_feed)
+        feed_cursor = feed_start = None
+        if feed_client is not None and state is not None and (state.get("feed_cursor") or state.get("feed_start")):
+            if state.get("feed_cursor"):
+                pages = feed_client.list_changes(results_per_page=results_per_page).by_page(continuation_token=state["feed_cursor"])
+            else:
+                pages = feed_client.list_changes(start_time=_as_datetime(state["feed_start"]),
+                                                 results_per_page=results_per_page).by_page()
+            yield from _diff_feed(pages, container_client.container_name, store)
+            feed_cursor = pages.continuation_token
+            if feed_cursor is None:
+                feed_start = state.get("feed_start")
+        else:
+            if feed_client is not None:
+                # Switch to the feed from the next call, reading it from (a margin before) this listing
+                feed_start = (dt.datetime.now(dt.timezone.utc) - FEED_OVERLAP).isoformat()
+            previous = store.read_sorted() if state is not None else ()
+            for change in _diff_listing(container_client, previous, results_per_page):
+                store.put(change)
+                yield change
+
+        store.commit(generation + 1)
+    finally:
+        store.close()
+    return json.dumps({"generation": generation + 1, "feed_cursor": feed_cursor, "feed_start": feed_start})
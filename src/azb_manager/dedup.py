@@ -0,0 +1,97 @@
+"""Content-addressed uploads: reuse a blob that already holds the same bytes instead of uploading them again."""
+import hashlib
+import os
+import sqlite3
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple, Union
+
+# Blob index tag holding the SHA-256 (hex) of a blob's content, set by content-addressed uploads
+CONTENT_HASH_TAG = "azb-sha256"
+# Below this size, looking up existing content costs about as much as uploading it
+DEFAULT_DEDUP_MIN_SIZE = 64 * 1024
+_HASH_READ_SIZE = 4 * 1024 * 1024
+
+
+def content_digests(body: Union[bytes, str, BytesIO, None] = None, file_path: Optional[str] = None) -> Tuple[str, bytes, int]:
+    """SHA-256 (hex, the content address), MD5 (for Content-MD5) and size of an upload, hashed in one pass.
+
+    Args:
+        body (Union[bytes, str, BytesIO, None]): Data to upload (a BytesIO is hashed from its current position,
+            which is where the upload reads from, without moving it).
+        file_path (Optional[str]): File to upload instead, read in blocks.
+    """
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    size = 0
+    if file_path is not None:
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+                sha256.update(block)
+                md5.update(block)
+                size += len(block)
+    elif isinstance(body, BytesIO):
+        # Release the views straight away: a BytesIO cannot be resized while its buffer is exported
+        with body.getbuffer() as buffer, buffer[body.tell():] as data:
+            sha256.update(data)
+            md5.update(data)
+            size = data.nbytes
+    else:
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        sha256.update(data)
+        md5.update(data)
+        size = len(data)
+    return sha256.hexdigest(), md5.digest(), size
+
+
+class ContentIndex:
+    def __init__(self, path: Optional[str] = None):
+        """Local cache of content hash -> name of a blob holding that content, consulted before the service's tag index.
+
+        Entries are hints: a blob may since have been deleted or overwritten, so callers check them before use.
+        Held in memory by default, or in a SQLite file at ``path`` to share across runs.
+
+        Args:
+            path (Optional[str]): Optional path to a SQLite file to store the index on disk.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if path is None:
+            self._names: Optional[Dict[str, str]] = {}
+            self._db = None
+        else:
+            dir_name = os.path.dirname(path)
+            if dir_name and not os.path.exists(dir_name):
+                os.makedirs(dir_name)
+            self._names = None
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS content (sha256 TEXT PRIMARY KEY, name TEXT) WITHOUT ROWID")
+            self._db.commit()
+
+    def get(self, sha256: str) -> Optional[str]:
+        with self._lock:
+            if self._db is None:
+                return self._names.get(sha256)
+            row = self._db.execute("SELECT name FROM content WHERE sha256 = ?", (sha256,)).fetchone()
+            return row[0] if row else None
+
+    def put(self, sha256: str, name: str) -> None:
+        with self._lock:
+            if self._db is None:
+                self._names[sha256] = name
+            else:
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO content (sha256, name) VALUES (?, ?)", (sha256, name))
+
+    def discard(self, sha256: str, name: str) -> None:
+        """Forget an entry, if it still maps sha256 to name"""
+        with self._lock:
+            if self._db is None:
+                if self._names.get(sha256) == name:
+                    del self._names[sha256]
+            else:
+                with self._db:
+                    self._db.execute("DELETE FROM content WHERE sha256 = ? AND name = ?", (sha256, name))
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
@@ -0,0 +1,89 @@
+"""Incremental JSON / NDJSON encoding and compression of record streams for upload."""
+import json
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+JSON_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+COMPRESSIONS = ('gzip', 'zstd')
+DEFAULT_ENCODE_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_json_chunks(records: Iterable[Any], fmt: str = 'json', chunk_size: int = DEFAULT_ENCODE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Serialize records one at a time, yielding UTF-8 chunks of roughly chunk_size bytes.
+
+    Args:
+        records (Iterable[Any]): JSON-serializable records (consumed lazily, so a generator works).
+        fmt (str): 'json' for a single JSON array, or 'ndjson' for one JSON document per line.
+        chunk_size (int): Approximate size in bytes of each yielded chunk.
+    """
+    if fmt not in JSON_FORMATS:
+        raise ValueError(f"Unknown JSON format '{fmt}'. Must be one of {', '.join(JSON_FORMATS)}")
+
+    buffer = bytearray()
+    if fmt == 'json':
+        buffer += b'['
+    first = True
+    for record in records:
+        try:
+            encoded = json.dumps(record).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            raise TypeError(f"Failed to encode record {record!r} to binary JSON ({str(e)})") from e
+
+        if fmt == 'json':
+            if not first:
+                buffer += b','
+            buffer += encoded
+        else:
+            buffer += encoded
+            buffer += b'\n'
+        first = False
+
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if fmt == 'json':
+        buffer += b']'
+    if buffer:
+        yield bytes(buffer)
+
+
+def compress_chunks(chunks: Iterable[bytes], compression: Optional[str]) -> Iterator[bytes]:
+    """Compress a stream of chunks in the same pass (gzip via zlib, or zstd via the optional zstandard package)"""
+    if compression is None:
+        yield from chunks
+        return
+
+    if compression == 'gzip':
+        compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the 'zstandard' package (pip install azb-manager[zstd]).")
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        raise ValueError(f"Unknown compression '{compression}'. Must be one of {', '.join(COMPRESSIONS)}")
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    tail = compressor.flush()
+    if tail:
+        yield tail
+
+
+def rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Regroup a stream of arbitrary-sized chunks into chunks of exactly `size` bytes (the last may be shorter)"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,186 @@
+"""Merge several lazily produced streams into one, producing them concurrently."""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from azure.core.exceptions import HttpResponseError
+from typing_extensions import TypedDict
+
+from .batch import _error_message
+
+T = TypeVar("T")
+
+DEFAULT_FANOUT_CONCURRENCY = 8
+DEFAULT_MERGE_BUFFER = 1024
+
+_DONE = object()
+_ERROR = object()
+
+
+def merge_concurrently(sources: Iterable[Callable[[], Iterable[T]]],
+                       max_concurrency: int = DEFAULT_FANOUT_CONCURRENCY,
+                       buffer_size: int = DEFAULT_MERGE_BUFFER) -> Iterator[T]:
+    """Yield the items of every source as they arrive, running up to max_concurrency sources at once.
+
+    Sources are producers called on worker threads (e.g. one paged listing per container). Items are
+    passed through a bounded buffer, so a slow consumer throttles the producers rather than letting
+    results pile up in memory. The first error raised by a source is re-raised to the consumer, and
+    closing the returned generator early stops the remaining producers.
+
+    Args:
+        sources (Iterable[Callable[[], Iterable[T]]]): Callables that each return an iterable of items.
+        max_concurrency (int): Number of sources to produce from at once.
+        buffer_size (int): Maximum number of items waiting to be consumed.
+    """
+    sources = list(sources)
+    if max_concurrency <= 1 or len(sources) <= 1:
+        for source in sources:
+            yield from source()
+        return
+
+    buffer = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(source):
+        try:
+            for item in source():
+                if not put((None, item)):
+                    return
+        except BaseException as e:
+            put((_ERROR, e))
+        finally:
+            put((_DONE, None))
+
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(sources)))
+    futures = [executor.submit(produce, source) for source in sources]
+
+    remaining = len(sources)
+    try:
+        while remaining:
+            kind, value = buffer.get()
+            if kind is _DONE:
+                remaining -= 1
+            elif kind is _ERROR:
+                raise value
+            else:
+                yield value
+    finally:
+        stop.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class FanoutItem(TypedDict):
+    """One item produced by the operation run on a container"""
+    account: str
+    container: str
+    item: Any
+
+
+class ContainerReport(TypedDict):
+    """Outcome of the operation on one container. seconds runs from its start until its last item was consumed."""
+    account: str
+    container: str
+    items: int
+    seconds: Optional[float]
+    error: Optional[str]
+
+
+# (account name, container name, producer of the container's items)
+FanoutTask = Tuple[str, str, Callable[[], Iterable]]
+
+
+class FanoutResults:
+    def __init__(self,
+                 tasks: List[FanoutTask],
+                 max_concurrency: int = DEFAULT_FANOUT_CONCURRENCY,
+                 max_per_account: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 raise_on_error: bool = False,
+                 buffer_size: int = DEFAULT_MERGE_BUFFER):
+        """Single-use stream of the items an operation produces across many containers, with a report per container.
+
+        Containers are worked on max_concurrency at a time (and at most max_per_account at a time per account,
+        taking the accounts in turn). A container whose operation fails, or runs past timeout, is recorded in
+        its report and the others carry on, unless raise_on_error.
+
+        Args:
+            tasks (List[FanoutTask]): (account, container, producer) for each container.
+            max_concurrency (int): Number of containers worked on at once.
+            max_per_account (Optional[int]): Number of containers of one account worked on at once (default no limit).
+            timeout (Optional[float]): Seconds a container's operation may run before it is abandoned (checked between items).
+            raise_on_error (bool): Re-raise the first failure instead of recording it, stopping the other containers.
+            buffer_size (int): Maximum number of items waiting to be consumed.
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.raise_on_error = raise_on_error
+        self.buffer_size = buffer_size
+        self._tasks = _interleave_accounts(tasks)
+        self._reports = {(a, c): ContainerReport(account=a, container=c, items=0, seconds=None, error=None)
+                         for a, c, _ in self._tasks}
+        self._account_slots = ({a: threading.Semaphore(max_per_account) for a, _, _ in self._tasks}
+                               if max_per_account else {})
+
+    def __iter__(self) -> Iterator[FanoutItem]:
+        return merge_concurrently([self._source(*task) for task in self._tasks],
+                                  max_concurrency=self.max_concurrency,
+                                  buffer_size=self.buffer_size)
+
+    @property
+    def reports(self) -> List[ContainerReport]:
+        """Report of every container so far (final once the stream is exhausted)"""
+        return list(self._reports.values())
+
+    @property
+    def failed(self) -> Dict[str, str]:
+        """Error for each 'account/container' whose operation failed"""
+        return {f"{r['account']}/{r['container']}": r['error'] for r in self._reports.values() if r['error']}
+
+    def _source(self, account: str, container: str, produce: Callable[[], Iterable]) -> Callable[[], Iterator[FanoutItem]]:
+        report = self._reports[(account, container)]
+        slot = self._account_slots.get(account)
+
+        def source():
+            if slot is not None:
+                slot.acquire()
+            start = time.perf_counter()
+            try:
+                for item in produce():
+                    report['items'] += 1
+                    yield FanoutItem(account=account, container=container, item=item)
+                    if self.timeout is not None and time.perf_counter() - start > self.timeout:
+                        raise TimeoutError(f"Operation on '{account}/{container}' did not finish within {self.timeout}s.")
+            except Exception as e:
+                report['error'] = _error_message(e) if isinstance(e, HttpResponseError) else f"{type(e).__name__}: {e}"
+                if self.raise_on_error:
+                    raise
+            finally:
+                report['seconds'] = time.perf_counter() - start
+                if slot is not None:
+                    slot.release()
+        return source
+
+
+def _interleave_accounts(tasks: List[FanoutTask]) -> List[FanoutTask]:
+    """(Internal Helper) Order tasks round-robin across accounts, so a per-account limit doesn't leave workers idle"""
+    by_account: Dict[str, List[FanoutTask]] = {}
+    for task in tasks:
+        by_account.setdefault(task[0], []).append(task)
+    queues = list(by_account.values())
+    interleaved = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        interleaved.extend(q[i] for q in queues if i < len(q))
+    return interleaved
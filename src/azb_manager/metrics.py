@@ -0,0 +1,271 @@
+"""Per-operation instrumentation of the managers, reported to pluggable sinks."""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from .retry import retry_count
+
+T = TypeVar("T")
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current = threading.local()
+# Guards the counters of a record that worker threads update concurrently (see bind_operation())
+_record_lock = threading.Lock()
+
+
+class OperationRecord:
+    """What one manager operation did. Fields are filled in while it runs and reported to sinks when it ends."""
+    __slots__ = ("name", "attributes", "seconds", "bytes_in", "bytes_out", "pages", "retries", "error", "_span", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.pages = 0
+        self.retries = 0
+        self.error = None
+
+    def as_dict(self) -> dict:
+        return {"operation": self.name, **self.attributes, "seconds": self.seconds, "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out, "pages": self.pages, "retries": self.retries, "error": self.error}
+
+
+def current_operation() -> OperationRecord:
+    """The operation running on this thread (or a fresh throwaway record, so callers never need to check)"""
+    record = getattr(_current, "operation", None)
+    # A new record per call outside any operation: nothing reports it, and concurrent callers never share one
+    return record if record is not None else OperationRecord("untracked", {})
+
+
+def in_operation() -> bool:
+    """Whether an operation is already being tracked on this thread"""
+    return getattr(_current, "operation", None) is not None
+
+
+def bind_operation(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap fn so that, wherever it runs, it counts towards the operation current on the calling thread.
+
+    Operations are tracked per thread, so work handed to a pool (ranged downloads, staged blocks, batches,
+    sync transfers) is wrapped with this where it is submitted: on the worker, current_operation() is then
+    the submitting operation, and retries made there are added to it.
+    """
+    record = getattr(_current, "operation", None)
+    if record is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        previous = getattr(_current, "operation", None)
+        if previous is record:
+            # Running on the operation's own thread, whose retries are already counted
+            return fn(*args, **kwargs)
+        _current.operation = record
+        retries_before = retry_count()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _record_lock:
+                record.retries += retry_count() - retries_before
+            _current.operation = previous
+
+    return run
+
+
+class MetricsSink:
+    """Base class of sinks. Subclasses override on_start() and/or on_finish()."""
+
+    def on_start(self, record: OperationRecord) -> None:
+        pass
+
+    def on_finish(self, record: OperationRecord) -> None:
+        pass
+
+    @contextmanager
+    def operation(self, name: str, track: bool = True, **attributes) -> Iterator[OperationRecord]:
+        """Time and report an operation.
+
+        Args:
+            name (str): Operation name (e.g. 'download').
+            track (bool): Make it the thread's current_operation() while it runs. Pass False for operations
+                spanning a generator, whose caller runs on the same thread between items.
+            **attributes: Labels reported with the operation (e.g. container).
+        """
+        record = OperationRecord(name, attributes)
+        self.on_start(record)
+        retries_before = retry_count()
+        if track:
+            _current.operation = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            record.seconds = time.perf_counter() - start
+            with _record_lock:
+                record.retries += retry_count() - retries_before
+            if track:
+                _current.operation = None
+            self.on_finish(record)
+
+
+class MultiSink(MetricsSink):
+    def __init__(self, *sinks: MetricsSink):
+        """Report every operation to each of several sinks (e.g. a MetricsRecorder and a LoggingSink)"""
+        self.sinks = sinks
+
+    def on_start(self, record: OperationRecord) -> None:
+        for sink in self.sinks:
+            sink.on_start(record)
+
+    def on_finish(self, record: OperationRecord) -> None:
+        for sink in self.sinks:
+            sink.on_finish(record)
+
+
+class LoggingSink(MetricsSink):
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        """Log one line per operation, with the full record attached as `extra={'azb': {...}}` for structured handlers"""
+        self.logger = logger or logging.getLogger("azb_manager.metrics")
+        self.level = level
+
+    def on_finish(self, record: OperationRecord) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "%s (%s) in %.1fms (%d bytes in, %d bytes out)%s",
+                            record.name, record.attributes.get("container") or "account", record.seconds * 1000,
+                            record.bytes_in, record.bytes_out, f" failed: {record.error}" if record.error else "",
+                            extra={"azb": record.as_dict()})
+
+
+class _Series:
+    __slots__ = ("count", "errors", "seconds", "buckets", "bytes_in", "bytes_out", "pages", "retries")
+
+    def __init__(self, bucket_count: int):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (bucket_count + 1)  # last is +Inf
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.pages = 0
+        self.retries = 0
+
+
+class MetricsRecorder(MetricsSink):
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """Aggregate operations in memory: call counts, errors, latency histograms, bytes, retries and pages.
+
+        Series are kept per (operation, container). Read them with snapshot(), or expose them to Prometheus
+        with to_prometheus() (text exposition format).
+
+        Args:
+            buckets (Sequence[float]): Upper bounds in seconds of the latency histogram buckets.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def on_finish(self, record: OperationRecord) -> None:
+        key = (record.name, record.attributes.get("container") or "")
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            series.count += 1
+            series.errors += record.error is not None
+            series.seconds += record.seconds
+            series.buckets[bisect.bisect_left(self.buckets, record.seconds)] += 1
+            series.bytes_in += record.bytes_in
+            series.bytes_out += record.bytes_out
+            series.pages += record.pages
+            series.retries += record.retries
+
+    def snapshot(self) -> List[dict]:
+        """One dict per (operation, container) series, with bucket counts keyed by upper bound ('+Inf' last)"""
+        with self._lock:
+            items = sorted(self._series.items())
+            return [{"operation": op, "container": container, "count": s.count, "errors": s.errors,
+                     "seconds": s.seconds, "bytes_in": s.bytes_in, "bytes_out": s.bytes_out, "pages": s.pages,
+                     "retries": s.retries,
+                     "latency_buckets": dict(zip([*map(str, self.buckets), "+Inf"], s.buckets))}
+                    for (op, container), s in items]
+
+    def to_prometheus(self, prefix: str = "azb") -> str:
+        """Render the series in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        labelled = [(f'operation="{s["operation"]}",container="{s["container"]}"', s) for s in snapshot]
+        lines = []
+
+        def family(name: str, kind: str, samples) -> None:
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(f"{prefix}_{suffix}{{{labels}}} {value}" for suffix, labels, value in samples)
+
+        family("operations_total", "counter",
+               [("operations_total", labels, s["count"]) for labels, s in labelled])
+        family("operation_errors_total", "counter",
+               [("operation_errors_total", labels, s["errors"]) for labels, s in labelled])
+        histogram = []
+        for labels, s in labelled:
+            cumulative = 0
+            for bound, count in s["latency_buckets"].items():
+                cumulative += count
+                histogram.append(("operation_seconds_bucket", f'{labels},le="{bound}"', cumulative))
+            histogram.append(("operation_seconds_sum", labels, s["seconds"]))
+            histogram.append(("operation_seconds_count", labels, s["count"]))
+        family("operation_seconds", "histogram", histogram)
+        family("bytes_total", "counter",
+               [("bytes_total", f'{labels},direction="{d}"', s[f"bytes_{d}"]) for labels, s in labelled for d in ("in", "out")])
+        family("list_pages_total", "counter",
+               [("list_pages_total", labels, s["pages"]) for labels, s in labelled])
+        family("retries_total", "counter",
+               [("retries_total", labels, s["retries"]) for labels, s in labelled])
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetrySink(MetricsSink):
+    def __init__(self, tracer=None):
+        """Record each operation as an OpenTelemetry span (the SDK's own HTTP spans nest under it when enabled).
+
+        Requires the optional opentelemetry-api package (pip install azb-manager[otel]).
+
+        Args:
+            tracer: Tracer to create spans with (default is the global tracer provider's 'azb_manager' tracer).
+        """
+        try:
+            from opentelemetry import context, trace
+        except ImportError:
+            raise ImportError("OpenTelemetrySink requires the 'opentelemetry-api' package (pip install azb-manager[otel]).")
+        self._context = context
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("azb_manager")
+
+    def on_start(self, record: OperationRecord) -> None:
+        attributes = {f"azb.{k}": v for k, v in record.attributes.items() if v is not None}
+        record._span = self.tracer.start_span(f"azb.{record.name}", attributes=attributes)
+        record._token = self._context.attach(self._trace.set_span_in_context(record._span))
+
+    def on_finish(self, record: OperationRecord) -> None:
+        span = record._span
+        span.set_attribute("azb.bytes_in", record.bytes_in)
+        span.set_attribute("azb.bytes_out", record.bytes_out)
+        span.set_attribute("azb.pages", record.pages)
+        span.set_attribute("azb.retries", record.retries)
+        if record.error:
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, record.error))
+        span.end()
+        try:
+            self._context.detach(record._token)
+        except ValueError:
+            # Operations spanning a generator may end in another context; the span is complete either way
+            pass
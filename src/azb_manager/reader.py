@@ -0,0 +1,166 @@
+"""Seekable, read-only file-like access to a blob through on-demand range requests."""
+import io
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from azure.core import MatchConditions
+from azure.storage.blob import BlobClient
+
+from .transfer import download_decoded
+
+DEFAULT_READ_BLOCK_SIZE = 1024 * 1024
+DEFAULT_CACHED_BLOCKS = 16
+DEFAULT_READ_AHEAD = 2
+
+
+class BlobReader(io.RawIOBase):
+    def __init__(self,
+                 blob_client: BlobClient,
+                 block_size: int = DEFAULT_READ_BLOCK_SIZE,
+                 cached_blocks: int = DEFAULT_CACHED_BLOCKS,
+                 read_ahead: int = DEFAULT_READ_AHEAD):
+        """Seekable, read-only file object over a blob, fetching only the blocks that are actually read.
+
+        Reads are served from fixed-size blocks fetched with range requests and kept in a small LRU cache.
+        When reads are sequential, the next `read_ahead` blocks are fetched in the background, so streaming
+        through a blob overlaps its round trips. Every request is conditioned on the ETag read when the
+        blob is opened, so a blob modified while open fails with ResourceModifiedError rather than
+        returning a mix of versions. A blob with a Content-Encoding (e.g. gzip) is read decoded, which can
+        only be done from its start, so it is downloaded whole when opened and read from memory.
+
+        Args:
+            blob_client (BlobClient): Client of the blob to read.
+            block_size (int): Size in bytes of each range request.
+            cached_blocks (int): Maximum number of blocks (incl. read-ahead) to keep in memory.
+            read_ahead (int): Number of blocks to prefetch past a sequential read (0 to disable).
+        """
+        super().__init__()
+        if block_size <= 0:
+            raise ValueError(f"block_size must be positive (got {block_size})")
+        self.blob_client = blob_client
+        self.name = blob_client.blob_name
+        self.block_size = block_size
+        self.cached_blocks = max(cached_blocks, read_ahead + 1)
+        self.read_ahead = read_ahead
+
+        self.properties = blob_client.get_blob_properties()
+        self.size = self.properties.size
+        self._decoded = None
+        if self.properties.content_settings.content_encoding:
+            self._decoded = download_decoded(blob_client, self.properties).readall()
+            self.size = len(self._decoded)
+        self._position = 0
+        self._last_block = None
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=read_ahead) if read_ahead > 0 else None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def _fetch_block(self, index: int) -> bytes:
+        """(Internal Helper) Range request for one block of the blob"""
+        offset = index * self.block_size
+        length = min(self.block_size, self.size - offset)
+        if self._decoded is not None:
+            return self._decoded[offset:offset + length]
+        return self.blob_client.download_blob(offset=offset, length=length,
+                                              etag=self.properties.etag, match_condition=MatchConditions.IfNotModified,
+                                              max_concurrency=1, decompress=False).readall()
+
+    def _block(self, index: int) -> bytes:
+        """(Internal Helper) One block, from the cache (possibly still being prefetched) or fetched now"""
+        with self._lock:
+            entry = self._blocks.get(index)
+            if entry is not None:
+                self._blocks.move_to_end(index)
+
+        if entry is None:
+            entry = self._fetch_block(index)
+            self._cache(index, entry)
+        elif isinstance(entry, Future):
+            entry = entry.result()
+            self._cache(index, entry)
+
+        sequential = self._last_block is not None and index == self._last_block + 1
+        self._last_block = index
+        if sequential and self._executor is not None:
+            self._prefetch(index + 1)
+        return entry
+
+    def _cache(self, index: int, entry) -> None:
+        with self._lock:
+            self._blocks[index] = entry
+            self._blocks.move_to_end(index)
+            while len(self._blocks) > self.cached_blocks:
+                self._blocks.popitem(last=False)
+
+    def _prefetch(self, start: int) -> None:
+        """(Internal Helper) Start fetching the read-ahead blocks that are not already cached or in flight"""
+        last = (self.size - 1) // self.block_size
+        for index in range(start, min(start + self.read_ahead, last + 1)):
+            with self._lock:
+                if index in self._blocks:
+                    continue
+            self._cache(index, self._executor.submit(self._fetch_block, index))
+
+    def readinto(self, buffer) -> int:
+        self._checkClosed()
+        view = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(view) and self._position < self.size:
+            index, start = divmod(self._position, self.block_size)
+            block = self._block(index)
+            n = min(len(block) - start, len(view) - written)
+            view[written:written + n] = block[start:start + n]
+            written += n
+            self._position += n
+        return written
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self._checkClosed()
+        if size is None or size < 0:
+            size = max(self.size - self._position, 0)
+        buffer = bytearray(min(size, max(self.size - self._position, 0)))
+        n = self.readinto(buffer)
+        return bytes(buffer[:n])
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._executor is not None:
+                # Don't wait on read-ahead nobody will read (cancel_futures is only available from Python 3.9)
+                if sys.version_info >= (3, 9):
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                else:
+                    self._executor.shutdown(wait=False)
+            self._blocks.clear()
+            self._decoded = None
+        super().close()
+
@@ -0,0 +1,308 @@
+"""Retries with backoff, per-account rate limiting and adaptive concurrency for the Blob pipeline."""
+import email.utils
+import hashlib
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar, Union
+
+from azure.core import MatchConditions
+from azure.core.exceptions import AzureError, ResourceExistsError, ServiceResponseError
+from azure.storage.blob import BlobClient, ExponentialRetry
+from azure.storage.blob._shared.authentication import AzureSigningError
+from azure.storage.blob._shared.policies import is_checksum_retry, is_retry, retry_hook
+
+T = TypeVar("T")
+
+DEFAULT_RETRY_TOTAL = 6
+DEFAULT_INITIAL_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+# Seconds after a concurrency decrease during which further throttling is attributed to the same event
+_DECREASE_COOLDOWN = 1.0
+# Pipelines run on the calling thread, so this records (per thread) that an attempt which the service may have
+# applied was retried; the SDK drops per-call response hooks after the first attempt, so they can't be used instead
+_retries = threading.local()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Blocking token bucket: on average `rate` acquisitions per second, with bursts of up to `burst`.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (Optional[float]): Bucket capacity (default is one second's worth of tokens).
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive (got {rate})")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        """Concurrency limit that grows additively while requests succeed and halves when the service throttles.
+
+        The limit grows by about one slot per `limit` successful requests (one "round" of requests), up to
+        max_limit, and is halved (at most once per second, however many in-flight requests report the same
+        burst of throttling) down to min_limit.
+
+        Args:
+            max_limit (int): Highest number of requests allowed in flight (and the starting limit).
+            min_limit (int): Lowest number the limit is reduced to.
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"Need 1 <= min_limit <= max_limit (got {min_limit}, {max_limit})")
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= _DECREASE_COOLDOWN:
+                    self._limit = max(float(self.min_limit), self._limit / 2)
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class AccountThrottle:
+    def __init__(self,
+                 max_requests_per_second: Optional[float] = None,
+                 burst: Optional[float] = None,
+                 max_in_flight: Optional[int] = None,
+                 min_in_flight: int = 1):
+        """Client-side limits shared by every request to one storage account, plus counters of what happened.
+
+        Both limits are optional; with neither, the throttle only counts requests, retries and throttling.
+
+        Args:
+            max_requests_per_second (Optional[float]): Token bucket rate for requests (incl. retries).
+            burst (Optional[float]): Token bucket capacity (default is one second's worth).
+            max_in_flight (Optional[int]): Upper bound of the adaptive (AIMD) limit on concurrent requests.
+            min_in_flight (int): Lower bound the adaptive limit backs off to under throttling.
+        """
+        self.bucket = TokenBucket(max_requests_per_second, burst) if max_requests_per_second else None
+        self.limiter = AIMDLimiter(max_in_flight, min_in_flight) if max_in_flight else None
+        self._stats = {"requests": 0, "retries": 0, "throttled": 0}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait for a token and a concurrency slot before sending a request"""
+        if self.bucket is not None:
+            self.bucket.acquire()
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def release(self, throttled: bool = False) -> None:
+        if self.limiter is not None:
+            self.limiter.release(throttled=throttled)
+        self._count(requests=1, throttled=int(throttled))
+
+    def _count(self, **increments) -> None:
+        with self._lock:
+            for k, v in increments.items():
+                self._stats[k] += v
+
+    def stats(self) -> Dict[str, int]:
+        """Requests sent, retries made, responses that were throttling (429/503), and the current concurrency limit"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["in_flight_limit"] = self.limiter.limit if self.limiter is not None else None
+        return stats
+
+
+def retry_count() -> int:
+    """Number of retries made by ThrottledRetryPolicy on this thread so far"""
+    return getattr(_retries, "count", 0)
+
+
+def _retry_after(headers) -> Optional[float]:
+    """(Internal Helper) Seconds the service asked us to wait, from x-ms-retry-after-ms / Retry-After"""
+    for name in ("x-ms-retry-after-ms", "retry-after-ms"):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - time.time())
+    return None
+
+
+class ThrottledRetryPolicy(ExponentialRetry):
+    def __init__(self,
+                 throttle: Optional[AccountThrottle] = None,
+                 retry_total: int = DEFAULT_RETRY_TOTAL,
+                 initial_backoff: float = DEFAULT_INITIAL_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 **kwargs):
+        """Retry policy for the Blob pipeline that cooperates with an AccountThrottle.
+
+        Every attempt waits on the throttle's rate limit and concurrency limit. What is retried is decided
+        as by the SDK's own policy (connection errors, 408 and retryable 5xx responses, copy source errors,
+        404s from the secondary location and validate_content checksum mismatches), plus 429s, and retry_hook
+        callbacks are called as usual. Retries wait for the delay the service asks for (Retry-After), or else
+        an exponential backoff with jitter capped at max_backoff. Throttling responses (429/503) also shrink
+        the throttle's adaptive concurrency limit.
+
+        Args:
+            throttle (Optional[AccountThrottle]): Limits and counters to share (default is a counting-only throttle).
+            retry_total (int): Maximum number of retries of one request.
+            initial_backoff (float): Backoff in seconds before the first retry (doubling after each one).
+            max_backoff (float): Longest backoff in seconds, including any Retry-After.
+            **kwargs: Passed to ExponentialRetry (e.g. retry_connect, retry_read, retry_status).
+        """
+        kwargs.setdefault("retry_status", retry_total)
+        super().__init__(initial_backoff=initial_backoff, retry_total=retry_total, **kwargs)
+        self.throttle = throttle if throttle is not None else AccountThrottle()
+        self.max_backoff = max_backoff
+
+    def get_backoff_time(self, settings: dict) -> float:
+        requested = settings.get("retry_after")
+        if requested is not None:
+            return min(requested, self.max_backoff)
+        backoff = min(self.max_backoff, self.initial_backoff * 2 ** (settings["count"] - 1))
+        # "Equal jitter": never retry immediately, but spread retries from concurrent callers apart
+        return random.uniform(backoff / 2, backoff)
+
+    def _retry(self, settings: dict, request, response=None, error=None) -> None:
+        """(Internal Helper) Count a retry, call the caller's retry_hook, then wait as get_backoff_time() says"""
+        self.throttle._count(retries=1)
+        _retries.count = retry_count() + 1
+        retry_hook(settings, request=request.http_request, response=response, error=error)
+        settings["retry_after"] = _retry_after(response.headers) if response is not None else None
+        self.sleep(settings, request.context.transport)
+
+    def send(self, request):
+        settings = self.configure_retries(request)
+        while True:
+            self.throttle.acquire()
+            try:
+                response = self.next.send(request)
+            except AzureError as err:
+                self.throttle.release()
+                if isinstance(err, AzureSigningError) or not self.increment(settings, request=request.http_request, error=err):
+                    raise
+                if isinstance(err, ServiceResponseError):
+                    # The request went out, so the service may have applied it
+                    _retries.ambiguous = True
+                self._retry(settings, request, error=err)
+                continue
+            except BaseException:
+                self.throttle.release()
+                raise
+
+            status = response.http_response.status_code
+            throttled = status in (429, 503)
+            self.throttle.release(throttled=throttled)
+            retryable = status == 429 or is_retry(response, settings["mode"]) or is_checksum_retry(response)
+            if retryable and self.increment(settings, request=request.http_request, response=response.http_response):
+                if not throttled and status >= 500:
+                    _retries.ambiguous = True
+                self._retry(settings, request, response=response.http_response)
+                continue
+            break
+
+        if settings["history"]:
+            response.context["history"] = settings["history"]
+        response.http_response.location_mode = settings["mode"]
+        return response
+
+
+def create_idempotently(create: Callable[..., T], confirm: Callable[[], Optional[dict]]) -> T:
+    """Run a create-if-missing call, accepting a conflict caused by its own earlier attempt.
+
+    If an attempt is applied by the service but its response is lost (or is a 5xx), the retry of a
+    create-if-missing request fails with "already exists" although the blob is the one we wrote.
+    When that happens after such an ambiguous retry, confirm() is asked whether the existing blob is
+    ours (returning its etag/last_modified if so), and the conflict is swallowed.
+
+    Only retries made by a ThrottledRetryPolicy on this thread are detected; otherwise conflicts are raised as usual.
+
+    Args:
+        create (Callable[[], T]): Makes the request.
+        confirm (Callable[[], Optional[dict]]): Checks the existing blob, returning a response dict if it is ours.
+    """
+    _retries.ambiguous = False
+    try:
+        return create()
+    except ResourceExistsError:
+        if getattr(_retries, "ambiguous", False):
+            response = confirm()
+            if response is not None:
+                return response
+        raise
+
+
+def confirm_content_md5(blob_client: BlobClient, digest: Union[bytes, Callable[[], bytes]]) -> Optional[dict]:
+    """confirm() for create_idempotently(): the existing blob is ours if it holds the content we uploaded.
+
+    digest may be a callable, so that the upload's MD5 is only computed once a retry has made the outcome
+    ambiguous. It is compared with the blob's Content-MD5, or with the MD5 of its content when it has none
+    (e.g. uploads the SDK split into blocks without one).
+    """
+    props = blob_client.get_blob_properties()
+    if callable(digest):
+        digest = digest()
+    md5 = props.content_settings.content_md5
+    if md5:
+        remote = bytes(md5)
+    else:
+        hasher = hashlib.md5()
+        for chunk in blob_client.download_blob(etag=props.etag, match_condition=MatchConditions.IfNotModified).chunks():
+            hasher.update(chunk)
+        remote = hasher.digest()
+    if remote == digest:
+        return {"etag": props.etag, "last_modified": props.last_modified}
+    return None
+
+
+def confirm_block_list(blob_client: BlobClient, block_ids) -> Optional[dict]:
+    """confirm() for create_idempotently(): the existing blob is ours if its committed blocks are the ones we committed"""
+    committed, _ = blob_client.get_block_list("committed")
+    if [b.id for b in committed] == list(block_ids):
+        props = blob_client.get_blob_properties()
+        return {"etag": props.etag, "last_modified": props.last_modified}
+    return None
@@ -0,0 +1,137 @@
+"""Blob URL signing with reusable signing material and a token cache."""
+import datetime as dt
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Tuple, Union
+from urllib.parse import quote
+
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+DEFAULT_EXPIRY_BUCKET_SECONDS = 300
+DEFAULT_TOKEN_CACHE_SIZE = 65536
+# Back-date token start times to tolerate clock skew between this host and the service
+_CLOCK_SKEW = dt.timedelta(minutes=5)
+# Refresh a user delegation key this long before it expires
+_DELEGATION_KEY_MARGIN = dt.timedelta(minutes=5)
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _parse_utc(timestamp: str) -> dt.datetime:
+    """Parse the ISO 8601 UTC timestamps (e.g. '2024-01-01T00:00:00Z') returned with user delegation keys"""
+    return dt.datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=dt.timezone.utc)
+
+
+class BlobUrlSigner:
+    def __init__(self,
+                 container_client,
+                 user_delegation: bool = False,
+                 delegation_key_hours: float = 24,
+                 expiry_bucket_seconds: int = DEFAULT_EXPIRY_BUCKET_SECONDS,
+                 cache_size: int = DEFAULT_TOKEN_CACHE_SIZE):
+        """Builds blob URLs (optionally with SAS tokens) for one container, reusing signing material across calls.
+
+        Token expiries are rounded up to the end of an `expiry_bucket_seconds` window, so repeated requests
+        for the same (blob, permission, expiry) within a window return the same cached token. Every token is
+        still valid for at least the requested number of hours.
+
+        Args:
+            container_client: Sync ContainerClient (or an async one when user_delegation is False).
+            user_delegation (bool): Sign with a user delegation key (Azure AD credentials) instead of the account key.
+            delegation_key_hours (float): Lifetime of each fetched user delegation key.
+            expiry_bucket_seconds (int): Width of the window within which identical requests share a token.
+            cache_size (int): Maximum number of tokens to keep in the LRU cache.
+        """
+        self.container_name = container_client.container_name
+        self.account_name = container_client.account_name
+        self.base_url = container_client.url.split("?", 1)[0].rstrip("/")
+        self.user_delegation = user_delegation
+        self.delegation_key_hours = delegation_key_hours
+        self.expiry_bucket_seconds = expiry_bucket_seconds
+        self.cache_size = cache_size
+
+        self._container_client = container_client
+        self._account_key = None if user_delegation else getattr(container_client.credential, "account_key", None)
+        self._delegation_key = None
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def blob_url(self, blob_name: str) -> str:
+        """Unsigned url of a blob in the container"""
+        return f"{self.base_url}/{quote(blob_name, safe='~/')}"
+
+    def _expiry_window(self, expiry_hours: float, now: dt.datetime) -> Tuple[dt.datetime, dt.datetime]:
+        """(Internal Helper) (start, expiry) shared by every request made in the same bucket as `now`"""
+        bucket = self.expiry_bucket_seconds
+        bucket_start = dt.datetime.fromtimestamp(int(now.timestamp()) // bucket * bucket, tz=dt.timezone.utc)
+        expiry = bucket_start + dt.timedelta(seconds=bucket, hours=expiry_hours)
+        return bucket_start - _CLOCK_SKEW, expiry
+
+    def _signing_material(self, now: dt.datetime) -> dict:
+        """(Internal Helper) Account key, or a user delegation key fetched once and reused until near expiry"""
+        if not self.user_delegation:
+            if not self._account_key:
+                raise ValueError(f"Cannot sign urls for container '{self.container_name}' without an account key "
+                                 f"(connect with an account key connection string, or use user_delegation=True).")
+            return {"account_key": self._account_key}
+
+        key = self._delegation_key
+        if key is None or _parse_utc(key.signed_expiry) - _DELEGATION_KEY_MARGIN <= now:
+            service_client = self._container_client._get_blob_service_client()
+            key = service_client.get_user_delegation_key(key_start_time=now - _CLOCK_SKEW,
+                                                         key_expiry_time=now + dt.timedelta(hours=self.delegation_key_hours))
+            self._delegation_key = key
+            # Tokens signed with the previous key stop working when it expires
+            self._tokens.clear()
+        return {"user_delegation_key": key}
+
+    def sas_token(self, blob_name: str, permission: Union[str, BlobSasPermissions] = "r", expiry_hours: float = 1) -> str:
+        """SAS token for one blob (from the cache when an identical token was issued in the current window)"""
+        return self.sas_tokens([blob_name], permission=permission, expiry_hours=expiry_hours)[0]
+
+    def sas_tokens(self, blob_names: Iterable[str], permission: Union[str, BlobSasPermissions] = "r", expiry_hours: float = 1) -> List[str]:
+        """SAS tokens for many blobs, resolving the signing window and key once for the whole batch"""
+        permission = str(permission)
+        now = _utcnow()
+        start, expiry = self._expiry_window(expiry_hours, now)
+
+        tokens = []
+        with self._lock:
+            material = self._signing_material(now)
+            if "user_delegation_key" in material:
+                # A token cannot outlive the key that signed it
+                expiry = min(expiry, _parse_utc(material["user_delegation_key"].signed_expiry))
+            for blob_name in blob_names:
+                cache_key = (blob_name, permission, expiry)
+                token = self._tokens.get(cache_key)
+                if token is None:
+                    token = generate_blob_sas(account_name=self.account_name,
+                                              container_name=self.container_name,
+                                              blob_name=blob_name,
+                                              permission=permission,
+                                              expiry=expiry,
+                                              start=start,
+                                              protocol="https",
+                                              **material)
+                    self._tokens[cache_key] = token
+                    if len(self._tokens) > self.cache_size:
+                        self._tokens.popitem(last=False)
+                else:
+                    self._tokens.move_to_end(cache_key)
+                tokens.append(token)
+        return tokens
+
+    def blob_urls(self,
+                  blob_names: Iterable[str],
+                  include_sas: bool = True,
+                  permission: Union[str, BlobSasPermissions] = "r",
+                  expiry_hours: float = 1) -> List[str]:
+        """Urls for many blobs, each with a SAS token appended if include_sas"""
+        blob_names = list(blob_names)
+        urls = [self.blob_url(n) for n in blob_names]
+        if not include_sas:
+            return urls
+        tokens = self.sas_tokens(blob_names, permission=permission, expiry_hours=expiry_hours)
+        return [f"{url}?{token}" for url, token in zip(urls, tokens)]
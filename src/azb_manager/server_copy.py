@@ -0,0 +1,131 @@
+"""Server-side blob copies (and moves), so blob content never passes through this host."""
+import random
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import BlobClient, ContainerClient
+
+from .batch import BatchSummary, ItemResults, _error_message, run_bulk
+from .sas import BlobUrlSigner
+
+DEFAULT_COPY_CONCURRENCY = 16
+# The source SAS must stay valid while the service reads from it, which can take a while for large async copies
+DEFAULT_SOURCE_SAS_HOURS = 24
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_MAX_POLL_INTERVAL = 15.0
+
+
+class BlobCopyError(Exception):
+    """Raised when a server-side copy fails, is aborted, or does not finish in time."""
+
+
+def copy_blob(source_client: BlobClient,
+              source_url: str,
+              destination_client: BlobClient,
+              overwrite: bool = False,
+              move: bool = False,
+              timeout: Optional[float] = None,
+              poll_interval: float = DEFAULT_POLL_INTERVAL,
+              max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+              tags: Optional[Dict[str, str]] = None) -> dict:
+    """Copy one blob server-side with Copy Blob, waiting for the copy to finish.
+
+    Copies the service completes synchronously return straight away. Otherwise the destination's copy
+    status is polled, backing off exponentially (with jitter) from poll_interval up to max_poll_interval,
+    failing if the destination turns out to hold another copy started meanwhile.
+    With move, the source is deleted once the copy has succeeded, but only if it has not changed since
+    the copy started.
+
+    Args:
+        source_client (BlobClient): Client of the source blob (used for move).
+        source_url (str): Url the service can read the source from (e.g. with a SAS token).
+        destination_client (BlobClient): Client of the blob to create.
+        overwrite (bool): Whether to replace the destination if it already exists.
+        move (bool): Whether to delete the source after a successful copy.
+        timeout (Optional[float]): Seconds to wait for a pending copy before aborting it (None = no limit).
+        tags (Optional[Dict[str, str]]): Blob index tags to set on the copy (the source's tags are not copied).
+
+    Returns:
+        dict: The copy's id and final status ('copy_id', 'copy_status'), and the copy's 'etag' and 'last_modified'.
+    """
+    conditions = {}
+    if tags:
+        conditions['tags'] = tags
+    if not overwrite:
+        conditions['match_condition'] = MatchConditions.IfMissing
+    source_etag = None
+    if move:
+        # Pin the source version, so a write racing the move is neither copied half-way nor deleted
+        source_etag = source_client.get_blob_properties().etag
+        conditions.update(source_etag=source_etag, source_match_condition=MatchConditions.IfNotModified)
+
+    result = destination_client.start_copy_from_url(source_url, **conditions)
+    copy_id, status, description = result['copy_id'], result['copy_status'], None
+    etag, last_modified = result.get('etag'), result.get('last_modified')
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = poll_interval
+    while status == 'pending':
+        if deadline is not None and time.monotonic() >= deadline:
+            destination_client.abort_copy(copy_id)
+            raise BlobCopyError(f"Copy to '{destination_client.blob_name}' did not finish within {timeout}s (aborted).")
+        time.sleep(delay * random.uniform(0.5, 1.0))
+        delay = min(delay * 2, max_poll_interval)
+        props = destination_client.get_blob_properties()
+        if props.copy.id != copy_id:
+            # Another copy (or write) to the destination replaced ours; its outcome says nothing about this one
+            raise BlobCopyError(f"Copy {copy_id} to '{destination_client.blob_name}' was superseded "
+                                f"(the destination now reflects copy {props.copy.id}).")
+        status, description = props.copy.status, props.copy.status_description
+        etag, last_modified = props.etag, props.last_modified
+
+    if status != 'success':
+        raise BlobCopyError(f"Copy to '{destination_client.blob_name}' {status}: {description}")
+
+    if move:
+        source_client.delete_blob(etag=source_etag, match_condition=MatchConditions.IfNotModified)
+
+    return {'copy_id': copy_id, 'copy_status': status, 'etag': etag, 'last_modified': last_modified}
+
+
+def copy_many(source_container: ContainerClient,
+              source_signer: BlobUrlSigner,
+              destination_container: ContainerClient,
+              names: Iterable[str],
+              rename: Callable[[str], str],
+              overwrite: bool = False,
+              move: bool = False,
+              max_concurrency: int = DEFAULT_COPY_CONCURRENCY,
+              dry_run: bool = False,
+              timeout: Optional[float] = None,
+              sas_hours: float = DEFAULT_SOURCE_SAS_HOURS,
+              on_success: Optional[Callable[[str], None]] = None) -> BatchSummary:
+    """Copy (or move) many blobs server-side, max_concurrency at a time, with a per-blob result.
+
+    Args:
+        names (Iterable[str]): Source blob names (consumed lazily, e.g. straight from a listing).
+        rename (Callable[[str], str]): Maps a source blob name to its destination name.
+        sas_hours (float): Lifetime of the read SAS generated for each source blob.
+        Other args: See copy_blob().
+
+    Returns:
+        BatchSummary: Source blob names copied (or that would be, with dry_run), and an error for each that failed.
+    """
+    def send(chunk: List[str]) -> ItemResults:
+        results = []
+        for name in chunk:
+            try:
+                source_url = source_signer.blob_urls([name], include_sas=True, permission='r', expiry_hours=sas_hours)[0]
+                copy_blob(source_container.get_blob_client(name), source_url,
+                          destination_container.get_blob_client(rename(name)),
+                          overwrite=overwrite, move=move, timeout=timeout)
+                results.append((name, None))
+            except HttpResponseError as e:
+                results.append((name, _error_message(e)))
+            except BlobCopyError as e:
+                results.append((name, str(e)))
+        return results
+
+    return run_bulk(names, send, 1, max_concurrency, dry_run=dry_run, on_success=on_success)
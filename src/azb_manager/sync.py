@@ -0,0 +1,215 @@
+"""Concurrent directory <-> blob prefix synchronization."""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.storage.blob import BlobProperties, ContainerClient, ContentSettings
+from typing_extensions import TypedDict
+
+from .metrics import bind_operation
+from .transfer import DEFAULT_CHUNK_SIZE, download_to_file
+
+DEFAULT_SYNC_CONCURRENCY = 16
+_HASH_READ_SIZE = 1024 * 1024
+
+
+class SyncSummary(TypedDict):
+    """Aggregated outcome of a sync_up()/sync_down() run"""
+    transferred: List[str]
+    skipped: List[str]
+    failed: Dict[str, str]
+    bytes_transferred: int
+    seconds: float
+    files_per_second: float
+    mb_per_second: float
+
+
+def _file_md5(path: str) -> bytes:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+            md5.update(block)
+    return md5.digest()
+
+
+def _dir_prefix(prefix: str) -> str:
+    """Treat a prefix as a virtual directory, so 'logs' does not also match 'logs-archive/...'"""
+    return prefix.rstrip("/") + "/" if prefix else ""
+
+
+def _iter_local_files(local_dir: str) -> Iterator[Tuple[str, str]]:
+    """Yield (absolute path, path relative to local_dir) for every file under local_dir"""
+    for root, _, files in os.walk(local_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, local_dir)
+
+
+def _local_path(local_dir: str, rel_path: str) -> Optional[str]:
+    """(Internal Helper) Where a blob's relative name lands under local_dir, or None if it would land outside it
+    (e.g. a blob named '../x' or '/etc/x')"""
+    root = os.path.realpath(local_dir)
+    path = os.path.realpath(os.path.join(root, *rel_path.split("/")))
+    if path == root or os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def _remote_state(container_client: ContainerClient, prefix: str) -> Dict[str, BlobProperties]:
+    """One streaming listing of the prefix instead of a properties request per file"""
+    return {b.name: b for b in container_client.list_blobs(name_starts_with=prefix or None)}
+
+
+def _is_unchanged(local_size: int, local_mtime: float, props: BlobProperties, newer_side: str) -> Optional[bool]:
+    """Whether a local file and a blob hold the same content, by size and then mtime if the blob has no MD5.
+
+    None when that takes comparing the file's MD5 with the blob's, which is left to the transfer workers
+    (see _run_transfers()), so the scan reads no file content and each file is hashed once.
+    """
+    if props.size != local_size:
+        return False
+    if props.content_settings.content_md5:
+        return None
+    remote_mtime = props.last_modified.timestamp()
+    return remote_mtime >= local_mtime if newer_side == "remote" else local_mtime >= remote_mtime
+
+
+def _run_transfers(tasks: List[Tuple[str, int, Callable[[], bool]]], max_concurrency: int, summary: SyncSummary) -> None:
+    """(Internal Helper) Run (name, size, fn) tasks on a bounded pool, largest first, recording outcomes in summary.
+
+    fn() returns False when it finds the content already in place (e.g. by MD5), which is recorded as skipped.
+    Starting the largest transfers first keeps one long transfer from being left running alone at the end,
+    while the many small files fill the remaining workers and hide each other's round-trip latency.
+    """
+    lock = threading.Lock()
+
+    @bind_operation
+    def run(task):
+        name, size, fn = task
+        try:
+            transferred = fn()
+        except Exception as e:
+            with lock:
+                summary["failed"][name] = f"{type(e).__name__}: {e}"
+            return
+        with lock:
+            if not transferred:
+                summary["skipped"].append(name)
+                return
+            summary["transferred"].append(name)
+            summary["bytes_transferred"] += size
+
+    tasks = sorted(tasks, key=lambda t: t[1], reverse=True)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        list(executor.map(run, tasks))
+
+
+def _new_summary() -> SyncSummary:
+    return SyncSummary(transferred=[], skipped=[], failed={}, bytes_transferred=0,
+                       seconds=0.0, files_per_second=0.0, mb_per_second=0.0)
+
+
+def _finish_summary(summary: SyncSummary, started: float) -> SyncSummary:
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = elapsed
+    if elapsed > 0:
+        summary["files_per_second"] = len(summary["transferred"]) / elapsed
+        summary["mb_per_second"] = summary["bytes_transferred"] / (1024 * 1024) / elapsed
+    return summary
+
+
+def sync_up(container_client: ContainerClient,
+            local_dir: str,
+            prefix: str = "",
+            max_concurrency: int = DEFAULT_SYNC_CONCURRENCY) -> SyncSummary:
+    """Upload every file under local_dir to blobs under prefix, skipping those whose content is already there.
+
+    Uploaded blobs get the file's Content-MD5, so later syncs can compare by hash. Each file is hashed once,
+    by its transfer worker, both to compare it with the blob and as the Content-MD5 of its upload.
+    """
+    started = time.perf_counter()
+    summary = _new_summary()
+    prefix = _dir_prefix(prefix)
+    remote = _remote_state(container_client, prefix)
+
+    tasks = []
+    for path, rel_path in _iter_local_files(local_dir):
+        blob_name = prefix + rel_path.replace(os.sep, "/")
+        stat = os.stat(path)
+        props = remote.get(blob_name)
+        unchanged = _is_unchanged(stat.st_size, stat.st_mtime, props, newer_side="remote") if props is not None else False
+        if unchanged:
+            summary["skipped"].append(blob_name)
+            continue
+        remote_md5 = bytes(props.content_settings.content_md5) if unchanged is None else None
+
+        def upload(path=path, blob_name=blob_name, remote_md5=remote_md5):
+            digest = _file_md5(path)
+            if digest == remote_md5:
+                return False
+            content_settings = ContentSettings(content_md5=bytearray(digest))
+            with open(path, "rb") as f:
+                container_client.get_blob_client(blob_name).upload_blob(f, overwrite=True, content_settings=content_settings)
+            return True
+
+        tasks.append((blob_name, stat.st_size, upload))
+
+    _run_transfers(tasks, max_concurrency, summary)
+    return _finish_summary(summary, started)
+
+
+def sync_down(container_client: ContainerClient,
+              prefix: str,
+              local_dir: str,
+              max_concurrency: int = DEFAULT_SYNC_CONCURRENCY,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> SyncSummary:
+    """Download every blob under prefix into local_dir, skipping files whose content is already there.
+
+    Blobs that fit in one chunk are fetched with a single request conditioned on the listed ETag; larger
+    blobs go through the ranged download engine. Downloaded files take the blob's last-modified time.
+    Blobs whose names would place them outside local_dir (e.g. 'prefix/../../x') are not downloaded but
+    reported as failed.
+    """
+    started = time.perf_counter()
+    summary = _new_summary()
+    prefix = _dir_prefix(prefix)
+
+    tasks = []
+    for blob_name, props in _remote_state(container_client, prefix).items():
+        rel_path = blob_name[len(prefix):]
+        if not rel_path or rel_path.endswith("/"):
+            continue
+        path = _local_path(local_dir, rel_path)
+        if path is None:
+            summary["failed"][blob_name] = f"Blob name resolves to a path outside '{local_dir}'"
+            continue
+        unchanged = False
+        if os.path.exists(path):
+            stat = os.stat(path)
+            unchanged = _is_unchanged(stat.st_size, stat.st_mtime, props, newer_side="local")
+            if unchanged:
+                summary["skipped"].append(blob_name)
+                continue
+
+        def download(blob_name=blob_name, props=props, path=path, compare_md5=unchanged is None):
+            if compare_md5 and _file_md5(path) == bytes(props.content_settings.content_md5):
+                return False
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            blob_client = container_client.get_blob_client(blob_name)
+            if props.size > chunk_size:
+                download_to_file(blob_client, path, max_concurrency=1, chunk_size=chunk_size)
+            else:
+                with open(path, "wb") as f:
+                    blob_client.download_blob(etag=props.etag, match_condition=MatchConditions.IfNotModified).readinto(f)
+            mtime = props.last_modified.timestamp()
+            os.utime(path, (mtime, mtime))
+            return True
+
+        tasks.append((blob_name, props.size, download))
+
+    _run_transfers(tasks, max_concurrency, summary)
+    return _finish_summary(summary, started)
@@ -0,0 +1,470 @@
+"""Ranged, concurrent blob transfers with bounded memory."""
+import hashlib
+import json
+import mmap
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError
+from azure.storage.blob import BlobClient, BlobProperties, ContentSettings, StorageStreamDownloader
+
+from .metrics import bind_operation
+from .retry import confirm_block_list, create_idempotently
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+# Service limits on the blocks of one block blob
+MAX_BLOCK_COUNT = 50000
+MAX_BLOCK_SIZE = 4000 * 1024 * 1024
+_HASH_READ_SIZE = 1024 * 1024
+
+
+class BlobIntegrityError(Exception):
+    """Raised when downloaded content does not match the Content-MD5 stored on the blob."""
+
+
+def iter_ranges(size: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Split `size` bytes into (offset, length) ranges of at most `chunk_size` bytes"""
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive (got {chunk_size})")
+    for offset in range(0, size, chunk_size):
+        yield offset, min(chunk_size, size - offset)
+
+
+def _run_concurrently(fn: Callable, items, max_concurrency: int) -> None:
+    """(Internal Helper) Call fn on every item on a thread pool, cancelling what's left on the first failure"""
+    if max_concurrency <= 1:
+        for item in items:
+            fn(item)
+        return
+
+    fn = bind_operation(fn)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(fn, item) for item in items]
+        try:
+            for f in futures:
+                f.result()
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+
+def _first_range(blob_client: BlobClient,
+                 chunk_size: int,
+                 etag: Optional[str] = None,
+                 match_condition: Optional[MatchConditions] = None) -> Tuple[BlobProperties, bytes]:
+    """(Internal Helper) Fetch the blob's first range, whose response also carries its properties and full size.
+
+    This saves a separate properties request, so a blob of at most `chunk_size` bytes takes a single round trip.
+    The range is the blob's stored bytes, still encoded if it has a Content-Encoding (see download_decoded()).
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive (got {chunk_size})")
+    # The SDK forwards an unused etag keyword to the transport, so only pass a condition that is set
+    condition = {"etag": etag, "match_condition": match_condition} if match_condition is not None else {}
+    try:
+        downloader = blob_client.download_blob(offset=0, length=chunk_size, max_concurrency=1, decompress=False, **condition)
+    except HttpResponseError as e:
+        if e.status_code != 416:
+            raise
+        # The service rejects any range of an empty blob
+        return blob_client.get_blob_properties(**condition), b""
+    data = downloader.readall()
+    props = downloader.properties
+    # The downloader reports the size of the range; the blob's size follows the '/' of "bytes 0-N/size"
+    props.size = int(props.content_range.rsplit("/", 1)[1])
+    return props, data
+
+
+def download_decoded(blob_client: BlobClient, props: BlobProperties, max_concurrency: int = 1) -> StorageStreamDownloader:
+    """Download the version of a blob described by `props` whole, decoding its Content-Encoding (e.g. gzip).
+
+    The ranged downloads below use this for blobs with a Content-Encoding, so they return the same content as
+    the SDK's default download: encoded content can only be decoded from its start, not range by range.
+    """
+    return blob_client.download_blob(etag=props.etag, match_condition=MatchConditions.IfNotModified,
+                                     max_concurrency=max_concurrency)
+
+
+def _fetch_ranges(blob_client: BlobClient,
+                  props: BlobProperties,
+                  write_range: Callable[[int, bytes], None],
+                  max_concurrency: int,
+                  chunk_size: int,
+                  start: int = 0) -> None:
+    """(Internal Helper) Fetch every range of the blob from `start` on and hand it to write_range(offset, data).
+
+    Each range request is conditioned on the ETag of the first range, so a blob modified mid-transfer fails
+    with ResourceModifiedError rather than producing a torn download. At most `max_concurrency` ranges
+    are in flight (and so in memory) at once.
+    """
+    def fetch(rng):
+        offset, length = rng
+        data = blob_client.download_blob(offset=offset, length=length,
+                                         etag=props.etag, match_condition=MatchConditions.IfNotModified,
+                                         max_concurrency=1, decompress=False).readall()
+        write_range(offset, data)
+
+    # Queued ranges hold no data, so memory stays ~ max_concurrency * chunk_size however many are submitted
+    ranges = [(start + offset, length) for offset, length in iter_ranges(props.size - start, chunk_size)]
+    if len(ranges) <= 1:
+        max_concurrency = 1
+    _run_concurrently(fetch, ranges, max_concurrency)
+
+
+def _verify_md5(props: BlobProperties, digest: bytes, blob_name: str) -> None:
+    expected = props.content_settings.content_md5
+    if expected and bytes(expected) != digest:
+        raise BlobIntegrityError(f"Content-MD5 mismatch for blob '{blob_name}' (etag {props.etag})")
+
+
+def download_to_file(blob_client: BlobClient,
+                     path: str,
+                     max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     verify: bool = True,
+                     etag: Optional[str] = None,
+                     match_condition: Optional[MatchConditions] = None) -> BlobProperties:
+    """Download a blob straight to disk, writing each range at its offset in a preallocated file.
+
+    The file is written to `path + '.part'` and only moved into place once every range has landed
+    (and, if `verify` and the blob has a Content-MD5, once the content has been checked). A blob with a
+    Content-Encoding is instead written decoded, from one download (see download_decoded()); its Content-MD5
+    is of the encoded bytes, so it is not verified.
+
+    Args:
+        etag, match_condition: Condition on the first request (e.g. IfModified, which raises an
+            HttpResponseError with status 304 before anything is written if the blob is unchanged).
+
+    Returns:
+        BlobProperties: The properties (size, etag, ...) of the blob version that was downloaded.
+    """
+    props, first = _first_range(blob_client, chunk_size, etag=etag, match_condition=match_condition)
+    part_path = path + ".part"
+    write_lock = threading.Lock()
+
+    try:
+        with open(part_path, "wb") as file:
+            if props.content_settings.content_encoding:
+                download_decoded(blob_client, props, max_concurrency).readinto(file)
+                verify = False
+            else:
+                file.truncate(props.size)
+                fd = file.fileno()
+
+                def write_range(offset, data):
+                    if hasattr(os, "pwrite"):
+                        os.pwrite(fd, data, offset)
+                    else:
+                        with write_lock:
+                            file.seek(offset)
+                            file.write(data)
+
+                write_range(0, first)
+                _fetch_ranges(blob_client, props, write_range, max_concurrency, chunk_size, start=len(first))
+
+        if verify and props.content_settings.content_md5:
+            md5 = hashlib.md5()
+            with open(part_path, "rb") as file:
+                for block in iter(lambda: file.read(_HASH_READ_SIZE), b""):
+                    md5.update(block)
+            _verify_md5(props, md5.digest(), blob_client.blob_name)
+
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return props
+
+
+def download_to_buffer(blob_client: BlobClient,
+                       max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       verify: bool = True,
+                       buffer: Optional[bytearray] = None) -> memoryview:
+    """Download a blob into a preallocated buffer, filling each range in place.
+
+    A blob with a Content-Encoding is instead read decoded, from one download (see download_to_file()).
+
+    Args:
+        buffer (Optional[bytearray]): Writable buffer of at least the blob's size to fill. Allocated if None.
+
+    Returns:
+        memoryview: A view over exactly the bytes of the blob.
+    """
+    props, first = _first_range(blob_client, chunk_size)
+    decoded = None
+    size = props.size
+    if props.content_settings.content_encoding:
+        decoded = download_decoded(blob_client, props, max_concurrency).readall()
+        size = len(decoded)
+    if buffer is None:
+        buffer = bytearray(size)
+    view = memoryview(buffer)
+    if view.readonly or view.nbytes < size:
+        raise ValueError(f"Buffer must be writable and at least {size} bytes for blob '{blob_client.blob_name}'")
+    view = view.cast("B")[:size]
+    if decoded is not None:
+        view[:] = decoded
+        return view
+
+    def write_range(offset, data):
+        view[offset:offset + len(data)] = data
+
+    write_range(0, first)
+    _fetch_ranges(blob_client, props, write_range, max_concurrency, chunk_size, start=len(first))
+
+    if verify:
+        _verify_md5(props, hashlib.md5(view).digest(), blob_client.blob_name)
+
+    return view
+
+
+def map_readonly(file: BinaryIO) -> Optional[mmap.mmap]:
+    """Map an open file read-only into memory (None for an empty file, which cannot be mapped).
+
+    The mapping holds its own reference to the file, so it stays valid after the file is closed,
+    replaced or (on POSIX) deleted, and its pages are shared with every process mapping the same file.
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _json_line(line: str) -> Optional[dict]:
+    """(Internal Helper) Parse one checkpoint line, or None for a line cut short by an interrupted write"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+class _UploadCheckpoint:
+    """Append-only JSON Lines record of the blocks staged so far for one file -> blob upload.
+
+    The first line identifies the upload and each staged block appends one line, so recording a block
+    costs the same however many came before it.
+    """
+
+    def __init__(self, path: str, source: dict):
+        self.path = path
+        self.source = source  # identity of the upload: blob name, file size/mtime and block size
+        self.blocks = {}  # block id -> md5 hex of the staged data
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def load(cls, path: str, source: dict) -> "_UploadCheckpoint":
+        checkpoint = cls(path, source)
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+        # A checkpoint for a different file version or block layout is useless; start over
+        if lines and (_json_line(lines[0]) or {}).get("source") == source:
+            for line in lines[1:]:
+                entry = _json_line(line)
+                if entry is not None:
+                    checkpoint.blocks[entry["id"]] = entry["md5"]
+        return checkpoint
+
+    def _open(self) -> None:
+        """(Internal Helper) Rewrite the file with what is known so far (dropping any torn last line), then append to it"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"source": self.source}) + "\n")
+            f.writelines(json.dumps({"id": block_id, "md5": md5_hex}) + "\n" for block_id, md5_hex in self.blocks.items())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a")
+
+    def record(self, block_id: str, md5_hex: str) -> None:
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self.blocks[block_id] = md5_hex
+            self._file.write(json.dumps({"id": block_id, "md5": md5_hex}) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def upload_file_in_blocks(blob_client: BlobClient,
+                          file_path: str,
+                          block_size: int = DEFAULT_BLOCK_SIZE,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                          overwrite: bool = False,
+                          checkpoint_path: Optional[str] = None,
+                          content_settings: Optional[ContentSettings] = None,
+                          tags: Optional[Dict[str, str]] = None) -> dict:
+    """Upload a file as concurrently staged blocks, resuming an interrupted upload where it left off.
+
+    Each staged block is recorded (id and MD5) in a small JSON Lines checkpoint. On a later call for the same
+    file, blocks that the service still holds as uncommitted and whose local bytes still match the
+    checkpoint are skipped, so only the missing blocks are re-sent before the block list is committed.
+
+    Args:
+        block_size (int): Size in bytes of each staged block (at most 4000 MiB, and large enough for the
+            file to fit in 50,000 blocks; checked before anything is staged).
+        max_concurrency (int): Number of blocks to stage in parallel.
+        overwrite (bool): Whether to replace the blob if it already exists.
+        checkpoint_path (Optional[str]): Where to keep the checkpoint (default is next to the file).
+        tags (Optional[Dict[str, str]]): Blob index tags to set when the block list is committed.
+
+    Returns:
+        dict: Blob-updated properties (etag, last_modified) from committing the block list.
+    """
+    stat = os.stat(file_path)
+    _check_block_layout(stat.st_size, block_size, file_path)
+    if not overwrite and blob_client.exists():
+        raise ResourceExistsError(f"Blob '{blob_client.blob_name}' already exists (pass overwrite=True to replace it).")
+
+    source = {"blob": blob_client.blob_name, "size": stat.st_size, "mtime": stat.st_mtime, "block_size": block_size}
+    if checkpoint_path is None:
+        checkpoint_path = file_path + ".upload-checkpoint.jsonl"
+    checkpoint = _UploadCheckpoint.load(checkpoint_path, source)
+
+    # Block ids must all be the same length within a blob; the checkpoint identity keeps them stable across resumes
+    session = hashlib.md5(json.dumps(source, sort_keys=True).encode()).hexdigest()[:16]
+    ranges = list(iter_ranges(stat.st_size, block_size))
+    block_ids = [f"{session}-{i:06d}" for i in range(len(ranges))]
+
+    already_staged = set()
+    if checkpoint.blocks:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+        already_staged = {b.id for b in uncommitted} & set(checkpoint.blocks)
+
+    read_lock = threading.Lock()
+    with open(file_path, "rb") as file:
+        fd = file.fileno()
+
+        def read_range(offset, length):
+            if hasattr(os, "pread"):
+                return os.pread(fd, length, offset)
+            with read_lock:
+                file.seek(offset)
+                return file.read(length)
+
+        def stage(i):
+            offset, length = ranges[i]
+            data = read_range(offset, length)
+            md5_hex = hashlib.md5(data).hexdigest()
+            if block_ids[i] in already_staged and checkpoint.blocks.get(block_ids[i]) == md5_hex:
+                return
+            blob_client.stage_block(block_ids[i], data, length=length)
+            checkpoint.record(block_ids[i], md5_hex)
+
+        try:
+            _run_concurrently(stage, range(len(ranges)), max_concurrency)
+        finally:
+            checkpoint.close()
+
+    response = _commit(blob_client, block_ids, content_settings, overwrite, tags=tags)
+    checkpoint.remove()
+    return response
+
+
+def upload_chunks_in_blocks(blob_client: BlobClient,
+                            chunks: Iterable[bytes],
+                            max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                            overwrite: bool = False,
+                            content_settings: Optional[ContentSettings] = None) -> dict:
+    """Upload a stream of chunks as concurrently staged blocks, one block per chunk.
+
+    The stream is consumed only as fast as blocks are staged: at most `max_concurrency` chunks are held
+    in memory at once. The MD5 of the whole stream is computed on the way through and set as the blob's
+    Content-MD5 when the block list is committed.
+
+    Args:
+        chunks (Iterable[bytes]): Block-sized chunks of the blob's content (see encoding.rechunk()).
+        max_concurrency (int): Number of blocks to stage in parallel.
+        overwrite (bool): Whether to replace the blob if it already exists.
+        content_settings (Optional[ContentSettings]): Content type/encoding etc. to set on the blob.
+
+    Returns:
+        dict: Blob-updated properties (etag, last_modified) from committing the block list.
+    """
+    if not overwrite and blob_client.exists():
+        raise ResourceExistsError(f"Blob '{blob_client.blob_name}' already exists (pass overwrite=True to replace it).")
+
+    session = uuid.uuid4().hex[:16]
+    block_ids = []
+    md5 = hashlib.md5()
+    slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    @bind_operation
+    def stage(block_id, data):
+        try:
+            blob_client.stage_block(block_id, data, length=len(data))
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = []
+        try:
+            for i, chunk in enumerate(chunks):
+                if i == MAX_BLOCK_COUNT:
+                    raise ValueError(f"Stream for blob '{blob_client.blob_name}' has more than {MAX_BLOCK_COUNT} chunks, "
+                                     f"the service's limit of blocks per blob (use larger chunks).")
+                md5.update(chunk)
+                block_id = f"{session}-{i:06d}"
+                block_ids.append(block_id)
+                # Wait for a free worker before pulling more of the stream into memory
+                slots.acquire()
+                futures.append(executor.submit(stage, block_id, chunk))
+                # Surface a failed block early instead of encoding the rest of the stream
+                while futures and futures[0].done():
+                    futures.pop(0).result()
+            for f in futures:
+                f.result()
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    content_settings = content_settings or ContentSettings()
+    content_settings.content_md5 = bytearray(md5.digest())
+    return _commit(blob_client, block_ids, content_settings, overwrite)
+
+
+def _check_block_layout(size: int, block_size: int, file_path: str) -> None:
+    """(Internal Helper) Fail before staging anything if the file cannot be committed as blocks of block_size"""
+    if not 0 < block_size <= MAX_BLOCK_SIZE:
+        raise ValueError(f"block_size must be between 1 and {MAX_BLOCK_SIZE} bytes (got {block_size})")
+    block_count = -(-size // block_size)
+    if block_count > MAX_BLOCK_COUNT:
+        raise ValueError(f"'{file_path}' would take {block_count} blocks of {block_size} bytes, more than the service's "
+                         f"limit of {MAX_BLOCK_COUNT} per blob (use a block_size of at least {-(-size // MAX_BLOCK_COUNT)}).")
+
+
+def _commit(blob_client: BlobClient,
+            block_ids,
+            content_settings: Optional[ContentSettings],
+            overwrite: bool,
+            tags: Optional[Dict[str, str]] = None) -> dict:
+    """(Internal Helper) Commit the block list, only if the blob does not exist yet unless overwrite"""
+    if overwrite:
+        return blob_client.commit_block_list(block_ids, content_settings=content_settings, tags=tags)
+    return create_idempotently(lambda: blob_client.commit_block_list(block_ids,
+                                                                     content_settings=content_settings,
+                                                                     tags=tags,
+                                                                     match_condition=MatchConditions.IfMissing),
+                               lambda: confirm_block_list(blob_client, block_ids))
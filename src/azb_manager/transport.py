@@ -0,0 +1,41 @@
+"""HTTP transport shared by every client derived from one storage account."""
+from azure.core.pipeline.transport import RequestsTransport
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_CONNECTION_TIMEOUT = 20
+DEFAULT_READ_TIMEOUT = 60
+
+
+class PooledRequestsTransport(RequestsTransport):
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, **kwargs):
+        """Requests transport whose keep-alive connection pool holds `pool_size` connections per host.
+
+        The default requests pool keeps only 10 connections per host, so under higher concurrency
+        connections are discarded and re-opened (a new TLS handshake each time) instead of reused.
+
+        Args:
+            pool_size (int): Maximum number of kept-alive connections per host.
+            **kwargs: Passed to RequestsTransport (e.g. connection_timeout, read_timeout).
+        """
+        self.pool_size = pool_size
+        super().__init__(**kwargs)
+
+    def _init_session(self, session) -> None:
+        super()._init_session(session)
+        for adapter in set(session.adapters.values()):
+            adapter.init_poolmanager(self.pool_size, self.pool_size)
+
+
+def build_transport(pool_size: int = DEFAULT_POOL_SIZE,
+                    connection_timeout: float = DEFAULT_CONNECTION_TIMEOUT,
+                    read_timeout: float = DEFAULT_READ_TIMEOUT) -> PooledRequestsTransport:
+    """Build a transport to share across the clients of a storage account.
+
+    Args:
+        pool_size (int): Maximum number of kept-alive connections per host.
+        connection_timeout (float): Seconds to wait to establish a connection.
+        read_timeout (float): Seconds to wait between bytes of a response.
+    """
+    return PooledRequestsTransport(pool_size=pool_size,
+                                   connection_timeout=connection_timeout,
+                                   read_timeout=read_timeout)
@@ -0,0 +1,47 @@
+## Test that the asyncio managers run the same operations as their synchronous counterparts 
+import pytest 
+import asyncio 
+import logging 
+from .config import get_logger, set_logging_level, Config, TestData, DOWNLOAD_DIR
+
+logger = get_logger()
+set_logging_level(logging.DEBUG)
+
+from azb_manager.aio import AsyncAzureBlobContainerManager, AsyncAzureBlobStorageAccountManager
+
+
+@pytest.mark.parametrize("data,blob_name", 
+    [
+     (TestData.mock_json_dict, 'mock_async_json_dict.json'),
+     (TestData.mock_json_bin_str, 'mock_async_json_bin_str.json'), 
+     (TestData.mock_csv_str, 'mock_async_csv_str.csv'), 
+     ])
+def test_upload_download_blob(data, blob_name): 
+    """Test that an async upload can be listed and downloaded"""
+
+    async def run(): 
+        async with AsyncAzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                                  container_name=Config.AZURE_CONTAINER_NAME, 
+                                                  download_dir=DOWNLOAD_DIR) as azb_container: 
+            await azb_container.upload_blob(data=data, blob_name=blob_name, overwrite=True, encode_json=True)
+            assert await azb_container.has_blob(blob_name)
+            assert blob_name in [b async for b in azb_container.list_blobs(name_starts_with=blob_name)]
+            blob_bytes = await azb_container.download_blob_bytes(blob_name)
+            logger.debug(f"{azb_container.container_name}: {blob_name}={blob_bytes.read()}")
+
+    asyncio.run(run())
+
+
+def test_storage_account_shares_transport(): 
+    """Test that the account manager's container managers share one HTTP session"""
+
+    async def run(): 
+        async with AsyncAzureBlobStorageAccountManager(storage_account_name=Config.AZURE_STORAGE_ACCOUNT,
+                                                       connection_str=Config.AZURE_CONNECTION_STRING,
+                                                       containers=[Config.AZURE_CONTAINER_NAME], 
+                                                       download_dir=DOWNLOAD_DIR) as azb_storage_account: 
+            azb_container = getattr(azb_storage_account, Config.AZURE_CONTAINER_NAME)
+            assert azb_container.container_client._pipeline._transport._transport is \
+                azb_storage_account.blob_service_client._pipeline._transport
+
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+## Test rebuilding the blob name index while it is being read and written
+import os
+import pytest
+from .config import DOWNLOAD_DIR
+from azb_manager import blob_index
+from azb_manager.blob_index import BlobNameIndex
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def index(request, monkeypatch):
+    if request.param == 'memory':
+        index = BlobNameIndex(ttl=None)
+    else:
+        path = os.path.join(DOWNLOAD_DIR, 'mock_index.db')
+        if os.path.exists(path):
+            os.remove(path)
+        # Small batches, so lookups run between them
+        monkeypatch.setattr(blob_index, '_REBUILD_BATCH', 2)
+        index = BlobNameIndex(ttl=None, path=path)
+    index.rebuild(['old.json', 'kept.json'])
+    yield index
+    index.close()
+
+
+def test_rebuild_keeps_concurrent_writes(index):
+    """Test that lookups see the old contents during a rebuild, and writes made meanwhile survive it"""
+    def listing():
+        yield 'kept.json'
+        yield 'deleted.json'
+        # Lookups answer from the old contents mid-rebuild
+        assert 'old.json' in index and 'listed.json' not in index
+        index.add('uploaded.json')
+        index.add_many(['synced.json'])
+        index.discard('deleted.json')
+        yield 'listed.json'
+        yield 'another.json'
+
+    assert index.rebuild(listing()) == 5
+    assert index.contains_many(['old.json', 'kept.json', 'deleted.json', 'listed.json', 'another.json', 'uploaded.json', 'synced.json']) == {
+        'old.json': False, 'kept.json': True, 'deleted.json': False, 'listed.json': True, 'another.json': True,
+        'uploaded.json': True, 'synced.json': True}
+    assert not index.is_stale()
+
+    # Writes after the rebuild are not replayed into the next one
+    index.add('later.json')
+    index.rebuild([])
+    assert len(index) == 0
+
+
+def test_rebuild_invalidated_midway(index):
+    """Test that an index invalidated during a rebuild stays stale"""
+    def listing():
+        yield 'listed.json'
+        index.invalidate()
+
+    index.rebuild(listing())
+    assert 'listed.json' in index and index.is_stale()
@@ -0,0 +1,58 @@
+## Test how change feed events are turned into changes, against synthetic event pages
+import os
+import pytest
+from .config import DOWNLOAD_DIR
+from azb_manager.changes import _SnapshotStore, _change, _diff_feed
+
+CONTAINER = 'mockcontainer'
+
+
+def _event(name, event_type, event_time, etag=None, size=None, container=CONTAINER):
+    return {'subject': f'/blobServices/default/containers/{container}/blobs/{name}', 'eventType': event_type,
+            'eventTime': event_time, 'data': {'etag': etag, 'contentLength': size}}
+
+
+@pytest.fixture
+def store():
+    path = os.path.join(DOWNLOAD_DIR, 'mock_feed.db')
+    if os.path.exists(path):
+        os.remove(path)
+    store = _SnapshotStore(path)
+    # The snapshot as a listing left it, at 12:00
+    store.put(_change('created', 'listed.json', '"0x1"', 10, '2024-05-01T12:00:00Z'))
+    store.commit(1)
+    yield store
+    store.close()
+
+
+def test_diff_feed(store):
+    """Test that events are diffed against the snapshot, which is updated as they are consumed"""
+    pages = [
+        [_event('new.json', 'BlobCreated', '2024-05-01T12:01:00.1234567Z', '"0x2"', 5),
+         _event('listed.json', 'BlobCreated', '2024-05-01T12:02:00Z', '"0x3"', 20),
+         _event('other.json', 'BlobCreated', '2024-05-01T12:02:00Z', '"0x4"', 5, container='othercontainer')],
+        [_event('new.json', 'BlobDeleted', '2024-05-01T12:03:00Z')],
+        ]
+    changes = list(_diff_feed(pages, CONTAINER, store))
+
+    assert [(c['change'], c['name'], c['etag'], c['size']) for c in changes] == [
+        ('created', 'new.json', '"0x2"', 5), ('modified', 'listed.json', '"0x3"', 20), ('deleted', 'new.json', '"0x2"', 5)]
+    assert changes[0]['last_modified'].microsecond == 123456
+    assert [r[:3] for r in store.get_many(['listed.json', 'new.json']).values()] == [('listed.json', '"0x3"', 20)]
+
+
+@pytest.mark.parametrize('event', [
+    # From before the listing (the overlap read when switching to the feed)
+    _event('listed.json', 'BlobCreated', '2024-05-01T11:55:00Z', '"0x0"', 8),
+    _event('listed.json', 'BlobDeleted', '2024-05-01T11:59:00Z'),
+    # The version the snapshot already holds
+    _event('listed.json', 'BlobPropertiesUpdated', '2024-05-01T12:00:30Z', '"0x1"', 10),
+    # A blob created and deleted before the snapshot knew of it
+    _event('unknown.json', 'BlobDeleted', '2024-05-01T12:05:00Z'),
+    # Not a change to a blob's content
+    _event('listed.json', 'BlobTierChanged', '2024-05-01T12:05:00Z', '"0x5"', 10),
+    ])
+def test_diff_feed_skipped(store, event):
+    """Test that stale, duplicate and irrelevant events yield no change and leave the snapshot as it was"""
+    assert list(_diff_feed([[event]], CONTAINER, store)) == []
+    assert [r[:3] for r in store.get_many(['listed.json', 'unknown.json']).values()] == [('listed.json', '"0x1"', 10)]
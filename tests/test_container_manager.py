@@ -1,11 +1,26 @@
 import pytest 
 import json 
+import gzip
+from io import BytesIO
 import os
+import shutil
+import time
+import threading
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
 # import csv 
 # from .global_vars import *
 import logging 
 from .config import get_logger, set_logging_level,Config, TestData, DOWNLOAD_DIR
 from azb_manager.azb_manager import AzureBlobContainerManager
+from azb_manager.cache import BlobCache
+from azb_manager import sas, sync
+from azb_manager.sas import BlobUrlSigner
+from azb_manager.metrics import MetricsRecorder
+from azb_manager.transfer import MAX_BLOCK_COUNT, upload_file_in_blocks
+from azure.storage.blob import BlobClient, BlobProperties, ContentSettings, UserDelegationKey
+from azure.core.exceptions import HttpResponseError
 
 logger = get_logger()
 set_logging_level(logging.DEBUG)
@@ -71,3 +86,738 @@ def test_download_blob(blob_name):
         print(b)
         b_bytes = azb_container.download_blob_bytes(b)
         b_file = azb_container.download_blob_file(b)    
+
+
+def test_upload_blob_file_object_not_streamed():
+    """Test that file objects with encode_json are uploaded as they are, not streamed as records (they are iterators too)"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    azb_container.upload_blob(data=BytesIO(TestData.mock_csv_str.encode('utf-8')), blob_name='mock_file_object.csv', 
+                              overwrite=True, encode_json=True)
+    assert azb_container.download_blob_bytes('mock_file_object.csv').read() == TestData.mock_csv_str.encode('utf-8')
+
+
+@pytest.mark.parametrize('fmt,compression', [('json', None), ('ndjson', None), ('ndjson', 'gzip')])
+def test_upload_json_stream(fmt, compression, monkeypatch):
+    """Test that streamed records round-trip as a JSON array or JSON lines, optionally gzipped, across several blocks"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    records = [{'id': i, 'fruit': 'apple' if i % 2 else 'orange'} for i in range(200)]
+    
+    azb_container.upload_json_stream((r for r in records), f'mock_stream.{fmt}', fmt=fmt, compression=compression, 
+                                     overwrite=True, block_size=512)
+
+    downloader = azb_container.container_client.download_blob(f'mock_stream.{fmt}', decompress=False)
+    assert downloader.properties.content_settings.content_encoding == compression
+    content = downloader.readall()
+    if compression == 'gzip': 
+        content = gzip.decompress(content)
+    if fmt == 'json': 
+        assert json.loads(content) == records
+    else: 
+        assert [json.loads(line) for line in content.splitlines()] == records
+
+    # upload_blob() streams generators of records the same way, in blocks of the given size 
+    staged = []
+    stage_block = BlobClient.stage_block
+    def recording_stage_block(self, block_id, data, **kwargs): 
+        staged.append(len(data))
+        return stage_block(self, block_id, data, **kwargs)
+    monkeypatch.setattr(BlobClient, 'stage_block', recording_stage_block)
+    azb_container.upload_blob(data=(r for r in records), blob_name='mock_stream.json', overwrite=True, encode_json=True, 
+                              block_size=512)
+    assert json.loads(azb_container.download_blob_bytes('mock_stream.json').read()) == records
+    assert len(staged) > 1 and max(staged) <= 512
+
+
+@pytest.mark.parametrize('index_blobs', [False, True])
+def test_has_blobs(index_blobs):
+    """Test bulk existence checks, with and without the local blob name index"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=index_blobs)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_has_blobs.json', overwrite=True)
+
+    result = azb_container.has_blobs(['mock_has_blobs.json', 'mock_does_not_exist.json'])
+    assert result == {'mock_has_blobs.json': True, 'mock_does_not_exist.json': False}
+    assert azb_container.has_blob('mock_has_blobs.json')
+    assert not azb_container.has_blob('mock_does_not_exist.json', use_index=False)
+
+
+
+@pytest.mark.parametrize('index_blobs', [False, True])
+def test_has_blobs_nested_names(index_blobs):
+    """Test existence checks of blobs with nested names, including names sharing a basename"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=index_blobs)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='nested/a/mock.json', overwrite=True)
+
+    assert azb_container.has_blob(blob_name='nested/a/mock.json')
+    assert azb_container.has_blob(blob_name='nested/a/mock.json', use_index=False)
+    assert not azb_container.has_blob(blob_name='nested/b/mock.json', use_index=False)
+
+    result = azb_container.has_blobs(blob_names=['nested/a/mock.json', 'nested/b/mock.json'])
+    assert result == {'nested/a/mock.json': True, 'nested/b/mock.json': False}
+    assert azb_container.has_blobs(file_names=['uploads/mock_has_blobs.json']) == {'uploads/mock_has_blobs.json': True}
+
+
+def test_has_blob_single_index_refresh(monkeypatch):
+    """Test that concurrent lookups on a stale index share one listing, answering from the expired index meanwhile"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=True, 
+                                    index_ttl=None)
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_index_refresh.json', overwrite=True)
+
+    listings = []
+    release = threading.Event()
+    iter_blobs = azb_container.iter_blobs
+    def slow_iter_blobs(*args, **kwargs): 
+        listings.append(1)
+        release.wait(10)
+        return iter_blobs(*args, **kwargs)
+    monkeypatch.setattr(azb_container, 'iter_blobs', slow_iter_blobs)
+
+    with ThreadPoolExecutor(max_workers=8) as executor: 
+        # Never built: every caller waits for the one listing 
+        futures = [executor.submit(azb_container.has_blob, blob_name='mock_index_refresh.json') for _ in range(8)]
+        time.sleep(0.2)
+        release.set()
+        assert all(f.result() for f in futures) and len(listings) == 1
+
+        # Expired: one caller lists while the others answer from the old index without waiting 
+        release.clear()
+        azb_container.blob_index.ttl = 0
+        refreshing = executor.submit(azb_container.has_blob, blob_name='mock_index_refresh.json')
+        while len(listings) < 2: 
+            time.sleep(0.01)
+        assert azb_container.has_blob(blob_name='mock_index_refresh.json') and not refreshing.done()
+        release.set()
+        assert refreshing.result() and len(listings) == 2
+
+
+def test_iter_blob_pages_resume():
+    """Test that a paged listing can be resumed from a continuation token"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    all_names = list(azb_container.iter_blobs())
+
+    pages = azb_container.iter_blob_pages(results_per_page=2)
+    first_page = next(pages)
+    resumed = [name for page in azb_container.iter_blob_pages(results_per_page=2, continuation_token=first_page['continuation_token'])
+                    for name in page['items']]
+    
+    assert first_page['items'] + resumed == all_names
+    assert azb_container.list_blobs(name_only=True) == all_names
+
+
+def test_upload_blob_staged():
+    """Test uploading a file as staged blocks round-trips its content"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    _file_name = os.path.join('uploads', 'mock.csv')
+    azb_container.upload_blob(file_name=_file_name, 
+                              blob_name='mock_staged.csv', 
+                              overwrite=True, 
+                              staged=True, 
+                              block_size=16, 
+                              checkpoint_path=os.path.join(DOWNLOAD_DIR, 'mock_staged.checkpoint.json'))
+
+    with open(_file_name, 'rb') as f: 
+        assert azb_container.download_blob_bytes('mock_staged.csv').read() == f.read()
+    assert not os.path.exists(os.path.join(DOWNLOAD_DIR, 'mock_staged.checkpoint.json'))
+
+
+
+def test_upload_blob_staged_resume():
+    """Test that an interrupted staged upload resumes from its checkpoint, re-sending only the missing blocks"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    _file_name = os.path.join('uploads', 'mock.csv')
+    checkpoint_path = os.path.join(DOWNLOAD_DIR, 'mock_resumed.checkpoint.jsonl')
+    blob_client = azb_container.container_client.get_blob_client('mock_resumed.csv')
+    stage_block = blob_client.stage_block
+    staged = []
+
+    interrupt_after = [2]
+
+    def counting_stage_block(block_id, data, **kwargs): 
+        if len(staged) == interrupt_after[0]: 
+            raise ConnectionError('interrupted')
+        staged.append(block_id)
+        return stage_block(block_id, data, **kwargs)
+
+    blob_client.stage_block = counting_stage_block
+    with pytest.raises(ConnectionError): 
+        upload_file_in_blocks(blob_client, _file_name, block_size=16, max_concurrency=1, overwrite=True, checkpoint_path=checkpoint_path)
+    # One line per staged block after the header; a torn last line (e.g. from a crash) is ignored 
+    with open(checkpoint_path) as f: 
+        assert len(f.read().splitlines()) == 3
+    with open(checkpoint_path, 'a') as f: 
+        f.write('{"id": "torn')
+
+    interrupt_after[0] = None 
+    upload_file_in_blocks(blob_client, _file_name, block_size=16, max_concurrency=1, overwrite=True, checkpoint_path=checkpoint_path)
+
+    with open(_file_name, 'rb') as f: 
+        content = f.read()
+    assert len(staged) == -(-len(content) // 16)
+    assert len(set(staged)) == len(staged)
+    assert azb_container.download_blob_bytes('mock_resumed.csv').read() == content
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_upload_blob_staged_block_limit():
+    """Test that a block size too small for the file is rejected before anything is staged"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    _file_name = os.path.join(DOWNLOAD_DIR, 'mock_block_limit.bin')
+    with open(_file_name, 'wb') as f: 
+        f.write(b'x' * (MAX_BLOCK_COUNT + 1))
+
+    with pytest.raises(ValueError, match='blocks'): 
+        azb_container.upload_blob(file_name=_file_name, overwrite=True, staged=True, block_size=1)
+    assert not os.path.exists(_file_name + '.upload-checkpoint.jsonl')
+
+
+def test_delete_blobs():
+    """Test batch deletes by name and by prefix, with a per-blob result for blobs that do not exist"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=True, 
+                                    index_ttl=None)
+    
+    names = [f'mock_batch/{i}.json' for i in range(3)]
+    for name in names: 
+        azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name=name, overwrite=True)
+
+    summary = azb_container.delete_blobs(names[:2] + ['mock_batch/missing.json'])
+    assert sorted(summary['succeeded']) == names[:2]
+    assert list(summary['failed']) == ['mock_batch/missing.json'] and summary['failed']['mock_batch/missing.json'].startswith('404')
+    assert not azb_container.has_blob(blob_name=names[0]) and not azb_container.has_blob(blob_name=names[0], use_index=False)
+
+    summary = azb_container.delete_blobs('mock_batch/', dry_run=True)
+    assert summary['dry_run'] and summary['succeeded'] == names[2:]
+    assert azb_container.has_blob(blob_name=names[2], use_index=False)
+
+    assert azb_container.delete_blobs('mock_batch/')['succeeded'] == names[2:]
+    assert list(azb_container.iter_blobs(name_starts_with='mock_batch/')) == []
+    with pytest.raises(ValueError): 
+        azb_container.delete_blobs('')
+
+
+def test_set_standard_blob_tier_batch():
+    """Test setting the access tier of many blobs in one batch"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    names = [f'mock_tier/{i}.json' for i in range(3)]
+    for name in names: 
+        azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name=name, overwrite=True)
+
+    summary = azb_container.set_standard_blob_tier_batch('mock_tier/', 'Cool')
+    assert sorted(summary['succeeded']) == names and not summary['failed']
+    assert [b['blob_tier'] for b in azb_container.iter_blobs(name_starts_with='mock_tier/', fields=['blob_tier'])] == ['Cool'] * 3
+
+
+
+def test_copy_blob():
+    """Test a server-side copy to a new name, which is not overwritten unless asked"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_copy_source.json', overwrite=True)
+    azb_container.delete_blobs(['mock_copy_destination.json'])
+
+    result = azb_container.copy_blob('mock_copy_source.json', 'mock_copy_destination.json')
+    assert result['copy_status'] == 'success' and result['etag']
+    assert azb_container.download_blob_bytes('mock_copy_destination.json').read() == TestData.mock_json_bin_str
+    assert azb_container.has_blob(blob_name='mock_copy_source.json', use_index=False)
+
+    with pytest.raises(HttpResponseError): 
+        azb_container.copy_blob('mock_copy_source.json', 'mock_copy_destination.json')
+    azb_container.copy_blob('mock_copy_source.json', 'mock_copy_destination.json', overwrite=True)
+    with pytest.raises(ValueError): 
+        azb_container.copy_blob('mock_copy_source.json')
+
+
+def test_copy_prefix_move():
+    """Test moving every blob under a prefix to another prefix, keeping their relative names"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=True, 
+                                    index_ttl=None)
+    
+    azb_container.delete_blobs(list(azb_container.iter_blobs(name_starts_with='mock_move')))
+    names = ['mock_move_src/a.json', 'mock_move_src/2024/b.json']
+    for name in names: 
+        azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name=name, overwrite=True)
+    azb_container.refresh_blob_index()
+
+    assert azb_container.copy_prefix('mock_move_src/', 'mock_move_dst/', move=True, dry_run=True)['succeeded'] == sorted(names)
+    summary = azb_container.copy_prefix('mock_move_src/', 'mock_move_dst/', move=True)
+    assert sorted(summary['succeeded']) == sorted(names) and not summary['failed']
+
+    assert list(azb_container.iter_blobs(name_starts_with='mock_move_src/')) == []
+    assert sorted(azb_container.iter_blobs(name_starts_with='mock_move_dst/')) == ['mock_move_dst/2024/b.json', 'mock_move_dst/a.json']
+    assert azb_container.has_blobs(blob_names=['mock_move_src/a.json', 'mock_move_dst/a.json']) == \
+        {'mock_move_src/a.json': False, 'mock_move_dst/a.json': True}
+    assert azb_container.download_blob_bytes('mock_move_dst/2024/b.json').read() == TestData.mock_json_bin_str
+
+
+def test_download_blob_cached():
+    """Test that repeated cached downloads are revalidated rather than re-transferred, and see overwrites"""
+    cache = BlobCache(os.path.join(DOWNLOAD_DIR, 'blob_cache'))
+    cache.clear()
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    cache=cache)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_cached.json', overwrite=True)
+    
+    first = azb_container.download_blob_bytes('mock_cached.json').read()
+    second = azb_container.download_blob_bytes('mock_cached.json').read()
+    assert first == second == TestData.mock_json_bin_str
+    assert cache.stats()['misses'] == 1 and cache.stats()['revalidated'] == 1
+
+    azb_container.upload_blob(data=b'{}', blob_name='mock_cached.json', overwrite=True)
+    assert azb_container.download_blob_bytes('mock_cached.json').read() == b'{}'
+
+
+@pytest.mark.parametrize('content_encoding', [None, 'gzip'])
+def test_download_blob_cached_matches_uncached(content_encoding):
+    """Test that cached downloads return exactly what uncached ones do, for blobs with and without a Content-Encoding"""
+    cache = BlobCache(os.path.join(DOWNLOAD_DIR, 'blob_cache'))
+    cache.clear()
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    cache=cache)
+    
+    data = TestData.mock_json_bin_str * 20
+    azb_container.container_client.upload_blob('mock_cached_encoded.json', gzip.compress(data) if content_encoding else data, 
+                                               overwrite=True, content_settings=ContentSettings(content_encoding=content_encoding))
+
+    uncached_path = os.path.join(DOWNLOAD_DIR, 'mock_uncached_encoded.json')
+    azb_container.download_blob_file('mock_cached_encoded.json', download_path=uncached_path, chunk_size=64, use_cache=False)
+    for _ in range(2): 
+        azb_container.download_blob_file('mock_cached_encoded.json', chunk_size=64)
+        with open(uncached_path, 'rb') as uncached, open(os.path.join(DOWNLOAD_DIR, 'mock_cached_encoded.json'), 'rb') as cached: 
+            assert cached.read() == uncached.read() == data
+        assert azb_container.download_blob_bytes('mock_cached_encoded.json').read() == data
+    assert cache.stats()['misses'] == 1 and cache.stats()['revalidated'] == 3
+
+
+
+def test_blob_url_signer_cache(monkeypatch):
+    """Test that SAS tokens are reused within an expiry window and re-signed in the next one"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    signer = azb_container.url_signer
+    now = dt.datetime(2024, 1, 1, 12, 0, 1, tzinfo=dt.timezone.utc)
+    monkeypatch.setattr(sas, '_utcnow', lambda: now)
+
+    first = azb_container.get_blob_urls(['mock.json', 'nested/mock.json'], expiry_hours=1)
+    assert azb_container.get_blob_urls(['mock.json', 'nested/mock.json'], expiry_hours=1) == first
+    assert len(signer._tokens) == 2
+    expiry = _sas_expiry(first[0])
+    assert expiry >= now + dt.timedelta(hours=1)
+
+    # Later in the same window: same token. In the next window: a new one, valid for the full duration again 
+    now = now + dt.timedelta(seconds=signer.expiry_bucket_seconds - 2)
+    assert azb_container.get_blob_urls(['mock.json'], expiry_hours=1) == first[:1]
+    now = now + dt.timedelta(seconds=2)
+    renewed = azb_container.get_blob_urls(['mock.json'], expiry_hours=1)[0]
+    assert renewed != first[0] and _sas_expiry(renewed) >= now + dt.timedelta(hours=1)
+
+
+def test_blob_url_signer_delegation_key(monkeypatch):
+    """Test that a user delegation key is fetched once, reused, and replaced shortly before it expires"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    now = dt.datetime(2024, 1, 1, 12, 0, 1, tzinfo=dt.timezone.utc)
+    monkeypatch.setattr(sas, '_utcnow', lambda: now)
+    fetched = []
+
+    def get_user_delegation_key(key_start_time, key_expiry_time): 
+        key = UserDelegationKey()
+        key.signed_oid, key.signed_tid = 'oid', 'tid'
+        key.signed_start = key_start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+        key.signed_expiry = key_expiry_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+        key.signed_service, key.signed_version = 'b', '2021-08-06'
+        key.value = 'a2V5'
+        fetched.append(key)
+        return key
+
+    service_client = azb_container.container_client._get_blob_service_client()
+    monkeypatch.setattr(service_client, 'get_user_delegation_key', get_user_delegation_key)
+    monkeypatch.setattr(azb_container.container_client, '_get_blob_service_client', lambda: service_client)
+    signer = BlobUrlSigner(azb_container.container_client, user_delegation=True, delegation_key_hours=2)
+
+    first = signer.blob_urls(['mock.json'], expiry_hours=1)
+    assert signer.blob_urls(['mock.json'], expiry_hours=1) == first
+    now = now + dt.timedelta(hours=1)
+    signer.blob_urls(['mock.json'], expiry_hours=1)
+    assert len(fetched) == 1
+
+    # A token cannot outlive the key that signed it 
+    capped = signer.blob_urls(['mock.json'], expiry_hours=4)[0]
+    assert _sas_expiry(capped) == dt.datetime(2024, 1, 1, 14, 0, 1, tzinfo=dt.timezone.utc)
+
+    # Within the refresh margin of the key's expiry, a new key is fetched 
+    now = now + dt.timedelta(minutes=56)
+    assert signer.blob_urls(['mock.json'], expiry_hours=1) != first
+    assert len(fetched) == 2
+
+
+def _sas_expiry(url:str) -> dt.datetime: 
+    expiry = parse_qs(urlparse(url).query)['se'][0]
+    return dt.datetime.strptime(expiry, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=dt.timezone.utc)
+
+
+def test_sync_up_down():
+    """Test that syncs skip unchanged files and keep the blob name index and cache in step"""
+    cache = BlobCache(os.path.join(DOWNLOAD_DIR, 'blob_cache'))
+    cache.clear()
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    index_blobs=True, 
+                                    index_ttl=None, 
+                                    cache=cache)
+    
+    local_dir = os.path.join(DOWNLOAD_DIR, 'sync_src')
+    os.makedirs(os.path.join(local_dir, 'sub'), exist_ok=True)
+    for rel_path, content in (('a.txt', b'first'), (os.path.join('sub', 'b.txt'), b'second')): 
+        with open(os.path.join(local_dir, rel_path), 'wb') as f: 
+            f.write(content)
+    azb_container.delete_blobs('mock_sync/')
+    azb_container.refresh_blob_index()
+
+    summary = azb_container.sync_up(local_dir, prefix='mock_sync')
+    assert sorted(summary['transferred']) == ['mock_sync/a.txt', 'mock_sync/sub/b.txt'] and not summary['failed']
+    assert azb_container.has_blob(blob_name='mock_sync/sub/b.txt')
+    assert azb_container.download_blob_bytes('mock_sync/a.txt').read() == b'first'
+
+    with open(os.path.join(local_dir, 'a.txt'), 'wb') as f: 
+        f.write(b'first, edited')
+    summary = azb_container.sync_up(local_dir, prefix='mock_sync')
+    assert summary['transferred'] == ['mock_sync/a.txt'] and summary['skipped'] == ['mock_sync/sub/b.txt']
+    # The cached copy was dropped, not just revalidated 
+    misses = cache.stats()['misses']
+    assert azb_container.download_blob_bytes('mock_sync/a.txt').read() == b'first, edited'
+    assert cache.stats()['misses'] == misses + 1
+
+    sync_dir = os.path.join(DOWNLOAD_DIR, 'sync_dst')
+    summary = azb_container.sync_down('mock_sync', local_dir=sync_dir)
+    assert len(summary['transferred']) + len(summary['skipped']) == 2 and not summary['failed']
+    with open(os.path.join(sync_dir, 'sub', 'b.txt'), 'rb') as f: 
+        assert f.read() == b'second'
+    summary = azb_container.sync_down('mock_sync', local_dir=sync_dir)
+    assert summary['transferred'] == [] and len(summary['skipped']) == 2
+
+
+def test_sync_up_hashes_once(monkeypatch):
+    """Test that sync_up hashes each file once, on its transfer worker, both to compare and to upload it"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    local_dir = os.path.join(DOWNLOAD_DIR, 'sync_hash')
+    os.makedirs(local_dir, exist_ok=True)
+    for name, content in (('a.txt', b'aaaa'), ('b.txt', b'bbbb')): 
+        with open(os.path.join(local_dir, name), 'wb') as f: 
+            f.write(content)
+    azb_container.delete_blobs('mock_sync_hash/')
+
+    hashed = []
+    file_md5 = sync._file_md5
+    def counting_md5(path): 
+        hashed.append((os.path.basename(path), threading.current_thread() is threading.main_thread()))
+        return file_md5(path)
+    monkeypatch.setattr(sync, '_file_md5', counting_md5)
+
+    azb_container.sync_up(local_dir, prefix='mock_sync_hash', max_concurrency=2)
+    assert sorted(hashed) == [('a.txt', False), ('b.txt', False)]
+
+    # Same sizes: both are compared by MD5, and only the changed one is uploaded 
+    with open(os.path.join(local_dir, 'a.txt'), 'wb') as f: 
+        f.write(b'AAAA')
+    hashed.clear()
+    summary = azb_container.sync_up(local_dir, prefix='mock_sync_hash', max_concurrency=2)
+    assert summary['transferred'] == ['mock_sync_hash/a.txt'] and summary['skipped'] == ['mock_sync_hash/b.txt']
+    assert sorted(hashed) == [('a.txt', False), ('b.txt', False)]
+    assert azb_container.download_blob_bytes('mock_sync_hash/a.txt').read() == b'AAAA'
+
+
+def test_sync_down_outside_local_dir(monkeypatch):
+    """Test that blobs whose names would escape the local directory are reported as failed, not written"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    azb_container.upload_blob(data=b'inside', blob_name='mock_escape/inside.txt', overwrite=True)
+
+    # The service accepts such names, but the SDK's URLs may not reach them, so they are added to the listing 
+    list_blobs = azb_container.container_client.list_blobs
+    escaping = ['mock_escape/../../escaped.txt', 'mock_escape/sub/../../../escaped.txt', 'mock_escape/..']
+    def listing(*args, **kwargs): 
+        blobs = list(list_blobs(*args, **kwargs))
+        for name in escaping: 
+            blobs.append(BlobProperties(name=name))
+            blobs[-1].size = 5
+        return blobs
+    monkeypatch.setattr(azb_container.container_client, 'list_blobs', listing)
+
+    shutil.rmtree(os.path.join(DOWNLOAD_DIR, 'sync_escape'), ignore_errors=True)
+    sync_dir = os.path.join(DOWNLOAD_DIR, 'sync_escape', 'dst')
+    summary = azb_container.sync_down('mock_escape', local_dir=sync_dir)
+    assert summary['transferred'] == ['mock_escape/inside.txt'] and sorted(summary['failed']) == sorted(escaping)
+    assert not os.path.exists(os.path.join(DOWNLOAD_DIR, 'escaped.txt'))
+    assert os.listdir(os.path.join(DOWNLOAD_DIR, 'sync_escape')) == ['dst']
+
+
+def test_download_blob_ranges():
+    """Test that ranged downloads reassemble blobs of one, several and no ranges"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    data = bytes(range(256)) * 13 + b'tail'
+    azb_container.upload_blob(data=data, blob_name='mock_ranges.bin', overwrite=True)
+    azb_container.container_client.upload_blob('mock_empty.bin', b'', overwrite=True)
+
+    for chunk_size in (64, len(data), len(data) + 1): 
+        azb_container.download_blob_file('mock_ranges.bin', chunk_size=chunk_size, max_concurrency=4)
+        with open(os.path.join(DOWNLOAD_DIR, 'mock_ranges.bin'), 'rb') as f: 
+            assert f.read() == data
+        view = azb_container.download_blob_bytes('mock_ranges.bin', preallocate=True, chunk_size=chunk_size, max_concurrency=4)
+        assert view.tobytes() == data
+
+    azb_container.download_blob_file('mock_empty.bin', chunk_size=64)
+    assert os.path.getsize(os.path.join(DOWNLOAD_DIR, 'mock_empty.bin')) == 0
+    assert azb_container.download_blob_bytes('mock_empty.bin', preallocate=True).nbytes == 0
+
+
+def test_download_blob_encoded():
+    """Test that every download of a blob with a Content-Encoding returns its decoded content, as the default download does"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    data = json.dumps([{'id': i, 'name': f'record {i}'} for i in range(200)]).encode('utf-8')
+    azb_container.container_client.upload_blob('mock_encoded.json', gzip.compress(data), overwrite=True, 
+                                               content_settings=ContentSettings(content_type='application/json', content_encoding='gzip'))
+
+    assert azb_container.download_blob_bytes('mock_encoded.json').getvalue() == data
+    for chunk_size in (64, len(data) * 2): 
+        azb_container.download_blob_file('mock_encoded.json', chunk_size=chunk_size, max_concurrency=4)
+        with open(os.path.join(DOWNLOAD_DIR, 'mock_encoded.json'), 'rb') as f: 
+            assert f.read() == data
+        view = azb_container.download_blob_bytes('mock_encoded.json', preallocate=True, chunk_size=chunk_size, max_concurrency=4)
+        assert view.tobytes() == data
+    assert azb_container.open_blob_view('mock_encoded.json').tobytes() == data
+
+    with azb_container.open_blob('mock_encoded.json', block_size=64) as reader: 
+        assert reader.size == len(data)
+        reader.seek(100)
+        assert reader.read(50) == data[100:150]
+        reader.seek(0)
+        assert reader.read() == data
+
+
+@pytest.mark.parametrize('use_cache', [False, True])
+def test_download_blob_mmap(use_cache):
+    """Test that memory-mapped downloads expose the blob's bytes, with and without a cache"""
+    cache = BlobCache(os.path.join(DOWNLOAD_DIR, 'blob_cache')) if use_cache else None 
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    cache=cache)
+    
+    data = bytes(range(256)) * 5
+    azb_container.upload_blob(data=data, blob_name='mock_mmap.bin', overwrite=True)
+    azb_container.container_client.upload_blob('mock_empty.bin', b'', overwrite=True)
+
+    mapped = azb_container.download_blob_mmap('mock_mmap.bin', chunk_size=256)
+    assert len(mapped) == len(data) and mapped[:] == data
+    with pytest.raises(TypeError): 
+        mapped[0] = 0  # read-only 
+    mapped.close()
+
+    view = azb_container.open_blob_view('mock_mmap.bin')
+    assert view[256:512].tobytes() == data[256:512]
+    view.release()
+    assert azb_container.open_blob_view('mock_empty.bin').nbytes == 0
+    with pytest.raises(ValueError): 
+        azb_container.download_blob_mmap('mock_empty.bin')
+
+
+def test_open_blob_ranged_reads():
+    """Test that a seekable blob reader returns the same bytes as a full download"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    _file_name = os.path.join('uploads', 'mock.csv')
+    azb_container.upload_blob(file_name=_file_name, blob_name='mock_ranged.csv', overwrite=True)
+    with open(_file_name, 'rb') as f: 
+        expected = f.read()
+
+    with azb_container.open_blob('mock_ranged.csv', block_size=16) as reader: 
+        assert reader.read(10) == expected[:10]
+        reader.seek(-5, os.SEEK_END)
+        assert reader.read() == expected[-5:]
+        reader.seek(0)
+        assert reader.read() == expected
+
+
+def test_find_blobs_by_tags():
+    """Test that a tag query finds a freshly tagged blob through the tag index"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_tagged.json', overwrite=True)
+    azb_container.set_blob_tags_batch(['mock_tagged.json'], {'azbtest': 'find_by_tags'})
+
+    # The tag index is updated asynchronously by the service 
+    for _ in range(10): 
+        found = list(azb_container.find_blobs_by_tags("azbtest = 'find_by_tags'", name_only=True))
+        if found: 
+            break
+        time.sleep(3)
+    assert found == ['mock_tagged.json']
+
+
+def test_metrics_recorded():
+    """Test that a metrics sink records each operation with its bytes and list pages"""
+    metrics = MetricsRecorder()
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    metrics=metrics)
+    
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_metrics.json', overwrite=True)
+    azb_container.download_blob_bytes('mock_metrics.json')
+    list(azb_container.iter_blobs(results_per_page=1))
+
+    series = {s['operation']: s for s in metrics.snapshot()}
+    assert series['upload']['bytes_out'] == len(TestData.mock_json_bin_str)
+    assert series['download']['bytes_in'] == len(TestData.mock_json_bin_str)
+    assert series['list']['pages'] >= 1
+    assert 'azb_operations_total{operation="upload"' in metrics.to_prometheus()
+
+
+def test_upload_blob_dedup(monkeypatch):
+    """Test that re-uploading identical content under a new name yields an identical blob (copied, not re-sent)"""
+    metrics = MetricsRecorder()
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR, 
+                                    metrics=metrics, 
+                                    dedup=True, 
+                                    dedup_min_size=0)
+    copies = []
+    start_copy_from_url = BlobClient.start_copy_from_url
+    def recording_start_copy(self, source_url, **kwargs): 
+        copies.append((urlparse(source_url).path.rsplit('/', 1)[-1], self.blob_name))
+        return start_copy_from_url(self, source_url, **kwargs)
+    monkeypatch.setattr(BlobClient, 'start_copy_from_url', recording_start_copy)
+
+    def bytes_out(): 
+        return sum(s['bytes_out'] for s in metrics.snapshot() if s['operation'] == 'upload')
+    
+    first = azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_dedup_a.json', overwrite=True)
+    sent = bytes_out()
+    assert sent == len(TestData.mock_json_bin_str) and copies == []
+    second = azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_dedup_b.json', overwrite=True)
+
+    # Copied server-side: no payload sent 
+    assert copies == [('mock_dedup_a.json', 'mock_dedup_b.json')] and bytes_out() == sent
+    assert second['content_md5'] == first['content_md5']
+    assert azb_container.download_blob_bytes('mock_dedup_b.json').getvalue() == TestData.mock_json_bin_str
+
+    # A BytesIO is uploaded (and so addressed) from its current position 
+    body = BytesIO(b'ignored prefix ' + TestData.mock_json_bin_str)
+    body.seek(len(b'ignored prefix '))
+    azb_container.upload_blob(data=body, blob_name='mock_dedup_c.json', overwrite=True)
+    assert copies[-1] == ('mock_dedup_a.json', 'mock_dedup_c.json') and bytes_out() == sent
+    assert azb_container.download_blob_bytes('mock_dedup_c.json').getvalue() == TestData.mock_json_bin_str
+
+
+def test_misconfiguration_errors():
+    """Test that using a feature the manager was not set up for raises ValueError (not AttributeError, which the account manager treats as a missing container)"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    
+    with pytest.raises(ValueError):
+        azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_dedup_a.json', overwrite=True, dedup=True)
+    with pytest.raises(ValueError):
+        azb_container.refresh_blob_index()
+
+
+def test_changes_since():
+    """Test that changes_since reports blobs created, modified and deleted between calls, and only advances on completion"""
+    azb_container = AzureBlobContainerManager(connection_str=Config.AZURE_CONNECTION_STRING,
+                                    container_name=Config.AZURE_CONTAINER_NAME, 
+                                    download_dir=DOWNLOAD_DIR)
+    state_path = os.path.join(DOWNLOAD_DIR, 'mock_changes.db')
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    for name in ('mock_changes/kept.json', 'mock_changes/modified.json', 'mock_changes/deleted.json'):
+        azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name=name, overwrite=True)
+
+    def ours(changes):
+        return {c['name']: c['change'] for c in changes if c['name'].startswith('mock_changes/')}
+
+    changes = azb_container.changes_since(state_path=state_path, use_change_feed=False)
+    assert ours(changes) == {'mock_changes/kept.json': 'created', 'mock_changes/modified.json': 'created', 
+                             'mock_changes/deleted.json': 'created'}
+    first = changes.checkpoint
+
+    azb_container.upload_blob(data=b'{"mytest": "modified"}', blob_name='mock_changes/modified.json', overwrite=True)
+    azb_container.delete_blobs(['mock_changes/deleted.json'])
+    azb_container.upload_blob(data=TestData.mock_json_bin_str, blob_name='mock_changes/created.json', overwrite=True)
+    expected = {'mock_changes/modified.json': 'modified', 'mock_changes/deleted.json': 'deleted', 
+                'mock_changes/created.json': 'created'}
+
+    # Abandoned part-way: no new checkpoint, and the previous one is still valid
+    changes = azb_container.changes_since(first, state_path=state_path, use_change_feed=False)
+    next(iter(changes))
+    with pytest.raises(RuntimeError):
+        changes.checkpoint
+    del changes
+
+    changes = azb_container.changes_since(first, state_path=state_path, use_change_feed=False)
+    assert ours(changes) == expected
+    second = changes.checkpoint
+    assert ours(azb_container.changes_since(second, state_path=state_path, use_change_feed=False)) == {}
+
+    # first was superseded by second
+    with pytest.raises(ValueError):
+        list(azb_container.changes_since(first, state_path=state_path, use_change_feed=False))
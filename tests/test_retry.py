@@ -0,0 +1,250 @@
+## Test retries, throttling and conditional creates of the request pipeline (and the operations they count towards), against canned responses
+import base64
+import hashlib
+import os
+import pytest
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline import Pipeline
+from azure.core.pipeline.transport import HttpRequest, HttpResponse, HttpTransport
+from azure.storage.blob._shared.policies import StorageContentValidation
+from azure.storage.blob import ContainerClient
+from .config import DOWNLOAD_DIR
+from azb_manager import azb_manager as azb_module
+from azb_manager import retry
+from azb_manager.azb_manager import AzureBlobContainerManager
+from azb_manager.metrics import MetricsRecorder, current_operation
+from azb_manager.retry import AccountThrottle, AIMDLimiter, ThrottledRetryPolicy, TokenBucket, retry_count
+from azb_manager.transfer import _run_concurrently
+
+URL = 'https://mockstorageaccount1.blob.core.windows.net/mockcontainer'
+
+
+class StubResponse(HttpResponse):
+    def __init__(self, request, status_code, headers, content=b''):
+        super().__init__(request, None)
+        self.status_code = status_code
+        self.headers = headers
+        self.reason = 'Stub'
+        self.content = content
+
+    def body(self):
+        return self.content
+
+
+class StubTransport(HttpTransport):
+    """Answers each request with the next canned (status, headers[, body]), recording the requests"""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        return StubResponse(request, *self.responses.pop(0))
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeClock:
+    """Stands in for time.monotonic()/time.sleep(), so sleeping advances the clock instantly"""
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(retry.time, 'sleep', clock.sleep)
+    return clock
+
+
+def _run(responses, throttle=None, options=None, **policy_kwargs):
+    transport = StubTransport(responses)
+    policy = ThrottledRetryPolicy(throttle, **policy_kwargs)
+    pipeline = Pipeline(transport=transport, policies=[policy, StorageContentValidation()])
+    response = pipeline.run(HttpRequest('GET', f'{URL}/mock.json'), **(options or {}))
+    return response.http_response, transport, policy.throttle
+
+
+def test_throttled_requests_retried(clock):
+    """Test that 503 and 429 responses are retried, counted, and halve the concurrency limit"""
+    retries_before = retry_count()
+    response, transport, throttle = _run([(503, {}), (429, {}), (200, {})], AccountThrottle(max_in_flight=8))
+
+    assert response.status_code == 200 and len(transport.requests) == 3
+    assert throttle.stats() == {'requests': 3, 'retries': 2, 'throttled': 2, 'in_flight_limit': 4}
+    assert retry_count() - retries_before == 2
+    # Exponential backoff with jitter: the n-th retry waits between half and all of initial_backoff * 2**(n-1)
+    assert 0.25 <= clock.sleeps[0] <= 0.5 and 0.5 <= clock.sleeps[1] <= 1.0
+
+
+def test_retries_exhausted(clock):
+    """Test that retries stop after retry_total, returning the last response, and that client errors are not retried"""
+    response, transport, throttle = _run([(500, {})] * 3, retry_total=2)
+    assert response.status_code == 500 and len(transport.requests) == 3
+    assert throttle.stats()['throttled'] == 0
+
+    response, transport, _ = _run([(404, {}), (200, {})])
+    assert response.status_code == 404 and len(transport.requests) == 1
+
+
+def test_sdk_retry_conditions(clock):
+    """Test that the SDK's own retry conditions and retry_hook callbacks are kept"""
+    content = b'{"mytest": "checksum"}'
+    good_md5 = base64.b64encode(hashlib.md5(content).digest()).decode()
+    bad_md5 = base64.b64encode(hashlib.md5(b'corrupted').digest()).decode()
+    hooked = []
+    options = {'validate_content': True, 'retry_hook': lambda **kwargs: hooked.append(kwargs['retry_count'])}
+
+    # A download whose content does not match its Content-MD5
+    response, transport, _ = _run([(200, {'content-md5': bad_md5}, content), (200, {'content-md5': good_md5}, content)], options=options)
+    assert response.status_code == 200 and len(transport.requests) == 2 and hooked == [0]
+
+    # A copy that failed because of its source
+    response, transport, _ = _run([(400, {'x-ms-copy-source-error-code': 'ServerBusy'}), (202, {})])
+    assert response.status_code == 202 and len(transport.requests) == 2
+
+    response, transport, _ = _run([(400, {'x-ms-copy-source-error-code': 'CannotVerifyCopySource'})])
+    assert response.status_code == 400 and len(transport.requests) == 1
+
+
+@pytest.mark.parametrize('headers,expected', [
+    ({'x-ms-retry-after-ms': '1500'}, 1.5),
+    ({'Retry-After': '2'}, 2.0),
+    ({'Retry-After': '120'}, 30.0),  # capped at max_backoff
+    ])
+def test_retry_after(clock, headers, expected):
+    """Test that the delay the service asks for is used instead of the backoff"""
+    response, _, _ = _run([(503, headers), (200, {})], max_backoff=30.0)
+    assert response.status_code == 200 and clock.sleeps == [expected]
+
+
+def test_retry_after_http_date(monkeypatch):
+    """Test that a Retry-After given as an HTTP date is turned into seconds from now"""
+    monkeypatch.setattr(retry.time, 'time', lambda: 1700000000.0)
+    assert retry._retry_after({'Retry-After': 'Tue, 14 Nov 2023 22:13:30 GMT'}) == 10.0
+    assert retry._retry_after({'Retry-After': 'not a date'}) is None
+
+
+def test_aimd_limiter(clock):
+    """Test that the limit halves on throttling (once per burst), and grows by about one per round of successes"""
+    limiter = AIMDLimiter(max_limit=8, min_limit=2)
+
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.release(throttled=True)  # same burst of throttling
+    assert limiter.limit == 4
+
+    clock.now += retry._DECREASE_COOLDOWN
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+    clock.now += retry._DECREASE_COOLDOWN
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2  # min_limit
+
+    for _ in range(2 + 3):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8  # max_limit
+
+
+def test_token_bucket(clock):
+    """Test that the bucket allows a burst, then paces acquisitions at its rate"""
+    bucket = TokenBucket(rate=8, burst=3)
+    start = clock.now
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == start
+
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now - start == pytest.approx(0.5)
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_retries_counted_across_threads(clock):
+    """Test that retries made on pool threads count towards the operation that handed them the work"""
+    recorder = MetricsRecorder()
+
+    def fetch(i):
+        assert current_operation() is record
+        _run([(503, {}), (200, {})])
+
+    with recorder.operation('download', container='mockcontainer') as record:
+        _run_concurrently(fetch, range(4), max_concurrency=4)
+        # Run inline on the operation's own thread, counted once
+        _run_concurrently(fetch, range(2), max_concurrency=1)
+
+    assert record.retries == 6 and recorder.snapshot()[0]['retries'] == 6
+    assert current_operation() is not record
+
+
+def test_untracked_records_not_shared(clock):
+    """Test that retries made outside any operation are counted on a throwaway record that no other caller sees"""
+    untracked = current_operation()
+    _run_concurrently(lambda i: _run([(503, {}), (200, {})]), range(4), max_concurrency=4)
+
+    assert untracked.retries == 0
+    assert current_operation() is not untracked and current_operation().retries == 0
+
+
+def test_conditional_upload_confirmed_after_retry(monkeypatch):
+    """Test that a file upload whose first attempt may have been applied is accepted when the blob holds the file,
+    and that the file is only hashed for that check"""
+    file_name = os.path.join(DOWNLOAD_DIR, 'mock_retry.json')
+    content = b'{"mytest": "retry"}'
+    with open(file_name, 'wb') as f:
+        f.write(content)
+    hashed = []
+    monkeypatch.setattr(azb_module, '_file_md5', lambda path: hashed.append(path) or hashlib.md5(content).digest())
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+
+    blob_headers = {'ETag': '"0x1"', 'Last-Modified': 'Tue, 14 Nov 2023 22:13:20 GMT', 'x-ms-blob-type': 'BlockBlob',
+                    'Content-Length': str(len(content)), 'Content-MD5': base64.b64encode(hashlib.md5(content).digest()).decode()}
+    conflict = (409, {'x-ms-error-code': 'BlobAlreadyExists'})
+
+    def manager(responses):
+        transport = StubTransport(responses)
+        container_client = ContainerClient.from_container_url(URL, transport=transport, retry_policy=ThrottledRetryPolicy())
+        return AzureBlobContainerManager(container_client=container_client), transport
+
+    # Without a retry, no hashing
+    azb_container, transport = manager([(201, blob_headers)])
+    azb_container.upload_blob(file_name=file_name)
+    assert hashed == [] and transport.requests[0].headers.get('If-None-Match') == '*'
+
+    # A 500 (which the service may have applied) then a conflict: the existing blob is checked and is ours
+    azb_container, transport = manager([(500, {}), conflict, (200, blob_headers)])
+    assert azb_container.upload_blob(file_name=file_name)['etag'] == '"0x1"'
+    assert hashed == [file_name] and transport.requests[-1].method == 'HEAD'
+
+    # A conflict without a retry is someone else's blob
+    azb_container, _ = manager([conflict])
+    with pytest.raises(ResourceExistsError):
+        azb_container.upload_blob(file_name=file_name)
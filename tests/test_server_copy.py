@@ -0,0 +1,46 @@
+## Test polling of pending server-side copies, against a stub destination blob
+from types import SimpleNamespace
+import pytest
+from azb_manager import server_copy
+from azb_manager.server_copy import BlobCopyError, copy_blob
+
+
+class StubDestination:
+    """Starts a pending copy, then reports the given (copy id, status) on each properties request"""
+    blob_name = 'mock_copy_destination.json'
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.aborted = []
+
+    def start_copy_from_url(self, source_url, **kwargs):
+        return {'copy_id': 'ours', 'copy_status': 'pending', 'etag': '"0x1"', 'last_modified': None}
+
+    def get_blob_properties(self):
+        copy_id, status = self.polls.pop(0)
+        return SimpleNamespace(copy=SimpleNamespace(id=copy_id, status=status, status_description=None),
+                               etag='"0x2"', last_modified=None)
+
+    def abort_copy(self, copy_id):
+        self.aborted.append(copy_id)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(server_copy.time, 'sleep', lambda seconds: None)
+
+
+def test_copy_polled_until_done():
+    """Test that a pending copy is polled until it succeeds"""
+    destination = StubDestination([('ours', 'pending'), ('ours', 'success')])
+    result = copy_blob(None, 'https://mock/source', destination)
+    assert result['copy_id'] == 'ours' and result['copy_status'] == 'success' and result['etag'] == '"0x2"'
+
+
+@pytest.mark.parametrize('status', ['success', 'failed'])
+def test_copy_superseded(status):
+    """Test that the outcome of another copy to the same destination is not reported as this copy's"""
+    destination = StubDestination([('ours', 'pending'), ('theirs', status)])
+    with pytest.raises(BlobCopyError, match='superseded'):
+        copy_blob(None, 'https://mock/source', destination)
+    assert destination.aborted == []
@@ -3,12 +3,14 @@ import pytest
 import os 
 from .config import get_logger, set_logging_level,Config, TestData, DOWNLOAD_DIR
 import logging 
+import threading 
+import time 
 
 
 logger = get_logger()
 set_logging_level(logging.DEBUG)
 
-from azb_manager.azb_manager import AzureBlobStorageAccountManager
+from azb_manager.azb_manager import AzureBlobStorageAccountManager, AzureBlobAccountGroup
 
 @pytest.mark.parametrize('data,blob_name,file_name', [
 
@@ -48,8 +50,118 @@ def test_upload_blob(data, blob_name, file_name):
                                     encode_json=True)
 
 
+def test_fan_out():
+    """Test that an operation fanned out over containers reports every container and records failures"""
+    azb_storage_account = AzureBlobStorageAccountManager(storage_account_name=Config.AZURE_STORAGE_ACCOUNT,
+                                   connection_str=Config.AZURE_CONNECTION_STRING,
+                                   containers=[Config.AZURE_CONTAINER_NAME],
+                                   download_dir=DOWNLOAD_DIR)
+    
+    results = azb_storage_account.fan_out(lambda m: m.iter_blobs(results_per_page=10))
+    names = [entry['item'] for entry in results]
+    assert names and not results.failed
+    assert results.reports[0]['items'] == len(names)
+
+    def fail(m): 
+        raise ValueError('fan out failure')
+    results = azb_storage_account.fan_out(fail)
+    assert list(results) == []
+    assert results.failed == {f'{Config.AZURE_STORAGE_ACCOUNT}/{Config.AZURE_CONTAINER_NAME}': 'ValueError: fan out failure'}
+
+
+def test_container_managers_created_lazily():
+    """Test that a container's manager is only created on first attribute access and then reused"""
+    azb_storage_account = AzureBlobStorageAccountManager(storage_account_name=Config.AZURE_STORAGE_ACCOUNT,
+                                   connection_str=Config.AZURE_CONNECTION_STRING,
+                                   containers=[Config.AZURE_CONTAINER_NAME],
+                                   download_dir=DOWNLOAD_DIR)
+
+    assert Config.AZURE_CONTAINER_NAME not in vars(azb_storage_account)
+    assert azb_storage_account.container_names == [Config.AZURE_CONTAINER_NAME]
 
+    container_manager = getattr(azb_storage_account, Config.AZURE_CONTAINER_NAME)
+    assert container_manager.container_name == Config.AZURE_CONTAINER_NAME
+    assert vars(azb_storage_account)[Config.AZURE_CONTAINER_NAME] is container_manager
+    assert getattr(azb_storage_account, Config.AZURE_CONTAINER_NAME) is container_manager
+    assert azb_storage_account.get_container_manager(Config.AZURE_CONTAINER_NAME) is container_manager
 
+    with pytest.raises(AttributeError):
+        azb_storage_account.not_a_container
 
 
+def test_container_managers_share_transport_and_throttle():
+    """Test that every container manager of an account sends through the account's one transport and throttle"""
+    azb_storage_account = AzureBlobStorageAccountManager(storage_account_name=Config.AZURE_STORAGE_ACCOUNT,
+                                   connection_str=Config.AZURE_CONNECTION_STRING,
+                                   containers=[Config.AZURE_CONTAINER_NAME, 'other-container'],
+                                   download_dir=DOWNLOAD_DIR)
+    managers = [azb_storage_account.get_container_manager(name) for name in azb_storage_account.container_names]
 
+    transport = azb_storage_account.blob_service_client._pipeline._transport
+    retry_policy = azb_storage_account.blob_service_client._config.retry_policy
+    for m in managers:
+        # Derived clients wrap the account's transport rather than opening their own
+        assert m.container_client._pipeline._transport._transport is transport
+        assert retry_policy in m.container_client._pipeline._impl_policies
+        assert m.throttle is azb_storage_account.throttle
+
+    before = azb_storage_account.throttle.stats()['requests']
+    for m in managers:
+        m.container_client.exists()
+    assert azb_storage_account.throttle.stats()['requests'] == before + len(managers)
+
+
+def _account_group():
+    """Two account managers (on the test connection) each set on the test container and a second one"""
+    return AzureBlobAccountGroup([AzureBlobStorageAccountManager(storage_account_name=account_name,
+                                   connection_str=Config.AZURE_CONNECTION_STRING,
+                                   containers=[Config.AZURE_CONTAINER_NAME, 'other-container'],
+                                   download_dir=DOWNLOAD_DIR) for account_name in ('account-a', 'account-b')])
+
+
+def test_account_group_fan_out():
+    """Test that an account group fans out over every container of every account, or only the ones given"""
+    group = _account_group()
+    both = {('account-a', Config.AZURE_CONTAINER_NAME), ('account-a', 'other-container'),
+            ('account-b', Config.AZURE_CONTAINER_NAME), ('account-b', 'other-container')}
+
+    results = group.fan_out(lambda m: [m.container_name])
+    entries = list(results)
+    assert {(e['account'], e['container']) for e in entries} == both
+    assert all(e['item'] == e['container'] for e in entries)
+    assert not results.failed and len(results.reports) == 4
+
+    results = group.fan_out(lambda m: [m.container_name], containers={'account-b': [Config.AZURE_CONTAINER_NAME]})
+    assert [(e['account'], e['container']) for e in results] == [('account-b', Config.AZURE_CONTAINER_NAME)]
+
+    def fail(m): 
+        raise ValueError('fan out failure')
+    results = group.fan_out(fail, containers={'account-a': None})
+    assert list(results) == []
+    assert set(results.failed) == {f'account-a/{Config.AZURE_CONTAINER_NAME}', 'account-a/other-container'}
+
+
+@pytest.mark.parametrize('max_per_account', [1, 2])
+def test_account_group_max_per_account(max_per_account):
+    """Test that no more than max_per_account containers of one account are worked on at once"""
+    group = _account_group()
+    lock = threading.Lock()
+    in_flight = {name: 0 for name in group.accounts}
+    peak = {name: 0 for name in group.accounts}
+    # Both accounts share one connection string, so tell them apart by their (cached) managers
+    account_of = {id(account.get_container_manager(c)): name 
+                  for name, account in group.accounts.items() for c in account.container_names}
+
+    def operation(m): 
+        account_name = account_of[id(m)]
+        with lock: 
+            in_flight[account_name] += 1
+            peak[account_name] = max(peak[account_name], in_flight[account_name])
+        time.sleep(0.2)
+        with lock: 
+            in_flight[account_name] -= 1
+        return [m.container_name]
+
+    results = group.fan_out(operation, max_concurrency=4, max_per_account=max_per_account)
+    assert len(list(results)) == 4 and not results.failed
+    assert peak == {name: max_per_account for name in group.accounts}